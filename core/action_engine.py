@@ -2,29 +2,60 @@ import yaml
 import os
 import asyncio
 import logging
-import pygame.mixer as sa # alias to keep code similar or just rename
-import time
 import random
-import pygame._sdl2.audio as sdl_audio
+import time
+from core.triggers import TriggerIndex, map_event_type, compile_command
+from core.templates import compile_template
+from core.expressions import compile_expression, ExpressionError
+from core.audio import AudioDevicePool
+from core.playlist import TrackIndex
+from core.scheduler import ActionScheduler
+from core.cooldowns import CooldownStore
+from core.state_store import StateStore
+from core.config_writer import DebouncedYamlWriter
+from core.timers import TimerScheduler
+from core.chat_activity import CHAT_ACTIVITY, GatedTimer
+from core.tracing import Tracer
 
 # Logging setup
 logger = logging.getLogger("ActionEngine")
 
+BRANCH_TYPES = ("if", "switch", "random_pick")
+MAX_BRANCH_DEPTH = 16 # Nested branches / inline actions (guards against an action branching into itself)
+
 class ActionEngine:
-    def __init__(self, config_file="actions.yaml", event_server=None, obs_controller=None, twitch_bot=None, youtube_bot=None):
+    def __init__(self, config_file="actions.yaml", event_server=None, obs_controller=None, twitch_bot=None, youtube_bot=None, audio=None):
         self.config_file = config_file
         self.event_server = event_server
         self.obs = obs_controller
         self.twitch = twitch_bot
         self.youtube = youtube_bot
         self.actions = []
+        self.actions_by_name = {} # name -> action (first one wins on duplicates, like the old linear search)
+        self.duplicate_names = {} # name -> count, for names used more than once (None = unnamed actions)
+        self.trigger_index = TriggerIndex()
+        self._branches = {} # id(sub-action config) -> (config, compiled branch), see _compiled_branch
         
-        self.timer_tasks = []
+        self.timers = TimerScheduler() # All timed work: timer triggers, toggle reverts, delays
+        self.timer_tasks = {} # action name -> [TimerHandle]
         self.playlist_task = None
-        self.current_audio_device = None # Tracks current mixer device
-        self.current_playlist_sound = None # Tracks currently playing Sound object
+        self.playlists = {} # (folder, recursive) -> TrackIndex, kept across playlist restarts
+        self.audio = audio or AudioDevicePool() # One open mixer per output device (SFX cache + playlist track)
         
-        self.cooldowns = {} # Map action_name -> last_run_ts
+        # Runtime state (cooldowns, counters, set_action_state toggles) lives in SQLite, actions.yaml is config only
+        self.state = StateStore(os.path.join(os.path.dirname(os.path.abspath(config_file)), "state.db"))
+        self.cooldowns = CooldownStore(store=self.state) # Global / per-user / per-platform cooldowns and rate limits
+        self.cooldowns.restore(*self.state.load_cooldowns())
+        self._config_enabled = {} # action name -> 'enabled' as configured in actions.yaml
+        self.revert_tasks = {} # action name -> TimerHandle reverting a temporary toggle
+        self.config_writer = DebouncedYamlWriter(config_file, self._config_snapshot) # Coalesced, atomic saves
+        self.scheduler = ActionScheduler(self.execute_action) # Bounded, per-action concurrency modes
+        self.tracer = Tracer() # Spans per sub-action + latency histograms (WS "get_traces", HTTP /api/traces)
+
+        # Lazy placeholder resolvers, only called if the placeholder is used and not in the context
+        self.var_resolvers = {
+            "game": self._resolve_game,
+        }
 
         # Volume Control (0.0 - 1.0)
         self.vol_sfx = 1.0
@@ -38,7 +69,7 @@ class ActionEngine:
         self.load_actions()
 
     def load_actions(self):
-        self.stop_timers()
+        self.config_writer.discard() # File on disk is newer (e.g. saved by the GUI)
         
         # Initialize from example if missing
         if not os.path.exists(self.config_file):
@@ -51,29 +82,160 @@ class ActionEngine:
                     print(f"[ActionEngine] Error initializing actions.yaml: {e}")
         
         if not os.path.exists(self.config_file):
+            self.stop_timers()
             self.actions = []
+            self._index_names()
+            self.trigger_index.build(self.actions)
             return
 
         with open(self.config_file, 'r') as f:
             data = yaml.safe_load(f) or {}
-            self.actions = data.get('actions', [])
+            new_actions = data.get('actions', []) or []
         
+        # Reload: only touch what changed (timer phases, playlists and running actions keep going)
+        if self.actions and not self.duplicate_names and not _duplicate_names(new_actions):
+            self._reload_incremental(new_actions)
+            return
+
+        self.stop_timers()
+        kept = {a.get('name') for a in new_actions}
+        for action in self.actions:
+            if action.get('name') not in kept:
+                self.scheduler.cancel(action.get('name'), "removed", running=False)
+        self.actions = new_actions
+        self._index_names()
+        self._config_enabled = {a.get('name'): a.get('enabled', True) for a in self.actions}
+        self._apply_state_overrides()
+        self.trigger_index.build(self.actions)
+        self._check_branches(self.actions)
         print(f"[ActionEngine] Loaded {len(self.actions)} actions.")
-        self.timer_tasks = {} # Use dict for management {name: task}
         self.start_timers()
         
         # Trigger Twitch Sync if bot is ready
         if self.twitch and hasattr(self.twitch, 'is_ready') and self.twitch.is_ready:
             asyncio.create_task(self.twitch.sync_cooldowns(self.actions))
 
+        self._schedule_sound_warmup()
+
+    def _reload_incremental(self, new_actions):
+        """Diffs the new config against the loaded one by action name."""
+        old_by_name = {a.get('name'): a for a in self.actions}
+        merged, changed = [], []
+        for new in new_actions:
+            name = new.get('name')
+            old = old_by_name.get(name)
+            # Compare config against config (the live dict may carry a runtime toggle)
+            if old is not None and dict(old, enabled=self._config_enabled.get(name, True)) == dict(new, enabled=new.get('enabled', True)):
+                merged.append(old) # Unchanged: keep the live object (timers, in-flight runs reference it)
+            else:
+                merged.append(new)
+                changed.append(new)
+        
+        new_names = {a.get('name') for a in new_actions}
+        removed = [name for name in old_by_name if name not in new_names]
+        
+        if not changed and not removed:
+            if [a.get('name') for a in merged] != [a.get('name') for a in self.actions]:
+                self.actions = merged # Only the order changed
+                self._index_names()
+                self.trigger_index.build(self.actions)
+            print("[ActionEngine] Reload: no changes.")
+            return
+        
+        changed_names = {a.get('name') for a in changed}
+        for name in removed + list(changed_names):
+            self._stop_action_timer(name)
+            if name in self.revert_tasks:
+                self.revert_tasks.pop(name).cancel()
+        for name in removed:
+            self._config_enabled.pop(name, None)
+            self.state.clear_toggle(name)
+            self.scheduler.cancel(name, "removed", running=False) # Running ones finish, like other reloads
+        
+        self.actions = merged
+        self._index_names()
+        for action in changed:
+            self._config_enabled[action.get('name')] = action.get('enabled', True)
+        self._apply_state_overrides(changed_names)
+        self.trigger_index.build(self.actions)
+        self._check_branches(changed)
+        
+        for action in changed:
+            if action.get('enabled', True):
+                self._start_action_timer(action)
+        
+        # Reward cooldown sync only for changed actions with a redemption trigger
+        if self.twitch and hasattr(self.twitch, 'is_ready') and self.twitch.is_ready:
+            to_sync = [a for a in changed if any(t.get('type') == 'twitch_redemption' for t in a.get('triggers', []))]
+            if to_sync:
+                asyncio.create_task(self.twitch.sync_cooldowns(to_sync))
+        
+        self._schedule_sound_warmup(changed)
+        print(f"[ActionEngine] Reloaded: {len(changed)} changed/added, {len(removed)} removed, "
+              f"{len(merged) - len(changed)} unchanged.")
+
+    def _index_names(self):
+        """Name -> action map for trigger_action, set_action_state, branches, toggles (O(1) instead of a scan)."""
+        self.actions_by_name = {}
+        for action in self.actions:
+            self.actions_by_name.setdefault(action.get('name'), action)
+        self._branches.clear()
+        
+        self.duplicate_names = _duplicate_names(self.actions)
+        for name, count in self.duplicate_names.items():
+            if name is None:
+                print(f"[ActionEngine] Warning: {count} action(s) without a name, they can't be targeted by name.")
+            else:
+                print(f"[ActionEngine] Warning: Action name '{name}' is used {count}x. "
+                      f"Only the first one can be targeted by name (trigger_action, set_action_state, hot switch).")
+
+    def _check_branches(self, actions):
+        """Compiles all branch conditions up front, so typos show up on load and not mid-stream."""
+        for action in actions:
+            for sa_config in self.walk_sub_actions(action.get('sub_actions', [])):
+                if sa_config.get('type') not in BRANCH_TYPES: continue
+                try:
+                    self._compiled_branch(sa_config)
+                except (ExpressionError, TypeError, ValueError) as e:
+                    print(f"[ActionEngine] Invalid {sa_config['type']} in '{action.get('name')}': {e}")
+
+    @staticmethod
+    def walk_sub_actions(sub_actions):
+        """All sub-actions including the ones nested in if / switch / random_pick branches."""
+        stack = list(reversed(sub_actions or []))
+        while stack:
+            sa_config = stack.pop()
+            if not isinstance(sa_config, dict): continue
+            yield sa_config
+            nested = [sa_config.get('then'), sa_config.get('else'), sa_config.get('default')]
+            nested += [c.get('sub_actions') for c in (sa_config.get('cases') or []) + (sa_config.get('options') or [])
+                       if isinstance(c, dict)]
+            for branch in reversed(nested):
+                if isinstance(branch, list):
+                    stack.extend(reversed(branch))
+
+    def _schedule_sound_warmup(self, actions=None):
+        """Pre-decodes all static play_sound files (of the given actions) in the background."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return # No loop (e.g. GUI import), sounds get cached on first play
+
+        by_device = {}
+        for action in self.actions if actions is None else actions:
+            for sa_config in self.walk_sub_actions(action.get('sub_actions', [])):
+                if sa_config.get('type') != 'play_sound': continue
+                path = sa_config.get('file', '')
+                if not path or '%' in path: continue # Templated paths are only known at runtime
+                by_device.setdefault(sa_config.get('device') or 'Default', []).append(path)
+
+        if by_device:
+            asyncio.create_task(self.audio.preload(by_device))
+
     def stop_timers(self):
-        if isinstance(self.timer_tasks, list): # Legacy support during migration (init is list)
-            for t in self.timer_tasks: t.cancel()
-            self.timer_tasks = {}
-        else:
-            for t in self.timer_tasks.values():
-                t.cancel()
-            self.timer_tasks.clear()
+        for handles in self.timer_tasks.values():
+            for h in handles: h.cancel()
+        self.timer_tasks.clear()
 
     def start_timers(self):
         for action in self.actions:
@@ -81,63 +243,148 @@ class ActionEngine:
             self._start_action_timer(action)
 
     def _start_action_timer(self, action):
+        name = action.get('name')
+        self._stop_action_timer(name) # Restart logic
+        handles = []
         for trigger in action.get('triggers', []):
-             if trigger.get('type') == 'timer':
-                 interval = trigger.get('interval', 60)
-                 # Cancel existing if any (restart logic)
-                 if action['name'] in self.timer_tasks:
-                     self.timer_tasks[action['name']].cancel()
-                     
-                 task = asyncio.create_task(self.run_timer(action, interval))
-                 self.timer_tasks[action['name']] = task
-                 print(f"[Timer] Started for {action['name']} ({interval}s)")
-
-    def _update_action_state(self, action_name, new_state):
-        target = next((a for a in self.actions if a.get('name') == action_name), None)
+            if trigger.get('type') != 'timer': continue
+            try:
+                if trigger.get('cron'):
+                    # Cron-style schedule, e.g. "*/30 18-23 * * 5,6"
+                    handles.append(self.timers.cron(trigger['cron'], self._fire_timer, action, name=name))
+                    print(f"[Timer] Started for {name} (cron '{trigger['cron']}')")
+                elif int(trigger.get('min_lines', 0) or 0) > 0:
+                    # Chat-gated: interval AND at least min_lines chat lines since the last run
+                    interval = float(trigger.get('interval', 60))
+                    handles.append(GatedTimer(self.timers, CHAT_ACTIVITY, interval, trigger['min_lines'],
+                                              self._fire_timer, action, name=name,
+                                              platform=trigger.get('chat_platform')).start())
+                    print(f"[Timer] Started for {name} ({interval:g}s, min. {trigger['min_lines']} chat lines)")
+                else:
+                    interval = float(trigger.get('interval', 60))
+                    handles.append(self.timers.every(
+                        interval, self._fire_timer, action, name=name,
+                        jitter=float(trigger.get('jitter', 0) or 0), # +- seconds per run
+                        catch_up=trigger.get('catch_up', 'skip'))) # After a stall: skip / all / reset
+                    print(f"[Timer] Started for {name} ({interval:g}s)")
+            except (TypeError, ValueError) as e:
+                print(f"[Timer] Invalid timer trigger in '{name}': {e}")
+        if handles:
+            self.timer_tasks[name] = handles
+
+    def _stop_action_timer(self, name):
+        for h in self.timer_tasks.pop(name, ()):
+            h.cancel()
+            print(f"[Timer] Stopped for {name}")
+
+    def _update_action_state(self, action_name, new_state, runtime=False, revert_at=None, revert_to=None):
+        """
+        runtime=False: hot switch from GUI/WS, changes the config (actions.yaml).
+        runtime=True: set_action_state sub-action, stored as override in the state store (optionally until revert_at).
+        """
+        target = self.actions_by_name.get(action_name)
         if not target: return False
         
+        if runtime:
+            config_state = self._config_enabled.get(action_name, True)
+            if new_state == config_state and revert_at is None:
+                self.state.clear_toggle(action_name)
+            else:
+                self.state.set_toggle(action_name, new_state, config_state, revert_at, revert_to)
+        else:
+            config_changed = self._config_enabled.get(action_name, True) != new_state
+            self._config_enabled[action_name] = new_state
+            self.state.clear_toggle(action_name) # Explicit switch wins over a temporary toggle
+            if action_name in self.revert_tasks:
+                self.revert_tasks.pop(action_name).cancel()
+            if config_changed:
+                self.save_actions()
+        
         old_state = target.get('enabled', True)
         if old_state != new_state:
             target['enabled'] = new_state
             print(f"[ActionEngine] State Change: '{action_name}' -> {'ENABLED' if new_state else 'DISABLED'}")
-            self.save_actions()
+            self.trigger_index.build(self.actions)
             
             # Timer Management
             if new_state:
                 self._start_action_timer(target)
             else:
-                if action_name in self.timer_tasks:
-                    self.timer_tasks[action_name].cancel()
-                    del self.timer_tasks[action_name]
-                    print(f"[Timer] Stopped for {action_name}")
+                self._stop_action_timer(action_name)
+                # Waiting runs would execute a disabled action; the running one may be what disabled it
+                self.scheduler.cancel(action_name, "disabled", running=False)
+            
+        return True
+
+    def _apply_state_overrides(self, names=None):
+        """Re-applies persisted set_action_state toggles on top of the freshly loaded config (of the given actions)."""
+        if names is None:
+            for task in self.revert_tasks.values():
+                task.cancel()
+            self.revert_tasks = {}
+        
+        now = time.time()
+        for name, toggle in self.state.load_toggles().items():
+            if names is not None and name not in names: continue
+            action = self.actions_by_name.get(name)
+            if action is None or action.get('enabled', True) != toggle['config_enabled']:
+                # Action removed or its config was edited since the toggle -> config wins
+                self.state.clear_toggle(name)
+                continue
+            
+            if toggle['revert_at'] is not None and toggle['revert_at'] <= now:
+                # Expired while the bot was offline
+                action['enabled'] = toggle['revert_to']
+                if action['enabled'] == toggle['config_enabled']:
+                    self.state.clear_toggle(name)
+                else:
+                    self.state.set_toggle(name, action['enabled'], toggle['config_enabled'])
+                continue
             
-            return True
-        return False
+            action['enabled'] = toggle['enabled']
+            if toggle['revert_at'] is not None:
+                self._schedule_revert(name, toggle['revert_to'], toggle['revert_at'] - now)
 
-    async def run_timer(self, action, interval):
+    def _schedule_revert(self, action_name, state, delay):
         try:
-            while True:
-                await asyncio.sleep(interval)
-                # Execute (Timers ignore cooldown currently? Or should they respect it? 
-                # Ideally timers ARE the schedule, so ignore cooldown usually.
-                # But let's keep it simple.)
-                print(f"[Timer] Executing {action['name']}")
-                asyncio.create_task(self.execute_action(action, {}))
-        except asyncio.CancelledError:
-            pass
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return # No loop, the toggle is reverted on the next load
+        
+        def revert():
+            self.revert_tasks.pop(action_name, None)
+            self._update_action_state(action_name, state, runtime=True)
+            print(f"[Action] Timer expired. Action '{action_name}' reverted.")
+        
+        if action_name in self.revert_tasks:
+            self.revert_tasks[action_name].cancel()
+        self.revert_tasks[action_name] = self.timers.call_later(delay, revert, name=action_name, kind="revert")
+
+    def _fire_timer(self, action):
+        # Timers ARE the schedule, so they ignore cooldowns
+        print(f"[Timer] Executing {action.get('name')}")
+        self.scheduler.submit(action, {})
+
+    def close(self):
+        """Shutdown: writes pending runtime state and stops the audio workers."""
+        self.timers.cancel_all()
+        self.scheduler.cancel_all()
+        self.config_writer.flush()
+        self.audio.shutdown()
+        for library in self.playlists.values():
+            library.close() # inotify fds
+        self.playlists.clear()
+        self.state.close()
 
     def save_actions(self):
-        data = {'actions': self.actions}
-        with open(self.config_file, 'w') as f:
-            yaml.dump(data, f)
-        print("[ActionEngine] Actions saved.")
+        """Schedules a write of actions.yaml (bursts of changes end up in one atomic write)."""
+        self.config_writer.schedule()
+
+    def _config_snapshot(self):
+        # Only configured states go to the file, runtime toggles stay in the state store
+        return {'actions': [dict(a, enabled=self._config_enabled.get(a.get('name'), a.get('enabled', True)))
+                            for a in self.actions]}
 
-    async def handle_event(self, event_type, data):
-        """
-        Main entry point for triggers.
-        Checks if any action matches the event type and data.
-        """
-        now = time.time()
     async def handle_event(self, event_type, data):
         """
         Main entry point for triggers.
@@ -151,60 +398,63 @@ class ActionEngine:
             return # System events usually don't trigger actions directly (?) unless configured
 
         now = time.time()
-        for action in self.actions:
-            if not action.get('enabled', True):
-                continue
-            
-            triggers = action.get('triggers', [])
+        t_match = time.perf_counter()
+        mapped_type = map_event_type(event_type, data)
+        
+        # Only actions from the index can match (disabled ones are not indexed)
+        for action, triggers in self.trigger_index.candidates(mapped_type, data):
             matched_trigger = None
             ctx_updates = None
             
             # 1. Check if ANY trigger matches this event
             for trigger in triggers:
-                is_triggered, updates = self.check_trigger(trigger, event_type, data)
+                is_triggered, updates = self.check_trigger(trigger, event_type, data, mapped_type)
                 if is_triggered:
                     matched_trigger = trigger
                     ctx_updates = updates
                     break
             
             if matched_trigger:
-                # 2. Check Cooldown
-                cd = action.get('cooldown', 0)
-                is_on_cooldown = False
-                if cd > 0:
-                    last_run = self.cooldowns.get(action['name'], 0)
-                    if now - last_run < cd:
-                        is_on_cooldown = True
-
-                if is_on_cooldown:
-                    print(f"[ActionEngine] Action '{action['name']}' blocked by cooldown ({cd}s).")
-                    
-                    # --- REFUND LOGIC ---
-                    # Check if this was a Twitch Redemption trigger
-                    # We need to map the event type or check the trigger type
-                    # The mapped type logic is inside check_trigger, but we know event_type
-                    if event_type == "TwitchRedemption" and self.twitch:
-                        redemption_id = data.get('redemption_id')
-                        reward_id = data.get('reward_id')
-                        if redemption_id and reward_id:
-                            print(f"[ActionEngine] Refunding Twitch Points for '{action['name']}'...")
-                            asyncio.create_task(self.twitch.refund_redemption(redemption_id, reward_id))
-                    
+                # 2. Check Cooldown (and record the run if it passes, released again if the scheduler drops it)
+                cd_ctx = {
+                    "user": data.get('user', ''),
+                    "platform": data.get('platform') or mapped_type.split('_')[0],
+                }
+                allowed, reason = self.cooldowns.acquire(action, cd_ctx, now)
+
+                if not allowed:
+                    print(f"[ActionEngine] Action '{action.get('name')}' blocked by {reason}.")
+                    self._refund(action, event_type, data)
                     continue # Skip execution
                 
                 # 3. Execute
-                if cd > 0: self.cooldowns[action['name']] = now
-                
-                print(f"[ActionEngine] Trigger fired: {action['name']} (Event: {event_type})")
+                print(f"[ActionEngine] Trigger fired: {action.get('name')} (Event: {event_type})")
                 
                 # Merge context
                 full_ctx = data.copy() if data else {}
                 if ctx_updates:
                     full_ctx.update(ctx_updates)
 
-                # Execute async
-                asyncio.create_task(self.execute_action(action, full_ctx))
+                # Execute async (scheduler applies concurrency mode & global cap).
+                # A run it drops (now or evicted later) must not cost the viewer their cooldown or points.
+                def on_drop(reason, action=action, cd_ctx=cd_ctx):
+                    self.cooldowns.release(action, cd_ctx, now)
+                    self._refund(action, event_type, data)
+                self.scheduler.submit(action, full_ctx, on_drop=on_drop)
                 break # One trigger per action is enough
+        
+        # Matching cost (index lookup + check_trigger), per event
+        self.tracer.observe("handle_event", (time.perf_counter() - t_match) * 1000)
+
+    def _refund(self, action, event_type, data):
+        """Refunds the channel points of a redemption whose action didn't run (cooldown, dropped by the scheduler)."""
+        if event_type != "TwitchRedemption" or not self.twitch:
+            return
+        redemption_id = data.get('redemption_id')
+        reward_id = data.get('reward_id')
+        if redemption_id and reward_id:
+            print(f"[ActionEngine] Refunding Twitch Points for '{action.get('name')}'...")
+            asyncio.create_task(self.twitch.refund_redemption(redemption_id, reward_id))
 
     async def on_ws_message(self, message):
         """Handle incoming WebSocket messages from Overlay"""
@@ -225,6 +475,13 @@ class ActionEngine:
                 state = payload.get("state") # boolean
                 
                 self._update_action_state(a_name, state)
+            elif event == "get_traces":
+                limit = int(data.get("data", {}).get("limit", 50))
+                await self.event_server.reply("ActionTraces", self.tracer.snapshot(limit))
+            elif event == "get_timers":
+                await self.event_server.reply("TimerSchedule", {"upcoming": self.timers.upcoming(20)})
+            elif event == "get_action_stats":
+                await self.event_server.reply("ActionStats", self.scheduler.stats())
                 
         except Exception as e:
             print(f"[ActionEngine] WS Message Error: {e}")
@@ -235,24 +492,12 @@ class ActionEngine:
             self.vol_playlist = self.pre_duck_volume
             self.pre_duck_volume = None
             
-            if self.current_playlist_sound:
-                try: self.current_playlist_sound.set_volume(self.vol_playlist)
-                except: pass
+            await self.audio.set_track_volume(self.vol_playlist)
 
-    def check_trigger(self, trigger_config, event_type, data):
-        # MAPPING: EventServer events -> Action triggers
-        mapped_type = event_type
-        
-        if event_type == "CommandTriggered":
-            if data.get('platform') == 'youtube':
-                mapped_type = "youtube_command"
-            else:
-                mapped_type = "twitch_command"
-        elif event_type == "SystemEvent":
-             if data.get("type") == "raid": mapped_type = "twitch_raid"
-             elif data.get("type") == "sub": mapped_type = "twitch_sub"
-        elif event_type == "TwitchRedemption":
-            mapped_type = "twitch_redemption"
+    def check_trigger(self, trigger_config, event_type, data, mapped_type=None):
+        # MAPPING: EventServer events -> Action triggers (handle_event passes it in pre-mapped)
+        if mapped_type is None:
+            mapped_type = map_event_type(event_type, data)
         
         # Check Type
         if trigger_config.get('type') != mapped_type:
@@ -302,41 +547,17 @@ class ActionEngine:
             if trigger_cmd == received_cmd:
                 return True, {}
             
-            # 2. Parameter Match (e.g. "!shout %user%")
+            # 2. Parameter Match (e.g. "!shout %user%"), pattern is compiled once per trigger string
             if "%" in trigger_cmd:
-                t_parts = trigger_cmd.split(' ')
-                base_cmd = t_parts[0]
+                try:
+                    pattern = compile_command(trigger_config.get('command', ''))
+                except ValueError:
+                    return False, {}
                 
                 # Compare base command (e.g. "!shout")
-                if base_cmd == received_cmd:
-                    received_msg = data.get('message', '')
-                    msg_parts = [p for p in received_msg.split(' ') if p] # Remove empty
-                    
-                    # Check length (Trigger usually has fewer or equal parts if we handle variable args strict? 
-                    # Let's say we map 1:1 for now)
-                    
-                    extracted = {}
-                    match = True
-                    
-                    for i, t_part in enumerate(t_parts):
-                        if i >= len(msg_parts):
-                            match = False # Message too short
-                            break
-                        
-                        if t_part.startswith('%') and t_part.endswith('%'):
-                             var_name = t_part[1:-1] # e.g. "user"
-                             val = msg_parts[i]
-                             
-                             # Cleanup @user -> user
-                             if var_name == "user" and val.startswith('@'):
-                                 val = val[1:]
-                                 
-                             extracted[var_name] = val
-                        elif t_part != msg_parts[i].lower():
-                             match = False
-                             break
-                    
-                    if match:
+                if pattern.base == received_cmd:
+                    extracted = pattern.match(data.get('message', ''))
+                    if extracted is not None:
                         return True, extracted
 
             return False, {}
@@ -357,43 +578,40 @@ class ActionEngine:
 
     async def execute_action(self, action, context_data):
         sub_actions = action.get('sub_actions', [])
+        self.state.incr(f"runs:{action.get('name', '')}")
         
         # Safe copy of context for variable replacement
         ctx = context_data.copy() if context_data else {}
         
-        for sa_config in sub_actions:
+        with self.tracer.trace(action.get('name', ''), ctx.get('command') or ctx.get('reward_title')):
+            await self.run_sub_actions(sub_actions, ctx)
+
+    async def run_sub_actions(self, sub_actions, ctx, depth=0):
+        for sa_config in sub_actions or []:
             try:
-                await self.execute_sub_action(sa_config, ctx)
+                with self.tracer.span(sa_config.get('type') or 'unknown'):
+                    await self.execute_sub_action(sa_config, ctx, depth)
             except Exception as e:
                 print(f"[ActionEngine] Error in sub-action {sa_config.get('type')}: {e}")
 
-    async def execute_sub_action(self, config, ctx):
+    async def execute_sub_action(self, config, ctx, depth=0):
         sa_type = config.get('type')
         
         # --- LOGIC ---
-        if sa_type == "delay":
+        if sa_type in BRANCH_TYPES:
+            await self._run_branch(config, ctx, depth)
+
+        elif sa_type == "delay":
             ms = config.get('ms', 0)
-            await asyncio.sleep(ms / 1000.0)
+            await self.timers.sleep(ms / 1000.0)
             
         elif sa_type == "log":
-            msg = self.replace_vars(config.get('message', ''), ctx)
+            msg = await self.render_vars(config.get('message', ''), ctx)
             print(f"[Action Log] {msg}")
 
         # --- CHAT (Generic) ---
         elif sa_type == "twitch_chat": # Name is legacy but means "Send Chat"
-            msg_raw = config.get('message', '')
-            
-            # Resolve %game% if needed
-            if "%game%" in msg_raw and "user" in ctx:
-                 if self.twitch:
-                     print(f"[ActionEngine] Fetching game for {ctx['user']}...")
-                     game = await self.twitch.get_user_last_game(ctx['user'])
-                     ctx['game'] = game
-                     print(f"[ActionEngine] Game found: {game}")
-                 else:
-                     ctx['game'] = "Unbekannt (Bot offline)"
-
-            msg = self.replace_vars(msg_raw, ctx)
+            msg = await self.render_vars(config.get('message', ''), ctx)
             platform = ctx.get('platform', 'twitch') # Default to twitch if unknown
             
             if platform == 'youtube' and self.youtube:
@@ -422,15 +640,14 @@ class ActionEngine:
             final_vol = self.vol_sfx * base_vol
             
             if os.path.exists(file_path):
-                 # Run in thread to not block loop
-                 await asyncio.to_thread(self.play_sound_sync, file_path, device, final_vol)
+                 # Decode/play happens on the audio worker thread
+                 await self.audio.play_sound(file_path, device, final_vol)
             else:
                 print(f"[ActionError] Sound file not found: {file_path}")
 
         elif sa_type == "stop_sounds":
-            if sa.get_init():
-                sa.stop() # Stops all playback on all channels
-                print("[Action] Stopped all sounds.")
+            await self.audio.stop_all() # Stops all playback on all channels
+            print("[Action] Stopped all sounds.")
                 
         elif sa_type == "playlist":
             folder = self.replace_vars(config.get('folder', ''), ctx)
@@ -446,7 +663,14 @@ class ActionEngine:
             if self.playlist_task:
                 self.playlist_task.cancel()
             
-            self.playlist_task = asyncio.create_task(self.run_playlist(folder, device))
+            options = {
+                "shuffle": config.get('shuffle', True), # No repeats until every track has played
+                "weights": config.get('weights') or {}, # {subfolder_tag: factor}
+                "recursive": config.get('recursive', False), # Include subfolders (their names become tags)
+                "stream": config.get('stream', False), # Stream via mixer.music instead of decoding whole tracks
+                "fade": int(config.get('fade', 0) or 0), # ms fade-out/fade-in between tracks, streaming mode only
+            }
+            self.playlist_task = asyncio.create_task(self.run_playlist(folder, device, options))
             
         elif sa_type == "stop_playlist":
             if self.playlist_task:
@@ -454,9 +678,8 @@ class ActionEngine:
                 self.playlist_task = None
                 print("[Action] Playlist stopped.")
                 
-                # Stop current playback with fadeout
-                if sa.get_init():
-                    sa.fadeout(1500)
+                # Stop current track with fadeout
+                await self.audio.fade_track(1500)
 
         # --- YOUTUBE SHORTS ---
         elif sa_type == "youtube_random_short":
@@ -471,9 +694,7 @@ class ActionEngine:
                          self.pre_duck_volume = self.vol_playlist
                          print(f"[AutoDuck] Ducking playlist to 5% (was {self.pre_duck_volume*100:.0f}%)")
                          self.vol_playlist = 0.05
-                         if self.current_playlist_sound:
-                             try: self.current_playlist_sound.set_volume(self.vol_playlist)
-                             except: pass
+                         await self.audio.set_track_volume(self.vol_playlist)
 
                      # Broadcast to Overlay
                      print(f"[Debug] Broadcasting YouTubePlay event for {vid_id}")
@@ -488,9 +709,9 @@ class ActionEngine:
         elif sa_type == "trigger_action":
             # ... (unchanged) ...
             target_name = config.get('action_name', '')
-            found = next((a for a in self.actions if a.get('name') == target_name), None)
+            found = self.actions_by_name.get(target_name)
             if found:
-                 asyncio.create_task(self.execute_action(found, ctx))
+                 self.scheduler.submit(found, ctx)
             else:
                  print(f"[Action] Trigger target '{target_name}' not found.")
 
@@ -500,7 +721,7 @@ class ActionEngine:
             state = config.get('state', 'toggle') # on, off, toggle
             duration = int(config.get('duration', 0))
             
-            target = next((a for a in self.actions if a.get('name') == target_name), None)
+            target = self.actions_by_name.get(target_name)
             
             if target:
                 old_state = target.get('enabled', True)
@@ -510,15 +731,14 @@ class ActionEngine:
                 elif state == "off": new_state = False
                 elif state == "toggle": new_state = not old_state
                 
-                if self._update_action_state(target_name, new_state):
-                    # Duration Timer
-                    if duration > 0:
-                        async def revert():
-                            await asyncio.sleep(duration)
-                            self._update_action_state(target_name, old_state)
-                            print(f"[Action] Timer expired. Action '{target_name}' reverted.")
-                        
-                        asyncio.create_task(revert())
+                # Duration Timer (revert time is persisted, survives a restart)
+                revert_at = time.time() + duration if duration > 0 else None
+                if self._update_action_state(target_name, new_state, runtime=True,
+                                             revert_at=revert_at, revert_to=old_state if revert_at else None):
+                    if revert_at:
+                        self._schedule_revert(target_name, old_state, duration)
+                    elif target_name in self.revert_tasks:
+                        self.revert_tasks.pop(target_name).cancel()
             else:
                 print(f"[Action] Action '{target_name}' not found.")
 
@@ -545,100 +765,186 @@ class ActionEngine:
                 print(f"[Volume] Playlist changed {old:.2f} -> {self.vol_playlist:.2f}")
                 
                 # Apply immediately if playing
-                if self.current_playlist_sound:
-                    try:
-                        self.current_playlist_sound.set_volume(self.vol_playlist)
-                        print(f"[Volume] Applied to current track.")
-                    except:
-                        pass
+                if await self.audio.set_track_volume(self.vol_playlist):
+                    print(f"[Volume] Applied to current track.")
 
 
-    async def run_playlist(self, folder, device=None):
+    async def run_playlist(self, folder, device=None, options=None):
+        options = options or {}
         print(f"[Playlist] Starting playlist from {folder} on {device or 'Default'}")
+        playing = None
         try:
+            if not os.path.exists(folder):
+                print(f"[Playlist] Folder not found: {folder}")
+                return
+            library = await self._get_track_index(folder, options.get('recursive', False))
+            next_track = None
+            
             while True:
                 if not os.path.exists(folder):
                     print(f"[Playlist] Folder not found: {folder}")
                     break
                 
-                # Scan
-                files = [f for f in os.listdir(folder) if f.lower().endswith(('.mp3', '.wav', '.ogg'))]
-                if not files:
+                # Incremental update (inotify / dir mtimes), no full listdir per track
+                await asyncio.to_thread(library.refresh)
+                
+                track = next_track if next_track and next_track.path in library.tracks else None
+                track = track or library.pick(options.get('weights'), options.get('shuffle', True))
+                if not track:
                     print("[Playlist] No files found.")
                     break
-                    
-                # Pick Random
-                choice = random.choice(files)
-                full_path = os.path.join(folder, choice)
                 
-                # Play & Get Duration
+                # Play & wait until the track has ended
                 # For playlist, we assume 100% base volume, scaled by global playlist volume
-                duration = await asyncio.to_thread(self.play_sound_get_duration, full_path, device, self.vol_playlist)
+                fade = options.get('fade', 0)
+                if fade and track.duration is None:
+                    await asyncio.to_thread(library.probe_duration, track) # Header only, so the first play fades too
+                playing = await self.audio.begin_track(track.path, device, self.vol_playlist,
+                                                       options.get('stream', False), fade, track.duration)
                 
-                # Wait
-                await asyncio.sleep(duration)
+                # Meanwhile pick the next track and queue (streaming) or pre-decode it, so there is no gap
+                next_track = library.pick(options.get('weights'), options.get('shuffle', True))
+                if next_track and next_track is not track:
+                    if not options.get('stream'):
+                        await self.audio.preload_track(next_track.path, device)
+                    elif not fade: # The fade-out would cancel the queued track
+                        await self.audio.queue_track(next_track.path, device)
+                
+                duration = await playing
+                library.set_duration(track.path, duration)
+                if not duration:
+                    await asyncio.sleep(1) # Broken file, don't spin
                 
         except asyncio.CancelledError:
-            pass
+            if playing and not playing.done():
+                playing.cancel()
         except Exception as e:
             print(f"[Playlist] Error: {e}")
 
-    def play_sound_get_duration(self, path, device=None, volume=1.0):
-        try:
-            self._ensure_audio_device(device)
-            snd = sa.Sound(path)
-            snd.set_volume(volume)
-            snd.play()
-            
-            # Store reference for volume control
-            self.current_playlist_sound = snd
-            
-            return snd.get_length()
-        except:
-            return 0
-
-    def _ensure_audio_device(self, device_name):
-        """Initializes mixer with specific device if changed."""
-        if device_name is None: return # Keep current
-        
-        # If device changed or mixer not init
-        if not sa.get_init() or self.current_audio_device != device_name:
-            if sa.get_init():
-                sa.quit()
-                print(f"[Audio] Switching device to: {device_name}")
-            
-            try:
-                # 'Default' is a special keyword if user selects it we pass None?
-                # Actually SDL2 uses specific names. If user passes 'Default', we might handle it.
-                dev = device_name if device_name != 'Default' else None
-                sa.init(devicename=dev)
-                self.current_audio_device = device_name
-            except Exception as e:
-                print(f"[Audio] Failed to init device {device_name}: {e}. Fallback to default.")
-                sa.init()
-                self.current_audio_device = 'Default'
+    async def _get_track_index(self, folder, recursive=False):
+        key = (os.path.normpath(folder), recursive)
+        library = self.playlists.get(key)
+        if library is None:
+            # First scan can take a while on network shares, keep it off the loop
+            library = await asyncio.to_thread(TrackIndex, folder, recursive)
+            self.playlists[key] = library
+            print(f"[Playlist] Indexed {len(library)} tracks in {folder}")
+        return library
 
     def replace_vars(self, text, ctx):
         if not isinstance(text, str): return text
-        for k, v in ctx.items():
-            text = text.replace(f"%{k}%", str(v))
-        return text
+        return compile_template(text).render(ctx)
 
-    def play_sound_sync(self, path, device=None, volume=1.0):
-        try:
-            print(f"[Debug] play_sound_sync: {os.path.basename(path)} @ {volume:.2f}")
-            self._ensure_audio_device(device)
-            
-            # Use Sound object for SFX (allows overlapping sounds)
-            sound = sa.Sound(path)
-            sound.set_volume(volume)
-            sound.play()
-            
-            # We don't block here anymore because Sound.play is fire-and-forget
-            # This allows multiple sounds to play at once!
-            
-        except Exception as e:
-            print(f"[Sound Error] Failed to play {os.path.basename(path)}: {e}")
-            # Hint for the user
-            if "mpg123" in str(e) or "unrecognized" in str(e):
-                 print("[Hint] The file might be corrupted or renamed incorrectly (e.g. mp3 extension on a wav file). Try converting it.")
+    async def render_vars(self, text, ctx):
+        """Like replace_vars, but runs lazy resolvers (e.g. %game%) for placeholders that are actually used."""
+        if not isinstance(text, str): return text
+        tpl = compile_template(text)
+        await self._resolve_lazy(tpl.names, ctx)
+        return tpl.render(ctx)
+
+    async def _resolve_lazy(self, names, ctx):
+        for name in names:
+            if name not in ctx and name in self.var_resolvers:
+                with self.tracer.span(f"resolve:{name}"):
+                    value = await self.var_resolvers[name](ctx)
+                if value is not None:
+                    ctx[name] = value
+
+    # --- Branching (if / switch / random_pick) ---
+    def _compiled_branch(self, config):
+        """Conditions and case tables are compiled once per sub-action config (cache is reset on load)."""
+        entry = self._branches.get(id(config))
+        if entry is None or entry[0] is not config:
+            entry = (config, self._compile_branch(config))
+            self._branches[id(config)] = entry
+        return entry[1]
+
+    @staticmethod
+    def _branch_target(spec, list_key, action_key):
+        """A branch is either inline sub-actions or the name of an action whose sub-actions run inline."""
+        if isinstance(spec.get(list_key), list):
+            return spec[list_key]
+        return spec.get(action_key) or None
+
+    def _compile_branch(self, config):
+        sa_type = config.get('type')
+        if sa_type == "if":
+            return (compile_expression(config.get('condition') or 'false'),
+                    self._branch_target(config, 'then', 'then_action'),
+                    self._branch_target(config, 'else', 'else_action'))
+
+        if sa_type == "switch":
+            table = {}
+            for case in config.get('cases') or []:
+                matches = case.get('match')
+                target = self._branch_target(case, 'sub_actions', 'action')
+                for m in matches if isinstance(matches, list) else [matches]:
+                    table.setdefault(_case_key(m), target) # First case wins, like a switch
+            return (compile_expression(config.get('value') or 'none'), table,
+                    self._branch_target(config, 'default', 'default_action'))
+
+        # random_pick
+        targets, cum_weights, total = [], [], 0.0
+        for option in config.get('options') or []:
+            weight = float(option.get('weight', 1))
+            if weight <= 0: continue
+            total += weight
+            targets.append(self._branch_target(option, 'sub_actions', 'action'))
+            cum_weights.append(total)
+        return targets, cum_weights
+
+    async def _run_branch(self, config, ctx, depth):
+        if depth >= MAX_BRANCH_DEPTH:
+            print(f"[ActionEngine] Branch depth limit ({MAX_BRANCH_DEPTH}) reached, stopping. Does an action branch into itself?")
+            return
+        compiled = self._compiled_branch(config)
+        sa_type = config['type']
+
+        if sa_type == "if":
+            expr, then_target, else_target = compiled
+            await self._resolve_lazy(expr.names, ctx)
+            target = then_target if expr.test(ctx) else else_target
+        elif sa_type == "switch":
+            expr, table, default = compiled
+            await self._resolve_lazy(expr.names, ctx)
+            target = table.get(_case_key(expr.evaluate(ctx)), default)
+        else:
+            targets, cum_weights = compiled
+            if not targets: return
+            target = random.choices(targets, cum_weights=cum_weights)[0]
+
+        if isinstance(target, str):
+            action = self.actions_by_name.get(target)
+            if action is None:
+                print(f"[Action] Branch target '{target}' not found.")
+                return
+            target = action.get('sub_actions', [])
+        if target:
+            await self.run_sub_actions(target, ctx, depth + 1)
+
+    async def _resolve_game(self, ctx):
+        if "user" not in ctx: return None
+        if not self.twitch:
+            return "Unbekannt (Bot offline)"
+        print(f"[ActionEngine] Fetching game for {ctx['user']}...")
+        game = await self.twitch.get_user_last_game(ctx['user'])
+        print(f"[ActionEngine] Game found: {game}")
+        return game
+
+
+def _duplicate_names(actions):
+    """{name: count} of names used more than once; unnamed actions are counted under None."""
+    counts = {}
+    for action in actions:
+        name = action.get('name')
+        counts[name] = counts.get(name, 0) + 1
+    return {name: n for name, n in counts.items() if n > 1 or name is None}
+
+
+def _case_key(value):
+    """switch matching: case-insensitive text, 1 == "1" == 1.0"""
+    if isinstance(value, bool) or value is None:
+        return str(value).lower()
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip().lower()
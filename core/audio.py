@@ -0,0 +1,629 @@
+import os
+import sys
+import queue
+import asyncio
+import itertools
+import threading
+import multiprocessing
+from collections import OrderedDict
+
+import pygame.mixer as sa
+
+
+class SoundCache:
+    """
+    LRU cache of decoded pygame Sound objects, keyed by path + mtime.
+    Bounded by item count and by decoded bytes. Thread-safe (sounds are played from worker threads).
+    """
+    def __init__(self, max_items=128, max_bytes=64 * 1024 * 1024):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._items = OrderedDict() # path -> (mtime, sound, nbytes)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        """Returns a decoded Sound for path. Decodes (and caches) on miss."""
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            entry = self._items.get(path)
+            if entry and entry[0] == mtime:
+                self._items.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # Decode outside the lock, it's the slow part
+        sound = sa.Sound(path)
+        self._put(path, mtime, sound)
+        return sound
+
+    def warm(self, paths):
+        """Pre-decodes the given files. Missing/broken files are skipped."""
+        loaded = 0
+        for path in paths:
+            try:
+                if not os.path.exists(path): continue
+                mtime = os.path.getmtime(path)
+                with self._lock:
+                    entry = self._items.get(path)
+                    if entry and entry[0] == mtime: continue
+                self._put(path, mtime, sa.Sound(path))
+                loaded += 1
+            except Exception as e:
+                print(f"[SoundCache] Could not preload {os.path.basename(path)}: {e}")
+        return loaded
+
+    def clear(self):
+        """Drops all entries (required when the mixer is re-initialized, Sounds belong to it)."""
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "items": len(self._items),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _put(self, path, mtime, sound):
+        nbytes = self._sound_bytes(sound)
+        if nbytes > self.max_bytes:
+            return # Too big to cache, play it uncached
+
+        with self._lock:
+            old = self._items.pop(path, None)
+            if old:
+                self.bytes -= old[2]
+            self._items[path] = (mtime, sound, nbytes)
+            self.bytes += nbytes
+
+            while self._items and (len(self._items) > self.max_items or self.bytes > self.max_bytes):
+                _, (_, _, freed) = self._items.popitem(last=False)
+                self.bytes -= freed
+
+    @staticmethod
+    def _sound_bytes(sound):
+        # Decoded size = length * frequency * channels * sample size (avoids copying get_raw())
+        init = sa.get_init()
+        if not init:
+            return 0
+        freq, fmt, channels = init
+        return int(sound.get_length() * freq * channels * (abs(fmt) // 8))
+
+
+class _TrackLoader(threading.Thread):
+    """
+    Decodes the next playlist track in the background. The device worker keeps serving
+    commands (SFX alerts!) meanwhile instead of waiting behind a multi-second decode.
+    Creating a Sound only reads the opened mixer's format, it doesn't touch channels or
+    playback, so it can run beside the worker; the mixer must not be closed meanwhile
+    (MixerBackend.close() waits for running loaders).
+    """
+    def __init__(self, path):
+        super().__init__(name=f"TrackLoader[{os.path.basename(path)}]", daemon=True)
+        self.path = path
+        self.sound = None
+        self.error = None
+        self.start()
+
+    def run(self):
+        try:
+            self.sound = sa.Sound(self.path)
+        except Exception as e:
+            self.error = e
+
+    def result(self):
+        """The decoded Sound. Only blocks if the track is still decoding (it was due sooner than expected)."""
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return self.sound
+
+
+_PENDING = object() # Command result: resolved later, once the channel has finished
+
+POLL_INTERVAL = 0.05 # How often finished channels are checked while something is awaited
+
+
+class MixerBackend:
+    """
+    Executes the audio commands for ONE output device.
+    Must only be used from the thread that owns the mixer.
+    """
+    def __init__(self, device_name, sound_cache=None):
+        self.device_name = device_name or 'Default' # Requested device
+        self.device = None # Actually opened device (may fall back to 'Default')
+        self.cache = sound_cache or SoundCache()
+        self._track = None # (sound, channel) of the current playlist track
+        self._next_track = None # _TrackLoader decoding the next track while the current one plays
+        self._loaders = [] # Loaders started, incl. replaced ones that are still decoding
+        self._waiters = [] # [(channel, sound, token, result)]
+
+        # Streaming playlist (mixer.music): decodes incrementally, one stream per device
+        self._stream_current = None # Path of the streamed track
+        self._stream_queued = None # Path queued via music.queue (gapless)
+        self._stream_waiter = None # Token resolved when the streamed track has ended
+        self._stream_replaced = [] # [(token, result)] of streamed tracks that were replaced
+        self._stream_pos = 0 # Last seen music position (ms)
+        self._stream_fade_at = None # Position (ms) at which the fade-out starts
+        self._stream_fade_ms = 0
+
+    def execute(self, token, cmd, args):
+        self._ensure_open()
+        result = getattr(self, f"_cmd_{cmd}")(*args)
+        if isinstance(result, tuple) and result and result[0] is _PENDING:
+            _, channel, sound, value = result
+            if channel is None:
+                if self._stream_waiter is not None:
+                    # Previous streamed track got replaced, report it as ended
+                    self._stream_replaced.append((self._stream_waiter, self._stream_pos / 1000.0))
+                self._stream_waiter = token # Streamed track, see _poll_stream
+            else:
+                self._waiters.append((channel, sound, token, value))
+            return _PENDING
+        return result
+
+    def has_waiters(self):
+        return bool(self._waiters) or self._stream_waiter is not None or bool(self._stream_replaced)
+
+    def poll(self, force=False):
+        """Returns [(token, result)] for waited-on channels that have finished."""
+        done, still_waiting = [], []
+        for channel, sound, token, value in self._waiters:
+            if force or not channel.get_busy() or channel.get_sound() is not sound:
+                done.append((token, value))
+            else:
+                still_waiting.append((channel, sound, token, value))
+        self._waiters = still_waiting
+
+        if self._stream_replaced:
+            done.extend(self._stream_replaced)
+            self._stream_replaced = []
+        if self._stream_waiter is not None:
+            self._poll_stream(done, force)
+        return done
+
+    def _poll_stream(self, done, force):
+        pos = sa.music.get_pos() if sa.get_init() else -1
+        busy = sa.get_init() and sa.music.get_busy()
+        # music.get_pos() only grows within a track and restarts at 0 when a queued track takes over
+        switched = busy and self._stream_queued and 0 <= pos < self._stream_pos
+
+        if force or not busy or switched:
+            done.append((self._stream_waiter, self._stream_pos / 1000.0)) # Measured duration
+            self._stream_waiter = None
+            self._stream_fade_at = None
+            if switched:
+                self._stream_current, self._stream_queued = self._stream_queued, None
+            elif not busy:
+                self._stream_current = None
+            self._stream_pos = max(pos, 0)
+            return
+
+        self._stream_pos = pos
+        if self._stream_fade_at is not None and pos >= self._stream_fade_at:
+            # Fade-out/fade-in (no overlap, mixer.music is one stream): fade the tail out,
+            # the next track fades in when this one has ended
+            self._stream_fade_at = None
+            sa.music.fadeout(self._stream_fade_ms)
+
+    def close(self):
+        for loader in self._loaders:
+            loader.join() # Don't quit the mixer under a decode
+        self._loaders.clear()
+        self._next_track = None
+        if sa.get_init():
+            sa.quit()
+
+    def _ensure_open(self):
+        if sa.get_init(): return
+
+        try:
+            # 'Default' means the system default device
+            dev = self.device_name if self.device_name != 'Default' else None
+            sa.init(devicename=dev)
+            self.device = self.device_name
+        except Exception as e:
+            print(f"[Audio] Failed to init device {self.device_name}: {e}. Fallback to default.")
+            sa.init()
+            self.device = 'Default'
+        print(f"[Audio] Output device opened: {self.device}")
+
+    def _cmd_play_sound(self, path, volume):
+        try:
+            print(f"[Debug] play_sound: {os.path.basename(path)} @ {volume:.2f}")
+
+            # Cached Sounds are shared, so the volume goes on the channel, not the Sound.
+            sound = self.cache.get(path)
+            channel = sound.play()
+            if channel:
+                channel.set_volume(volume)
+            return sound.get_length()
+
+        except Exception as e:
+            print(f"[Sound Error] Failed to play {os.path.basename(path)}: {e}")
+            # Hint for the user
+            if "mpg123" in str(e) or "unrecognized" in str(e):
+                 print("[Hint] The file might be corrupted or renamed incorrectly (e.g. mp3 extension on a wav file). Try converting it.")
+            return 0
+
+    def _cmd_play_track(self, path, volume):
+        try:
+            self._cmd_stop_track()
+
+            # Music is not cached (too big, played once), but may be pre-decoded
+            loader, self._next_track = self._next_track, None
+            if loader and loader.path == path:
+                snd = loader.result()
+            else:
+                snd = sa.Sound(path)
+            channel = snd.play()
+            if not channel:
+                return 0
+            channel.set_volume(volume)
+            self._track = (snd, channel)
+            return (_PENDING, channel, snd, snd.get_length())
+        except Exception as e:
+            print(f"[Playlist] Failed to play {os.path.basename(path)}: {e}")
+            return 0
+
+    def _cmd_preload_track(self, path):
+        """Starts decoding the next playlist track on a loader thread, so it starts without a gap."""
+        if self._next_track and self._next_track.path == path:
+            return True
+        self._loaders = [l for l in self._loaders if l.is_alive()]
+        self._next_track = _TrackLoader(path) # A replaced loader just finishes and is dropped
+        self._loaders.append(self._next_track)
+        return True
+
+    def _cmd_stream_track(self, path, volume, fade_ms=0, duration_hint=None):
+        """
+        Streams a playlist track via mixer.music (no full decode, constant RAM).
+        Resolves once the track has ended. If the track was queued via queue_track and
+        has already taken over, it just keeps playing (gapless).
+        """
+        try:
+            if not (self._stream_current == path and sa.music.get_busy()):
+                self._cmd_stop_track()
+                sa.music.load(path)
+                sa.music.play(fade_ms=int(fade_ms or 0))
+                self._stream_current = path
+                self._stream_pos = 0
+            sa.music.set_volume(volume)
+            self._stream_queued = None
+
+            # The fade-out needs to know the end: duration from the file header (TrackIndex.probe_duration)
+            self._stream_fade_ms = int(fade_ms or 0)
+            self._stream_fade_at = None
+            if self._stream_fade_ms and duration_hint:
+                self._stream_fade_at = max(0, duration_hint * 1000 - self._stream_fade_ms)
+            return (_PENDING, None, None, None)
+        except Exception as e:
+            print(f"[Playlist] Failed to stream {os.path.basename(path)}: {e}")
+            self._stream_current = None
+            return 0
+
+    def _cmd_queue_track(self, path):
+        """Queues the next streamed track, it starts right when the current one ends."""
+        try:
+            sa.music.queue(path)
+            self._stream_queued = path
+            return True
+        except Exception as e:
+            print(f"[Playlist] Failed to queue {os.path.basename(path)}: {e}")
+            return False
+
+    def _cmd_set_track_volume(self, volume):
+        if self._stream_current:
+            sa.music.set_volume(volume)
+            return True
+        if self._track:
+            self._track[1].set_volume(volume)
+            return True
+        return False
+
+    def _cmd_fade_track(self, ms):
+        self._next_track = None # Playlist stopped, don't keep the pre-decoded track around
+        if self._stream_current:
+            sa.music.fadeout(ms)
+            self._stream_current = None
+            self._stream_queued = None
+        if self._track:
+            self._track[1].fadeout(ms)
+            self._track = None
+
+    def _cmd_stop_track(self):
+        if self._stream_current:
+            sa.music.stop()
+            self._stream_current = None
+            self._stream_queued = None
+        if self._track:
+            self._track[1].stop()
+            self._track = None
+
+    def _cmd_stop_all(self):
+        sa.stop() # Stops all playback on all channels of this device
+        self._cmd_stop_track()
+
+    def _cmd_preload(self, paths):
+        loaded = self.cache.warm(paths)
+        print(f"[SoundCache] Preloaded {loaded} sounds on {self.device} ({self.cache.bytes / 1048576:.1f} MB).")
+        return loaded
+
+    def _cmd_stats(self):
+        stats = self.cache.stats()
+        stats["device"] = self.device
+        return stats
+
+
+def _serve(backend, get, send):
+    """Command loop shared by the thread and the process worker."""
+    while True:
+        try:
+            item = get(timeout=POLL_INTERVAL if backend.has_waiters() else None)
+        except queue.Empty:
+            item = False
+
+        if item is None:
+            break
+
+        if item:
+            token, cmd, args = item
+            try:
+                result = backend.execute(token, cmd, args)
+                if result is not _PENDING:
+                    send(token, result, None)
+            except Exception as e:
+                send(token, None, e)
+
+        for token, result in backend.poll():
+            send(token, result, None)
+
+    for token, result in backend.poll(force=True):
+        send(token, result, None)
+    backend.close()
+
+
+class AudioWorker:
+    """
+    Owns the pygame mixer for one output device on one long-lived thread.
+
+    The event loop sends commands (play/stop/fade/volume) through a queue,
+    results and playback completion come back as asyncio futures. Only this thread
+    opens, plays, stops and closes the mixer, so nothing races with running sounds and
+    audio doesn't occupy the default executor. The one exception is _TrackLoader, which
+    decodes the next playlist track on a short-lived thread (no playback calls).
+    """
+    def __init__(self, device='Default'):
+        self.device = device or 'Default'
+        self._pending = {} # token -> (loop, future)
+        self._tokens = itertools.count()
+        self._started = False
+
+    # --- Event loop side ---
+
+    def submit(self, cmd, *args):
+        """Queues a command, returns an asyncio future with its result."""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        if not self._started:
+            self._start()
+            self._started = True
+        token = next(self._tokens)
+        self._pending[token] = (loop, fut)
+        self._send((token, cmd, args))
+        return fut
+
+    async def play_sound(self, path, volume=1.0):
+        """Starts an SFX (overlapping allowed). Returns its duration once started."""
+        return await self.submit("play_sound", path, volume)
+
+    async def play_track(self, path, volume=1.0):
+        """Plays a playlist track (replaces the current one). Returns its duration once it has ENDED."""
+        return await self.submit("play_track", path, volume)
+
+    async def preload_track(self, path):
+        """Starts pre-decoding the next playlist track in the background. Returns right away."""
+        return await self.submit("preload_track", path)
+
+    async def stream_track(self, path, volume=1.0, fade_ms=0, duration_hint=None):
+        """Streams a playlist track via mixer.music. Returns the played duration once it has ENDED."""
+        return await self.submit("stream_track", path, volume, fade_ms, duration_hint)
+
+    async def queue_track(self, path):
+        """Queues the next streamed track (gapless)."""
+        return await self.submit("queue_track", path)
+
+    async def set_track_volume(self, volume):
+        return await self.submit("set_track_volume", volume)
+
+    async def fade_track(self, ms):
+        return await self.submit("fade_track", ms)
+
+    async def stop_track(self):
+        return await self.submit("stop_track")
+
+    async def stop_all(self):
+        return await self.submit("stop_all")
+
+    async def preload(self, paths):
+        return await self.submit("preload", paths)
+
+    async def stats(self):
+        return await self.submit("stats")
+
+    def shutdown(self):
+        if self._started:
+            self._send(None)
+
+    def _deliver(self, token, result, error):
+        """Called from the worker side when a command has finished."""
+        entry = self._pending.pop(token, None)
+        if entry:
+            loop, fut = entry
+            loop.call_soon_threadsafe(_resolve, fut, result, error)
+
+    # --- Transport (in-process thread) ---
+
+    def _start(self):
+        self._queue = queue.Queue()
+        backend = MixerBackend(self.device)
+        self._thread = threading.Thread(target=_serve, args=(backend, self._queue.get, self._deliver),
+                                        name=f"Audio[{self.device}]", daemon=True)
+        self._thread.start()
+
+    def _send(self, item):
+        self._queue.put(item)
+
+
+class AudioProcessWorker(AudioWorker):
+    """
+    Same as AudioWorker, but the mixer lives in a child process.
+    pygame has one global mixer per process, so every additional output device gets its own process.
+    """
+    def _start(self):
+        ctx = multiprocessing.get_context("spawn")
+        self._cmd_queue = ctx.Queue()
+        self._res_queue = ctx.Queue()
+        os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+        self._process = ctx.Process(target=_device_process_main, args=(self.device, self._cmd_queue, self._res_queue),
+                                    name=f"Audio[{self.device}]", daemon=True)
+        self._process.start()
+        self._reader = threading.Thread(target=self._read_results, name=f"AudioResults[{self.device}]", daemon=True)
+        self._reader.start()
+
+    def _send(self, item):
+        self._cmd_queue.put(item)
+
+    def _read_results(self):
+        while True:
+            try:
+                item = self._res_queue.get()
+            except (EOFError, OSError):
+                break
+            if item is None:
+                break
+            if item[0] == "log":
+                print(item[1], end="")
+            else:
+                self._deliver(*item[1:])
+
+        # Process is gone, don't leave anyone waiting
+        for token in list(self._pending):
+            self._deliver(token, None, RuntimeError(f"Audio process for {self.device} stopped"))
+
+
+class _QueueWriter:
+    """stdout replacement in the device process, forwards prints to the main process log."""
+    def __init__(self, res_queue):
+        self.res_queue = res_queue
+
+    def write(self, text):
+        if text:
+            self.res_queue.put(("log", text))
+
+    def flush(self):
+        pass
+
+
+def _device_process_main(device, cmd_queue, res_queue):
+    sys.stdout = _QueueWriter(res_queue)
+
+    def send(token, result, error):
+        if error is not None:
+            error = RuntimeError(str(error)) # Keep it picklable
+        res_queue.put(("result", token, result, error))
+
+    try:
+        _serve(MixerBackend(device), cmd_queue.get, send)
+    finally:
+        res_queue.put(None)
+
+
+class AudioDevicePool:
+    """
+    Keeps every used output device open at the same time.
+    'Default' (also used when a sub-action has no device set) always lives in this process
+    (AudioWorker), every other device in its own process (AudioProcessWorker), so playlist
+    and SFX on different devices never re-init a mixer. Which device gets which worker
+    doesn't depend on the order they are first used in.
+    """
+    def __init__(self):
+        self.workers = {} # device name -> worker
+        self._track_worker = None # Worker that plays the current playlist track
+
+    def worker(self, device):
+        device = device or 'Default'
+        worker = self.workers.get(device)
+        if worker is None:
+            worker = AudioWorker(device) if device == 'Default' else AudioProcessWorker(device)
+            self.workers[device] = worker
+        return worker
+
+    async def play_sound(self, path, device=None, volume=1.0):
+        return await self.worker(device).play_sound(path, volume)
+
+    async def begin_track(self, path, device=None, volume=1.0, stream=False, fade_ms=0, duration_hint=None):
+        """
+        Starts a playlist track (decoded, or streamed via mixer.music).
+        Returns once the command is queued: a future that resolves with the duration when the track has ENDED.
+        Commands sent afterwards (queue_track/preload_track) are guaranteed to run after it.
+        """
+        worker = self.worker(device)
+        if self._track_worker and self._track_worker is not worker:
+            await self._track_worker.stop_track() # Playlist moved to another device
+        self._track_worker = worker
+        if stream:
+            return worker.submit("stream_track", path, volume, fade_ms, duration_hint)
+        return worker.submit("play_track", path, volume)
+
+    async def play_track(self, path, device=None, volume=1.0):
+        return await (await self.begin_track(path, device, volume))
+
+    async def preload_track(self, path, device=None):
+        return await self.worker(device).preload_track(path)
+
+    async def stream_track(self, path, device=None, volume=1.0, fade_ms=0, duration_hint=None):
+        return await (await self.begin_track(path, device, volume, True, fade_ms, duration_hint))
+
+    async def queue_track(self, path, device=None):
+        return await self.worker(device).queue_track(path)
+
+    async def set_track_volume(self, volume):
+        if self._track_worker:
+            return await self._track_worker.set_track_volume(volume)
+        return False
+
+    async def fade_track(self, ms):
+        if self._track_worker:
+            await self._track_worker.fade_track(ms)
+
+    async def stop_all(self):
+        await asyncio.gather(*[w.stop_all() for w in self.workers.values()], return_exceptions=True)
+
+    async def preload(self, by_device):
+        """by_device: {device_name: [paths]}"""
+        results = await asyncio.gather(*[self.worker(d).preload(list(dict.fromkeys(p))) for d, p in by_device.items()],
+                                       return_exceptions=True)
+        return sum(r for r in results if isinstance(r, int))
+
+    async def stats(self):
+        return {name: await w.stats() for name, w in self.workers.items()}
+
+    def shutdown(self):
+        for w in self.workers.values():
+            w.shutdown()
+
+
+def _resolve(fut, result, error):
+    if fut.done(): return # Cancelled by the caller
+    if error is not None:
+        fut.set_exception(error)
+    else:
+        fut.set_result(result)
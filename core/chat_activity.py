@@ -0,0 +1,116 @@
+"""
+Rolling chat activity counter.
+
+TwitchBot.event_message and YouTubeBot.handle_message call
+CHAT_ACTIVITY.record() for every chat line. Counts live in a fixed ring of
+per-second buckets, so recording is O(1) and memory doesn't grow with chat
+volume. A monotonic total per platform lets timers ask "how many lines since
+my last run" in O(1).
+
+GatedTimer uses this for timer triggers with 'min_lines': the action only
+fires once the interval has passed AND enough chat lines came in since its
+last run. On a dead chat it simply waits.
+"""
+import time
+from array import array
+
+
+class ChatActivity:
+    def __init__(self, window=3600, clock=time.monotonic):
+        self.window = window # Seconds covered by recent()
+        self.clock = clock
+        self._secs = array('q', [-1]) * window # Second that each slot currently counts
+        self._counts = array('L', [0]) * window
+        self.total = 0
+        self.totals = {} # platform -> lines since start
+        self._listeners = set()
+
+    def record(self, platform=None):
+        sec = int(self.clock())
+        i = sec % self.window
+        if self._secs[i] != sec: # Slot belongs to an older second -> reuse it
+            self._secs[i] = sec
+            self._counts[i] = 0
+        self._counts[i] += 1
+
+        self.total += 1
+        if platform:
+            self.totals[platform] = self.totals.get(platform, 0) + 1
+        if self._listeners:
+            for listener in list(self._listeners):
+                listener(platform)
+
+    def total_for(self, platform=None):
+        """Monotonic line count (all platforms or one), compare two readings for 'lines since'."""
+        return self.total if not platform else self.totals.get(platform, 0)
+
+    def recent(self, seconds=60):
+        """Lines in the last 'seconds' (max. window)."""
+        now = int(self.clock())
+        seconds = min(int(seconds), self.window)
+        count = 0
+        for sec in range(now - seconds + 1, now + 1):
+            i = sec % self.window
+            if self._secs[i] == sec:
+                count += self._counts[i]
+        return count
+
+    def add_listener(self, callback):
+        self._listeners.add(callback)
+
+    def remove_listener(self, callback):
+        self._listeners.discard(callback)
+
+
+# Shared by the chat bots (writers) and the ActionEngine (reader)
+CHAT_ACTIVITY = ChatActivity()
+
+
+class GatedTimer:
+    """Timer that needs a minimum elapsed time AND a minimum number of chat lines since its last run."""
+
+    def __init__(self, timers, activity, interval, min_lines, callback, *args, name=None, platform=None):
+        self.timers = timers
+        self.activity = activity
+        self.interval = float(interval)
+        self.min_lines = int(min_lines)
+        self.platform = platform
+        self.callback = callback
+        self.args = args
+        self.name = name
+        self.cancelled = False
+        self._handle = None
+        self._mark = activity.total_for(platform)
+
+    def start(self):
+        self._handle = self.timers.call_later(self.interval, self._interval_passed, name=self.name, kind="gated")
+        return self
+
+    def cancel(self):
+        self.cancelled = True
+        if self._handle:
+            self._handle.cancel()
+        self.activity.remove_listener(self._on_line)
+
+    @property
+    def lines(self):
+        return self.activity.total_for(self.platform) - self._mark
+
+    def _interval_passed(self):
+        self._handle = None
+        if self.lines >= self.min_lines:
+            self._fire()
+        else:
+            self.activity.add_listener(self._on_line) # Wait for chat instead of polling
+
+    def _on_line(self, platform):
+        if self.platform and platform != self.platform: return
+        if self.lines >= self.min_lines:
+            self.activity.remove_listener(self._on_line)
+            self._fire()
+
+    def _fire(self):
+        if self.cancelled: return
+        self._mark = self.activity.total_for(self.platform)
+        self.start() # Interval counts from this run
+        self.callback(*self.args)
@@ -0,0 +1,120 @@
+"""
+Safe writing of YAML config files.
+
+write_yaml_atomic() writes to a temp file in the same directory, fsyncs it and
+renames it over the target, so readers (GUI, next start) never see a
+half-written file, even if the process dies mid-write.
+
+DebouncedYamlWriter coalesces many save requests within a short window into
+one write that runs off the event loop.
+"""
+import asyncio
+import copy
+import os
+import stat
+import tempfile
+import threading
+
+import yaml
+
+
+def _file_mode(path):
+    """Permissions the written file should get: those of the file it replaces, else 0666 minus umask."""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def write_yaml_atomic(path, data):
+    path = os.path.abspath(path)
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            yaml.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, _file_mode(path)) # mkstemp creates 0600
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    # Persist the rename itself (not possible/needed on Windows)
+    if hasattr(os, "O_DIRECTORY"):
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        except OSError:
+            pass
+
+
+class DebouncedYamlWriter:
+    """
+    schedule() marks the file dirty. After 'delay' seconds the data is taken
+    once from snapshot() (on the loop, so it's consistent) and written in a
+    worker thread. flush() writes pending changes synchronously (shutdown).
+    """
+
+    def __init__(self, path, snapshot, delay=0.5):
+        self.path = path
+        self.snapshot = snapshot # fn() -> data to dump, called on the event loop
+        self.delay = delay
+        self._handle = None # Pending call_later
+        self._write_lock = threading.Lock() # One write at a time, keeps order
+        self.writes = 0
+
+    @property
+    def pending(self):
+        return self._handle is not None
+
+    def schedule(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(self._take_snapshot()) # No loop (startup/shutdown): write directly
+            return
+        if self._handle is None:
+            self._handle = loop.call_later(self.delay, self._fire, loop)
+
+    def flush(self):
+        """Writes pending changes now (blocking). Safe to call if nothing is pending."""
+        if self._handle is None:
+            with self._write_lock:
+                return # Just wait for a write that is in progress
+        self._handle.cancel()
+        self._handle = None
+        self._write(self._take_snapshot())
+
+    def discard(self):
+        """Drops a pending write (the file was replaced externally and is reloaded)."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _fire(self, loop):
+        self._handle = None
+        data = self._take_snapshot()
+        loop.run_in_executor(None, self._write, data)
+
+    def _take_snapshot(self):
+        # Deep copy: the loop keeps mutating the live structures while the thread dumps
+        return copy.deepcopy(self.snapshot())
+
+    def _write(self, data):
+        with self._write_lock:
+            try:
+                write_yaml_atomic(self.path, data)
+                self.writes += 1
+                print(f"[Config] Saved {os.path.basename(self.path)}.")
+            except Exception as e:
+                print(f"[Config] Error saving {self.path}: {e}")
@@ -0,0 +1,175 @@
+"""
+Cooldown and rate-limit store for the ActionEngine.
+
+Action config keys:
+    cooldown: 30             global, one run per 30s (as before)
+    user_cooldown: 120       per chat user
+    platform_cooldown: 10    per platform (twitch / youtube)
+    rate_limit:              sliding window, N runs per M seconds
+      count: 3
+      per: 60
+      scope: user            global | user | platform (default: global)
+
+rate_limit may also be a list of such windows. All lookups are dict hits on
+(action, scope, key); expired entries are removed by a periodic sweep so the
+store doesn't grow with every user who ever chatted. With a StateStore
+attached, every recorded run is also persisted, so cooldowns survive a restart.
+"""
+import time
+from collections import deque
+
+SCOPES = ("global", "user", "platform")
+
+
+class CooldownStore:
+    SWEEP_INTERVAL = 60 # s
+
+    def __init__(self, clock=time.time, store=None):
+        self.clock = clock
+        self.store = store # Optional StateStore (put_cooldown / put_window)
+        self._until = {}   # (action, scope, key) -> timestamp until which it is blocked
+        self._windows = {} # (action, scope, key, per) -> (count, per, deque of run timestamps)
+        self._last_sweep = clock()
+
+    def __len__(self):
+        return len(self._until) + len(self._windows)
+
+    # --- Rules ---
+    @staticmethod
+    def _rules(action):
+        """[(scope, seconds)] fixed cooldowns and [(scope, count, per)] windows of an action."""
+        fixed = []
+        for scope, cfg_key in (("global", "cooldown"), ("user", "user_cooldown"), ("platform", "platform_cooldown")):
+            try:
+                seconds = float(action.get(cfg_key, 0) or 0)
+            except (TypeError, ValueError):
+                continue
+            if seconds > 0:
+                fixed.append((scope, seconds))
+
+        windows = []
+        limits = action.get('rate_limit') or []
+        if isinstance(limits, dict):
+            limits = [limits]
+        for limit in limits:
+            try:
+                count, per = int(limit.get('count', 0)), float(limit.get('per', 0))
+            except (AttributeError, TypeError, ValueError):
+                continue
+            scope = limit.get('scope', 'global')
+            if count > 0 and per > 0 and scope in SCOPES:
+                windows.append((scope, count, per))
+        return fixed, windows
+
+    @staticmethod
+    def _scope_key(scope, ctx):
+        if scope == "global":
+            return ""
+        if scope == "user":
+            return str(ctx.get('user', '')).lower() or None
+        return str(ctx.get('platform', '')).lower() or None
+
+    # --- Public API ---
+    def acquire(self, action, ctx, now=None):
+        """
+        Checks all cooldowns/limits of the action and, if none blocks, records the run.
+        Returns (True, None) or (False, "scope cooldown (12.3s left)").
+        Scopes without a key (e.g. no user for a timer run) don't apply.
+        """
+        now = self.clock() if now is None else now
+        if now - self._last_sweep > self.SWEEP_INTERVAL:
+            self.sweep(now)
+
+        fixed, windows = self._rules(action)
+        if not fixed and not windows:
+            return True, None
+        name = action.get('name', '')
+
+        # 1. Check everything first, so a blocked run doesn't consume any window
+        for scope, _ in fixed:
+            key = self._scope_key(scope, ctx)
+            if key is None: continue
+            until = self._until.get((name, scope, key), 0)
+            if until > now:
+                return False, f"{scope} cooldown ({until - now:.1f}s left)"
+
+        for scope, count, per in windows:
+            key = self._scope_key(scope, ctx)
+            if key is None: continue
+            entry = self._windows.get((name, scope, key, per))
+            if entry:
+                runs = entry[2]
+                while runs and runs[0] <= now - per:
+                    runs.popleft()
+                if len(runs) >= count:
+                    return False, f"{scope} limit {count}/{per:g}s ({runs[0] + per - now:.1f}s left)"
+
+        # 2. Record
+        for scope, seconds in fixed:
+            key = self._scope_key(scope, ctx)
+            if key is None: continue
+            self._until[(name, scope, key)] = now + seconds
+            if self.store:
+                self.store.put_cooldown((name, scope, key), now + seconds)
+
+        for scope, count, per in windows:
+            key = self._scope_key(scope, ctx)
+            if key is None: continue
+            entry = self._windows.get((name, scope, key, per))
+            if entry is None or entry[0] != count:
+                entry = self._windows[(name, scope, key, per)] = (count, per, deque(entry[2] if entry else ()))
+            entry[2].append(now)
+            if self.store:
+                self.store.put_window((name, scope, key, per), count, entry[2])
+        return True, None
+
+    def release(self, action, ctx, now):
+        """
+        Undoes the run acquire() recorded at 'now' (the scheduler dropped it, so it
+        must not use up the cooldown or a slot of the window).
+        """
+        fixed, windows = self._rules(action)
+        name = action.get('name', '')
+        for scope, seconds in fixed:
+            key = self._scope_key(scope, ctx)
+            if key is None: continue
+            # acquire() only recorded if the old cooldown had expired, so there is nothing to restore
+            if self._until.get((name, scope, key)) == now + seconds:
+                del self._until[(name, scope, key)]
+                if self.store:
+                    self.store.put_cooldown((name, scope, key), now) # Expired, removed on the next flush
+
+        for scope, count, per in windows:
+            key = self._scope_key(scope, ctx)
+            if key is None: continue
+            entry = self._windows.get((name, scope, key, per))
+            if entry and now in entry[2]:
+                entry[2].remove(now)
+                if self.store:
+                    self.store.put_window((name, scope, key, per), count, entry[2])
+
+    def restore(self, until, windows):
+        """Loads persisted state (see StateStore.load_cooldowns)."""
+        self._until.update(until)
+        for k, (count, runs) in windows.items():
+            self._windows[k] = (count, k[3], deque(runs))
+
+    def reset(self, action_name=None):
+        """Clears cooldowns of one action (or all)."""
+        if action_name is None:
+            self._until.clear()
+            self._windows.clear()
+            return
+        for k in [k for k in self._until if k[0] == action_name]:
+            del self._until[k]
+        for k in [k for k in self._windows if k[0] == action_name]:
+            del self._windows[k]
+
+    def sweep(self, now=None):
+        """Drops expired cooldowns and windows without runs in their period."""
+        now = self.clock() if now is None else now
+        self._last_sweep = now
+        for k in [k for k, until in self._until.items() if until <= now]:
+            del self._until[k]
+        for k in [k for k, (_, per, runs) in self._windows.items() if not runs or runs[-1] <= now - per]:
+            del self._windows[k]
@@ -1 +1,188 @@
+"""
+In-process event bus.
 
+Producers (Twitch/YouTube bots, OBS, the ActionEngine itself) publish
+events; consumers subscribe to them independently:
+
+    bus.subscribe(fn, topics=["ChatMessage", "Twitch*"], name="...")
+
+Sync subscribers (plain functions) are called inline in publish(), in
+publish order. They must be fast and non-blocking (e.g. the WebSocket
+fan-out only enqueues, the recorder only buffers a line).
+
+Async subscribers (coroutine functions) get a bounded queue and worker
+tasks. Events of the same source (twitch, youtube, obs, ...) are handled
+strictly in order; different sources run concurrently, so a slow YouTube
+event doesn't hold up Twitch chat. A full queue drops the oldest
+(or, with policy="drop_new", the incoming) event and counts it.
+
+publish() never awaits, so a slow subscriber can't slow down a producer.
+"""
+import asyncio
+import inspect
+import itertools
+import time
+from collections import deque
+from fnmatch import fnmatchcase
+
+
+class Event:
+    __slots__ = ("type", "data", "source", "seq", "time")
+
+    def __init__(self, event_type, data, source, seq):
+        self.type = event_type
+        self.data = data
+        self.source = source
+        self.seq = seq # Global publish order
+        self.time = time.time()
+
+    def __repr__(self):
+        return f"Event({self.type!r}, source={self.source!r}, seq={self.seq})"
+
+
+def event_source(event_type, data):
+    """Default source: the platform field of the payload ("twitch", "youtube"), otherwise "system"."""
+    if isinstance(data, dict):
+        platform = data.get("platform")
+        if platform:
+            return str(platform).lower()
+    return "system"
+
+
+class Subscription:
+    def __init__(self, bus, callback, topics, name, is_async, max_queue, policy):
+        self.bus = bus
+        self.callback = callback
+        self.name = name or getattr(callback, "__qualname__", repr(callback))
+        self.is_async = is_async
+        self.max_queue = max_queue
+        self.policy = policy
+        self.topics = None
+        self._exact, self._patterns = set(), []
+        self.set_topics(topics)
+
+        self.handled = 0
+        self.dropped = 0
+        self.errors = 0
+        self.queued = 0
+        self._lanes = {} # source -> deque of events (async only)
+        self._workers = {} # source -> task draining that lane
+        self.active = True
+
+    def set_topics(self, topics):
+        if isinstance(topics, str):
+            topics = [topics]
+        topics = [t for t in topics or [] if t]
+        if not topics or "*" in topics:
+            self.topics, self._exact, self._patterns = None, set(), []
+        else:
+            self.topics = sorted(set(topics))
+            self._exact = {t for t in topics if not any(c in t for c in "*?[")}
+            self._patterns = [t for t in topics if t not in self._exact]
+        self.bus._routes.clear()
+
+    def wants(self, event_type):
+        if self.topics is None or event_type in self._exact:
+            return True
+        return any(fnmatchcase(event_type, p) for p in self._patterns)
+
+    def deliver(self, event):
+        if not self.is_async:
+            self._call(event)
+            return
+
+        if self.queued >= self.max_queue:
+            if self.policy == "drop_new":
+                self.dropped += 1
+                return
+            # Drop the oldest event of the longest lane
+            lane = max(self._lanes.values(), key=len)
+            lane.popleft()
+            self.queued -= 1
+            self.dropped += 1
+
+        lane = self._lanes.get(event.source)
+        if lane is None:
+            lane = self._lanes[event.source] = deque()
+        lane.append(event)
+        self.queued += 1
+        if event.source not in self._workers:
+            self._workers[event.source] = asyncio.create_task(self._drain(event.source))
+
+    def _call(self, event):
+        try:
+            self.callback(event)
+            self.handled += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"[EventBus] Error in subscriber '{self.name}' ({event.type}): {e}")
+
+    async def _drain(self, source):
+        lane = self._lanes[source]
+        try:
+            while lane and self.active:
+                event = lane.popleft()
+                self.queued -= 1
+                try:
+                    await self.callback(event)
+                    self.handled += 1
+                except Exception as e:
+                    self.errors += 1
+                    print(f"[EventBus] Error in subscriber '{self.name}' ({event.type}): {e}")
+        finally:
+            # Worker ends with its lane, the next event of this source starts a new one
+            self._workers.pop(source, None)
+            if not lane:
+                self._lanes.pop(source, None)
+
+    def cancel(self):
+        self.active = False
+        for task in list(self._workers.values()):
+            task.cancel()
+        self._workers.clear()
+        self._lanes.clear()
+        self.queued = 0
+        self.bus._unsubscribe(self)
+
+    def stats(self):
+        return {"name": self.name, "async": self.is_async, "topics": self.topics, "handled": self.handled,
+                "queued": self.queued, "dropped": self.dropped, "errors": self.errors,
+                "sources": sorted(self._lanes)}
+
+
+class EventBus:
+    def __init__(self):
+        self._subs = []
+        self._routes = {} # event_type -> subscriptions that want it (reset when subscriptions change)
+        self._seq = itertools.count(1)
+        self.published = 0
+
+    def subscribe(self, callback, topics=None, name=None, max_queue=1000, policy="drop_oldest"):
+        """callback(event). Coroutine functions are async subscribers (own queue), others are called inline."""
+        sub = Subscription(self, callback, topics, name, inspect.iscoroutinefunction(callback), max_queue, policy)
+        self._subs.append(sub)
+        self._routes.clear()
+        return sub
+
+    def _unsubscribe(self, sub):
+        if sub in self._subs:
+            self._subs.remove(sub)
+            self._routes.clear()
+
+    def publish(self, event_type, data=None, source=None):
+        """Delivers to all subscribers of event_type; never awaits. Must be called from the event loop thread."""
+        event = Event(event_type, data, source or event_source(event_type, data), next(self._seq))
+        self.published += 1
+        subs = self._routes.get(event_type)
+        if subs is None:
+            subs = self._routes[event_type] = tuple(s for s in self._subs if s.wants(event_type))
+        for sub in subs:
+            sub.deliver(event)
+        return event
+
+    def stats(self):
+        return {"published": self.published, "subscribers": [s.stats() for s in list(self._subs)]}
+
+    def close(self):
+        for sub in list(self._subs):
+            sub.cancel()
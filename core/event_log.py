@@ -0,0 +1,64 @@
+"""
+Compact event log for record & replay.
+
+One JSON array per line: [seconds since recording start, event_type, data].
+Files ending in .gz are gzip-compressed. Written by EventRecorder (a subscriber
+on the event bus), read by core/replay.py.
+"""
+import gzip
+import json
+import os
+import time
+
+
+def _open(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class EventRecorder:
+    FLUSH_EVERY = 2.0 # s, buffered writes; close() writes the rest
+
+    # Events that are only chatter between bot and dashboards, not inputs for the ActionEngine
+    SKIP_EVENTS = ("ActionStats", "ActionTraces", "TimerSchedule")
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = _open(path, "w")
+        self._t0 = time.monotonic()
+        self._last_flush = self._t0
+        self.count = 0
+        print(f"[Recorder] Recording events to {path}")
+
+    def record(self, event_type, data):
+        if self._file is None or event_type in self.SKIP_EVENTS:
+            return
+        now = time.monotonic()
+        try:
+            line = json.dumps([round(now - self._t0, 4), event_type, data], separators=(",", ":"), default=str)
+        except (TypeError, ValueError):
+            return
+        self._file.write(line + "\n")
+        self.count += 1
+        if now - self._last_flush > self.FLUSH_EVERY:
+            self._file.flush()
+            self._last_flush = now
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            print(f"[Recorder] {self.count} events written to {self.path}")
+
+
+def read_events(path):
+    """Yields (t, event_type, data) from a recording."""
+    with _open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line: continue
+            t, event_type, data = json.loads(line)
+            yield t, event_type, data
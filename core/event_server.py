@@ -1,53 +1,359 @@
 import asyncio
+import contextvars
+import inspect
+import uuid
 import websockets
 import json
+from collections import deque
+from fnmatch import fnmatchcase
+from core.event_bus import EventBus
+
+# What happens when a client's outgoing queue is full (browser source stalled, tab in background, ...)
+SLOW_CLIENT_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+# Not kept for replays: dashboard request/response chatter
+NO_HISTORY = ("ActionStats", "ActionTraces", "TimerSchedule")
+# Bus-only events for internal listeners (ActionEngine triggers, recorder): never sent to WebSocket clients
+INTERNAL_EVENTS = ("obs_scene",)
+# Snapshots of a current state: each replaces the previous one, so only the newest is kept for replays
+STATE_EVENTS = ("BadgeMapping", "BotStatus", "RewardsUpdated")
+
+
+class ClientConnection:
+    """
+    One WebSocket client with a bounded outgoing queue, drained by its own writer task.
+    broadcast() only enqueues, so a stalled socket never delays the other clients.
+
+    Policies for a full queue:
+        drop_oldest  the oldest queued event is dropped                          [default]
+        coalesce     the new event replaces a queued one of the same type (e.g. an older
+                     ActionStats/RewardsUpdated), otherwise the oldest is dropped
+        disconnect   the client is closed (it reconnects and starts fresh)
+
+    Batching (opt-in per client): events are collected for batch_ms (or until batch_max are
+    queued) and sent as one JSON array frame. The payloads are already serialized, so a batch
+    is only a string join, no second json.dumps.
+    """
+
+    def __init__(self, websocket, max_queue=256, policy="drop_oldest"):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.policy = policy if policy in SLOW_CLIENT_POLICIES else "drop_oldest"
+        self.queue = deque() # [event_type, payload] entries
+        self._latest = {} # event_type -> its newest queued entry (coalesce)
+        self._wakeup = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.frames = 0
+        self.batch_ms = 0 # 0 = one frame per event
+        self.batch_max = 50
+        self.closing = False
+        self.topics = None # None = everything (clients that never subscribe, e.g. older overlays)
+        self._exact = set()
+        self._patterns = []
+        self.task = asyncio.create_task(self._writer())
+
+    def subscribe(self, topics):
+        """topics: event types or patterns ("YouTube*"); None, [] or "*" = everything."""
+        if isinstance(topics, str):
+            topics = [topics]
+        topics = [str(t) for t in topics or [] if t]
+        if not topics or "*" in topics:
+            self.topics = None
+            self._exact, self._patterns = set(), []
+            return
+        self.topics = sorted(set(topics))
+        self._exact = {t for t in topics if not any(c in t for c in "*?[")}
+        self._patterns = [t for t in topics if t not in self._exact]
+
+    def set_batching(self, ms, max_events):
+        self.batch_ms = max(0, int(ms))
+        self.batch_max = max(1, int(max_events))
+
+    def wants(self, event_type):
+        if self.topics is None or event_type in self._exact:
+            return True
+        return any(fnmatchcase(event_type, p) for p in self._patterns)
+
+    def enqueue(self, event_type, payload):
+        if self.closing:
+            return False
+        if len(self.queue) >= self.max_queue:
+            if self.policy == "disconnect":
+                print(f"[WS] Client too slow ({len(self.queue)} queued), disconnecting.")
+                self.close(1008, "slow consumer")
+                return False
+            if self.policy == "coalesce":
+                pending = self._latest.get(event_type)
+                if pending is not None:
+                    pending[1] = payload # Same place in the queue, newest content
+                    self.coalesced += 1
+                    return True
+            old = self.queue.popleft()
+            if self._latest.get(old[0]) is old:
+                del self._latest[old[0]]
+            self.dropped += 1
+
+        entry = [event_type, payload]
+        self.queue.append(entry)
+        self._latest[event_type] = entry
+        self._wakeup.set()
+        return True
+
+    async def _writer(self):
+        try:
+            while True:
+                while not self.queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                if not self.batch_ms:
+                    entry = self._pop()
+                    await self.websocket.send(entry[1])
+                    self.sent += 1
+                    self.frames += 1
+                    continue
+
+                if len(self.queue) < self.batch_max:
+                    await asyncio.sleep(self.batch_ms / 1000) # Collect what else comes in (raid chat)
+                entries = [self._pop() for _ in range(min(len(self.queue), self.batch_max))]
+                if not entries: continue # Cleared by close()
+                await self.websocket.send("[" + ",".join(e[1] for e in entries) + "]")
+                self.sent += len(entries)
+                self.frames += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            self.closing = True # Connection gone, the handler unregisters it
+
+    def discard(self, predicate):
+        """Removes queued (not yet sent) entries whose event type matches."""
+        kept = deque(e for e in self.queue if not predicate(e[0]))
+        self.queue = kept
+        self._latest = {e[0]: e for e in kept}
+
+    def _pop(self):
+        entry = self.queue.popleft()
+        if self._latest.get(entry[0]) is entry:
+            del self._latest[entry[0]]
+        return entry
+
+    def close(self, code=1000, reason=""):
+        self.closing = True
+        self.queue.clear()
+        self._latest.clear()
+        asyncio.create_task(self.websocket.close(code, reason))
+
+    def stop(self):
+        self.closing = True
+        self.task.cancel()
+
+    def stats(self):
+        return {"queued": len(self.queue), "sent": self.sent, "frames": self.frames, "dropped": self.dropped,
+                "coalesced": self.coalesced, "policy": self.policy, "topics": self.topics,
+                "batch_ms": self.batch_ms}
+
+
+# Client whose message is being handled (each connection's handler runs in its own task/context)
+_requester = contextvars.ContextVar("requester", default=None)
+
 
 class EventServer:
-    def __init__(self, host, port):
+    def __init__(self, host, port, max_queue=256, slow_client_policy="drop_oldest", bus=None, history_size=100,
+                 batch_ms=25, batch_max=50):
         self.host = host
         self.port = port
-        self.clients = set()
+        self.clients = {} # websocket -> ClientConnection
+        self._routes = {} # event_type -> subscribed ClientConnections (built on first use, reset on (un)subscribe)
+        self.max_queue = max_queue
+        self.slow_client_policy = slow_client_policy
+        self.batch_ms = batch_ms # Defaults for clients subscribing with "batch": true
+        self.batch_max = batch_max
         self.message_callbacks = []
-        self.internal_listeners = [] # ActionEngine etc.
+        self.recorder = None # Optional EventRecorder (core/event_log.py) for replay/load tests
+
+        # Replay buffer for reconnecting clients: last history_size events per event type, by bus sequence number.
+        # The epoch changes with every start, so a client's old sequence numbers aren't mistaken for new ones.
+        self.history_size = history_size
+        self.history = {} # event_type -> deque of (seq, payload)
+        self._evicted = {} # event_type -> newest seq that fell out of the buffer
+        self.epoch = uuid.uuid4().hex[:12]
+        self.last_seq = 0
+
+        # broadcast() publishes on the bus; the WebSocket fan-out is just one (sync) subscriber of it
+        self.bus = bus or EventBus()
+        self.bus.subscribe(self._fan_out, name="WebSocket")
+        self.bus.subscribe(self._record, name="Recorder")
 
     def add_message_handler(self, callback):
         print(f"[DEBUG] Handler registriert: {callback}")
         self.message_callbacks.append(callback)
 
-    def add_internal_listener(self, callback):
-        self.internal_listeners.append(callback)
+    def add_internal_listener(self, callback, topics=None):
+        """listener(event_type, data) as its own bus subscriber (async ones get a queue, ordered per source)."""
+        if inspect.iscoroutinefunction(callback):
+            async def listener(event):
+                await callback(event.type, event.data)
+        else:
+            def listener(event):
+                callback(event.type, event.data)
+        return self.bus.subscribe(listener, topics, name=getattr(callback, "__qualname__", None))
+
+    def add_client(self, websocket):
+        conn = ClientConnection(websocket, self.max_queue, self.slow_client_policy)
+        self.clients[websocket] = conn
+        self._routes.clear()
+        return conn
 
     async def register(self, websocket):
-        self.clients.add(websocket)
+        self.add_client(websocket)
         print(f"[WS] Neuer Client verbunden. Total: {len(self.clients)}")
 
     async def unregister(self, websocket):
-        self.clients.remove(websocket)
+        conn = self.clients.pop(websocket, None)
+        if conn:
+            conn.stop()
+            self._routes.clear()
         print("[WS] Client getrennt.")
 
-    async def broadcast(self, event_type, data):
-        """Sendet Daten an alle verbundenen Clients (OBS/Browser)"""
-        payload = json.dumps({"event": event_type, "data": data})
-        
-        # 1. Internal Listeners (Action Engine)
-        for listener in self.internal_listeners:
-             # Fire and forget (or await if async)
-             # Let's assume listeners are async for now or we wrap them
-             if asyncio.iscoroutinefunction(listener):
-                 asyncio.create_task(listener(event_type, data))
-             else:
-                 listener(event_type, data)
-
-        # 2. WebSocket Clients
-        if self.clients:
-            await asyncio.gather(*[client.send(payload) for client in self.clients], return_exceptions=True)
+    async def broadcast(self, event_type, data, source=None):
+        """Sendet Daten an alle Subscriber (WebSocket-Clients, ActionEngine, ...). Wartet auf niemanden."""
+        self.bus.publish(event_type, data, source)
+
+    async def reply(self, event_type, data):
+        """
+        Sends a response only to the client whose message is being handled (dashboard requests like
+        get_traces); not published on the bus, no seq, no history. Without one it is a broadcast.
+        """
+        conn = self.clients.get(_requester.get())
+        if conn is None:
+            return await self.broadcast(event_type, data)
+        conn.enqueue(event_type, json.dumps({"event": event_type, "data": data}))
+
+    def _fan_out(self, event):
+        if event.type in INTERNAL_EVENTS:
+            return
+        # Only clients subscribed to this event; serialized once (also for the replay buffer), each writer task sends it
+        targets = self._routes.get(event.type)
+        if targets is None:
+            targets = self._routes[event.type] = tuple(c for c in self.clients.values() if c.wants(event.type))
+        keep = self.history_size > 0 and event.type not in NO_HISTORY
+        if not targets and not keep:
+            return
+        payload = json.dumps({"event": event.type, "data": event.data, "seq": event.seq})
+        self.last_seq = event.seq
+        if keep:
+            buf = self.history.get(event.type)
+            if buf is None:
+                buf = self.history[event.type] = deque(maxlen=1 if event.type in STATE_EVENTS else None)
+            elif buf.maxlen == 1:
+                buf.clear() # Superseded, not lost: no gap
+            elif len(buf) >= self.history_size:
+                self._evicted[event.type] = buf.popleft()[0]
+            buf.append((event.seq, payload))
+        for conn in targets:
+            conn.enqueue(event.type, payload)
+
+    def history_since(self, since, wants=None, limit=None):
+        """
+        Buffered events with seq > since (of the event types 'wants' accepts), oldest first.
+        Returns (entries, gap); gap=True if events after 'since' were already dropped from the buffer.
+        """
+        entries, gap = [], False
+        for event_type, buf in list(self.history.items()):
+            if wants and not wants(event_type): continue
+            if self._evicted.get(event_type, 0) > since:
+                gap = True
+            for seq, payload in reversed(buf):
+                if seq <= since: break
+                entries.append((seq, event_type, payload))
+        entries.sort()
+        if limit is not None and len(entries) > limit:
+            entries = entries[-limit:]
+            gap = True
+        return entries, gap
+
+    def _record(self, event):
+        if self.recorder:
+            self.recorder.record(event.type, event.data)
+
+    def subscribe(self, websocket, topics, since=None, epoch=None, batch=None):
+        """
+        since: last seq the client has seen -> buffered events after it are sent first, then live traffic.
+        A different epoch (bot restarted since) replays the whole buffer.
+        batch: true or {"ms": .., "max": ..} -> frames become JSON arrays of events.
+        """
+        conn = self.clients.get(websocket)
+        if conn is None: return
+        conn.subscribe(topics)
+        self._routes.clear()
+        if batch:
+            opts = batch if isinstance(batch, dict) else {}
+            try:
+                conn.set_batching(opts.get("ms", self.batch_ms), opts.get("max", self.batch_max))
+            except (TypeError, ValueError):
+                conn.set_batching(self.batch_ms, self.batch_max)
+        elif batch is not None:
+            conn.set_batching(0, conn.batch_max)
+
+        entries, gap = [], False
+        if since is not None:
+            try:
+                since = int(since)
+            except (TypeError, ValueError):
+                since = 0
+            if epoch != self.epoch:
+                since = 0
+            # Keep room in the client's queue for live traffic
+            entries, gap = self.history_since(since, conn.wants, limit=conn.max_queue // 2)
+            # Live events queued since the connect (before this handshake) come again in the replay, in order;
+            # sent ahead of the ack, they'd move the client's seq past the replay and it would skip it
+            conn.discard(lambda event_type: event_type in self.history or not conn.wants(event_type))
+
+        print(f"[WS] Client subscribed to: {', '.join(conn.topics) if conn.topics else 'all events'}"
+              + (f" (replaying {len(entries)} since #{since})" if since is not None else ""))
+        # Ack first (the client resets its seq on a new epoch), then the replay, then live traffic
+        conn.enqueue("Subscribed", json.dumps({"event": "Subscribed", "data": {
+            "topics": conn.topics, "epoch": self.epoch, "last_seq": self.last_seq,
+            "replayed": len(entries), "gap": gap}}))
+        for seq, event_type, payload in entries:
+            conn.enqueue(event_type, payload)
+
+    def _handle_control(self, websocket, message):
+        """
+        Handshake messages handled by the server itself:
+            {"action": "subscribe", "topics": ["ChatMessage", "BadgeMapping", "YouTube*"]}
+            {"action": "subscribe", "topics": [...], "since": 1234, "epoch": "..."}   (resume after reconnect)
+            {"action": "subscribe", "topics": [...], "batch": true}   (array frames, see ClientConnection)
+        Returns True if the message was one of them.
+        """
+        if not isinstance(message, str) or "subscribe" not in message:
+            return False
+        try:
+            data = json.loads(message)
+        except ValueError:
+            return False
+        if not isinstance(data, dict) or (data.get("action") or data.get("event")) != "subscribe":
+            return False
+        if isinstance(data.get("data"), dict):
+            data = dict(data["data"], **data)
+        self.subscribe(websocket, data.get("topics"), data.get("since"), data.get("epoch"), data.get("batch"))
+        return True
+
+    def client_stats(self):
+        """Per-client queue stats (HTTP /api/clients)."""
+        return [dict(conn.stats(), remote=str(getattr(ws, "remote_address", "")))
+                for ws, conn in list(self.clients.items())]
 
     async def handler(self, websocket): # 'path' Argument entfernt für neuere websockets versionen
         await self.register(websocket)
+        _requester.set(websocket)
         try:
             async for message in websocket:
                 # Hier können wir später Befehle VOM Overlay empfangen
                 # print(f"[WS Empfangen]: {message}")
+                if self._handle_control(websocket, message):
+                    continue
                 for callback in self.message_callbacks:
                     await callback(message)
         except:
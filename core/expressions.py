@@ -0,0 +1,215 @@
+"""
+Safe expressions for branching sub-actions (if / switch).
+
+A condition like
+
+    is_subscriber and lower(input) in ("ja", "yes") and int(viewers) >= 10
+
+is parsed once with Python's ast module, checked against a whitelist and
+compiled into nested closures. Nothing is passed to eval(), there are no
+attributes, subscripts or imports, only:
+
+    names        context variables (user, input, viewers, ...); unknown names are None
+    literals     "text", 'text', 12, 1.5, true/false/none (any case), tuples/lists
+    operators    and or not, == != < <= > >= in, not in, + - * / // %
+    functions    len lower upper str int float abs min max round
+                 startswith(s, prefix) endswith(s, suffix) contains(s, part) random()
+
+Numeric strings compare as numbers ("5" > 3 is True), since most context
+values (command arguments, reward input) arrive as text.
+"""
+import ast
+import operator
+import random
+from functools import lru_cache
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+def _num(value):
+    """Number for numeric strings, otherwise the value itself."""
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            try:
+                return float(value)
+            except ValueError:
+                return value
+    return value
+
+
+def _coerce(a, b):
+    # Only mix-ups of str and number are coerced; "abc" < 3 stays a (runtime) error
+    if isinstance(a, str) and isinstance(b, (int, float)) and not isinstance(b, bool):
+        return _num(a), b
+    if isinstance(b, str) and isinstance(a, (int, float)) and not isinstance(a, bool):
+        return a, _num(b)
+    return a, b
+
+
+def _in(a, b):
+    if b is None: return False
+    if isinstance(b, str): return str(a).lower() in b.lower()
+    return a in b
+
+
+def _compare(op):
+    def compare(a, b):
+        a, b = _coerce(a, b)
+        return op(a, b)
+    return compare
+
+
+def _int(value):
+    return int(float(value)) if isinstance(value, str) and '.' in value else int(value)
+
+
+FUNCTIONS = {
+    "len": lambda x: len(x) if x is not None else 0,
+    "lower": lambda x: str(x).lower() if x is not None else "",
+    "upper": lambda x: str(x).upper() if x is not None else "",
+    "str": lambda x: "" if x is None else str(x),
+    "int": _int,
+    "float": float,
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "round": round,
+    "startswith": lambda s, p: str(s or "").lower().startswith(str(p).lower()),
+    "endswith": lambda s, p: str(s or "").lower().endswith(str(p).lower()),
+    "contains": lambda s, p: str(p).lower() in str(s or "").lower(),
+    "random": random.random,
+}
+
+CONSTANTS = {"true": True, "false": False, "none": None, "null": None}
+
+COMPARE_OPS = {
+    ast.Eq: _compare(operator.eq), ast.NotEq: _compare(operator.ne),
+    ast.Lt: _compare(operator.lt), ast.LtE: _compare(operator.le),
+    ast.Gt: _compare(operator.gt), ast.GtE: _compare(operator.ge),
+    ast.In: _in, ast.NotIn: lambda a, b: not _in(a, b),
+}
+
+BIN_OPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+}
+
+
+class Expression:
+    def __init__(self, text):
+        self.text = text
+        self.names = set() # Context variables used (for lazy resolvers like %game%)
+        try:
+            tree = ast.parse(text.strip(), mode="eval")
+        except SyntaxError as e:
+            raise ExpressionError(f"Invalid expression '{text}': {e.msg}") from None
+        self._fn = self._compile(tree.body)
+
+    def evaluate(self, ctx):
+        return self._fn(ctx)
+
+    def test(self, ctx):
+        return bool(self._fn(ctx))
+
+    # --- Compiler: ast node -> fn(ctx) ---
+    def _compile(self, node):
+        if isinstance(node, ast.Constant):
+            value = node.value
+            if not isinstance(value, (str, int, float, bool, type(None))):
+                raise ExpressionError(f"Unsupported literal in '{self.text}'")
+            return lambda ctx: value
+
+        if isinstance(node, ast.Name):
+            name = node.id
+            if name.lower() in CONSTANTS:
+                value = CONSTANTS[name.lower()]
+                return lambda ctx: value
+            self.names.add(name)
+            return lambda ctx: ctx.get(name)
+
+        if isinstance(node, (ast.Tuple, ast.List)):
+            items = [self._compile(e) for e in node.elts]
+            return lambda ctx: tuple(fn(ctx) for fn in items)
+
+        if isinstance(node, ast.BoolOp):
+            values = [self._compile(v) for v in node.values]
+            if isinstance(node.op, ast.And):
+                def and_(ctx):
+                    result = True
+                    for fn in values:
+                        result = fn(ctx)
+                        if not result: return result
+                    return result
+                return and_
+            def or_(ctx):
+                result = False
+                for fn in values:
+                    result = fn(ctx)
+                    if result: return result
+                return result
+            return or_
+
+        if isinstance(node, ast.UnaryOp):
+            operand = self._compile(node.operand)
+            if isinstance(node.op, ast.Not):
+                return lambda ctx: not operand(ctx)
+            if isinstance(node.op, ast.USub):
+                return lambda ctx: -_num(operand(ctx))
+            if isinstance(node.op, ast.UAdd):
+                return lambda ctx: _num(operand(ctx))
+
+        if isinstance(node, ast.Compare):
+            left = self._compile(node.left)
+            ops = []
+            for op, comparator in zip(node.ops, node.comparators):
+                fn = COMPARE_OPS.get(type(op))
+                if fn is None:
+                    raise ExpressionError(f"Operator not allowed in '{self.text}'")
+                ops.append((fn, self._compile(comparator)))
+            def compare(ctx):
+                a = left(ctx)
+                for fn, right in ops: # Chained: 1 < x < 10
+                    b = right(ctx)
+                    if not fn(a, b): return False
+                    a = b
+                return True
+            return compare
+
+        if isinstance(node, ast.BinOp):
+            fn = BIN_OPS.get(type(node.op))
+            if fn is None:
+                raise ExpressionError(f"Operator not allowed in '{self.text}'")
+            left, right = self._compile(node.left), self._compile(node.right)
+            if fn is operator.add:
+                def add(ctx):
+                    a, b = left(ctx), right(ctx)
+                    if isinstance(a, str) or isinstance(b, str):
+                        a, b = _coerce(a, b)
+                        if isinstance(a, str) or isinstance(b, str):
+                            return f"{'' if a is None else a}{'' if b is None else b}" # Text concat
+                    return a + b
+                return add
+            return lambda ctx: fn(_num(left(ctx)), _num(right(ctx)))
+
+        if isinstance(node, ast.IfExp):
+            test, body, orelse = self._compile(node.test), self._compile(node.body), self._compile(node.orelse)
+            return lambda ctx: body(ctx) if test(ctx) else orelse(ctx)
+
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+                raise ExpressionError(f"Function not allowed in '{self.text}'")
+            func = FUNCTIONS[node.func.id]
+            args = [self._compile(a) for a in node.args]
+            return lambda ctx: func(*(a(ctx) for a in args))
+
+        raise ExpressionError(f"'{type(node).__name__}' not allowed in '{self.text}'")
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(text):
+    """Compiled Expression per condition string. Raises ExpressionError."""
+    return Expression(str(text))
@@ -1,21 +1,55 @@
+import asyncio
 import http.server
+import inspect
 import socketserver
 import threading
 import functools
+import json
+
+LOOP_ROUTE_TIMEOUT = 5 # Seconds an API request waits for the event loop
 
 class ReusableTCPServer(socketserver.TCPServer):
     allow_reuse_address = True
 
+class ApiRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Static files, plus JSON endpoints registered via SimpleWebServer.add_route"""
+    def __init__(self, routes, *args, **kwargs):
+        self.routes = routes
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        route = self.routes.get(self.path.split('?', 1)[0])
+        if route is None:
+            return super().do_GET()
+        try:
+            body = json.dumps(route()).encode("utf-8")
+        except Exception as e:
+            self.send_error(500, str(e))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
 class SimpleWebServer(threading.Thread):
     def __init__(self, port=8000):
         super().__init__()
         self.port = port
         self.daemon = True
         self.httpd = None
+        self.routes = {} # path -> fn() returning JSON-serializable data (called from the server thread!)
+
+    def add_route(self, path, fn, loop=None):
+        """loop: fn reads state owned by that event loop -> it runs there (coroutine functions need one)."""
+        if loop is not None:
+            fn = functools.partial(_call_on_loop, loop, fn)
+        self.routes[path] = fn
 
     def run(self):
         # Serve current directory
-        Handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=".")
+        Handler = functools.partial(ApiRequestHandler, self.routes, directory=".")
         
         # Suppress default logging to keep console clean
         # Handler.log_message = lambda self, format, *args: None
@@ -31,3 +65,13 @@ class SimpleWebServer(threading.Thread):
     def stop(self):
         if self.httpd:
             self.httpd.shutdown()
+
+
+def _call_on_loop(loop, fn):
+    """Runs fn on the loop and waits for its (copied) result in the HTTP thread."""
+    async def call():
+        result = fn()
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+    return asyncio.run_coroutine_threadsafe(call(), loop).result(LOOP_ROUTE_TIMEOUT)
@@ -0,0 +1,271 @@
+"""
+In-memory track index for playlist folders.
+
+run_playlist used to call os.listdir before every track, which is a full directory
+scan each time (slow on big network shares). A TrackIndex scans the folder once and
+afterwards only rescans directories that actually changed: via inotify on Linux,
+otherwise by comparing directory mtimes.
+"""
+import os
+import sys
+import time
+import wave
+import random
+import struct
+import ctypes
+import ctypes.util
+
+try:
+    import mutagen # Track lengths from mp3/ogg headers
+except ImportError:
+    mutagen = None
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.ogg')
+
+
+class Track:
+    __slots__ = ("path", "name", "mtime", "size", "tags", "duration")
+
+    def __init__(self, path, mtime, size, tags):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.mtime = mtime
+        self.size = size
+        self.tags = tags # Lowercase subfolder names (recursive mode)
+        self.duration = None # Seconds, from the file header or measured after the first playback
+
+
+def read_duration(path):
+    """Length in seconds from the file header, None if it can't be read."""
+    if path.lower().endswith('.wav'):
+        try:
+            with wave.open(path, 'rb') as w:
+                return w.getnframes() / float(w.getframerate())
+        except (wave.Error, EOFError, OSError):
+            pass
+    if mutagen is None:
+        return None
+    try:
+        info = mutagen.File(path)
+        length = info.info.length if info is not None else 0
+        return length or None
+    except Exception:
+        return None
+
+
+class _Inotify:
+    """Minimal non-blocking inotify reader via ctypes (Linux only)."""
+    IN_MODIFY = 0x002
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_Q_OVERFLOW = 0x4000
+    MASK = IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches = {} # wd -> dirpath
+
+    def watch(self, dirpath):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dirpath), self.MASK)
+        if wd >= 0:
+            self._watches[wd] = dirpath
+        return wd >= 0
+
+    def changed_dirs(self):
+        """Returns (set of changed dirs, overflow flag). Never blocks."""
+        changed, overflow = set(), False
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buf):
+                wd, mask, _, name_len = self.EVENT.unpack_from(buf, offset)
+                offset += self.EVENT.size + name_len
+                if mask & self.IN_Q_OVERFLOW:
+                    overflow = True
+                elif wd in self._watches:
+                    changed.add(self._watches[wd])
+        return changed, overflow
+
+    def close(self):
+        os.close(self.fd)
+
+
+class TrackIndex:
+    """Track list of one playlist folder, kept up to date incrementally."""
+    FULL_CHECK_INTERVAL = 60 # Even with inotify (doesn't see changes on network mounts)
+
+    def __init__(self, folder, recursive=False):
+        self.folder = os.path.normpath(folder)
+        self.recursive = recursive
+        self.tracks = {} # path -> Track
+        self._dir_mtimes = {} # dirpath -> mtime at last scan
+        self._bag = [] # Shuffle-without-repeat: paths not played in this round
+        self._last_played = None
+        self._last_full_check = 0
+        self._inotify = None
+
+        if sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+            except Exception:
+                self._inotify = None # Fallback: mtime checks
+
+        self._scan_dir(self.folder)
+        self._last_full_check = time.monotonic()
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def refresh(self):
+        """Cheap update check, called before every pick."""
+        if not os.path.isdir(self.folder):
+            self._drop_dir(self.folder)
+            return
+        if self.folder not in self._dir_mtimes:
+            self._scan_dir(self.folder) # Folder (re)appeared
+            return
+
+        dirty = set()
+        full_check = time.monotonic() - self._last_full_check > self.FULL_CHECK_INTERVAL or not self._inotify
+        if self._inotify:
+            dirty, overflow = self._inotify.changed_dirs()
+            full_check = full_check or overflow
+
+        if full_check:
+            self._last_full_check = time.monotonic()
+            for dirpath, mtime in list(self._dir_mtimes.items()):
+                try:
+                    if os.stat(dirpath).st_mtime != mtime:
+                        dirty.add(dirpath)
+                except OSError:
+                    dirty.add(dirpath)
+
+        for dirpath in dirty:
+            if os.path.isdir(dirpath):
+                self._scan_dir(dirpath)
+            else:
+                self._drop_dir(dirpath)
+
+    def pick(self, weights=None, shuffle=True):
+        """
+        Picks the next track.
+        shuffle: every track plays once per round before any repeats.
+        weights: {tag: factor}, tracks with a weighted tag are picked more (or less) often.
+        """
+        if not self.tracks:
+            return None
+
+        if not shuffle:
+            pool = list(self.tracks)
+        else:
+            self._bag = [p for p in self._bag if p in self.tracks]
+            if not self._bag:
+                self._bag = list(self.tracks)
+                # Don't start the new round with the track that just ended
+                if len(self._bag) > 1 and self._last_played in self._bag:
+                    self._bag.remove(self._last_played)
+            pool = self._bag
+
+        if weights:
+            factors = [self._weight(self.tracks[p], weights) for p in pool]
+            if any(factors):
+                path = random.choices(pool, weights=factors)[0]
+            else:
+                path = random.choice(pool)
+        else:
+            path = random.choice(pool)
+
+        if shuffle:
+            self._bag.remove(path)
+        self._last_played = path
+        return self.tracks[path]
+
+    def probe_duration(self, track):
+        """Reads the track length from the file header (no decoding). Blocking file I/O, call it off the loop."""
+        if track.duration is None:
+            track.duration = read_duration(track.path)
+        return track.duration
+
+    def set_duration(self, path, duration):
+        track = self.tracks.get(path)
+        if track and duration:
+            track.duration = duration
+
+    def close(self):
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+
+    @staticmethod
+    def _weight(track, weights):
+        factor = 1.0
+        for tag in track.tags:
+            if tag in weights:
+                factor *= float(weights[tag])
+        return factor
+
+    def _tags_for(self, dirpath):
+        rel = os.path.relpath(dirpath, self.folder)
+        if rel == ".":
+            return ()
+        return tuple(part.lower() for part in rel.split(os.sep))
+
+    def _scan_dir(self, dirpath):
+        """(Re)scans ONE directory and diffs it against the index."""
+        try:
+            dir_mtime = os.stat(dirpath).st_mtime
+            entries = list(os.scandir(dirpath))
+        except OSError as e:
+            print(f"[Playlist] Cannot read {dirpath}: {e}")
+            return
+
+        is_new_dir = dirpath not in self._dir_mtimes
+        self._dir_mtimes[dirpath] = dir_mtime
+        if is_new_dir and self._inotify:
+            self._inotify.watch(dirpath)
+
+        tags = self._tags_for(dirpath)
+        seen = set()
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if self.recursive and entry.path not in self._dir_mtimes:
+                    self._scan_dir(entry.path)
+                continue
+            if not entry.name.lower().endswith(AUDIO_EXTENSIONS):
+                continue
+
+            seen.add(entry.path)
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            known = self.tracks.get(entry.path)
+            if known and known.mtime == st.st_mtime and known.size == st.st_size:
+                continue
+            self.tracks[entry.path] = Track(entry.path, st.st_mtime, st.st_size, tags)
+
+        # Files that disappeared from this directory
+        for path in [p for p in self.tracks if os.path.dirname(p) == dirpath and p not in seen]:
+            del self.tracks[path]
+
+        # Subdirectories that disappeared
+        if self.recursive:
+            for sub in [d for d in self._dir_mtimes if os.path.dirname(d) == dirpath and not os.path.isdir(d)]:
+                self._drop_dir(sub)
+
+    def _drop_dir(self, dirpath):
+        prefix = dirpath + os.sep
+        for path in [p for p in self.tracks if p.startswith(prefix)]:
+            del self.tracks[path]
+        for d in [d for d in self._dir_mtimes if d == dirpath or d.startswith(prefix)]:
+            del self._dir_mtimes[d]
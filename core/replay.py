@@ -0,0 +1,355 @@
+"""
+Replay & load-test harness for the ActionEngine.
+
+Feeds recorded (or synthetic) events into an ActionEngine that is wired to
+stub Twitch / YouTube / OBS / audio backends, and reports throughput, tail
+latency and memory. Runs in a temp directory, so the real state.db and
+actions.yaml are never touched.
+
+Record on a live stream by adding to config.yaml:
+    debug:
+      record_events: recordings/events.jsonl.gz
+
+Then:
+    python -m core.replay replay recordings/events.jsonl.gz --speed 10
+    python -m core.replay flood --rate 500 --duration 10      # synthetic raid
+    python -m core.replay flood --rate 500 --command !sound --json report.json
+
+--speed 1 replays in real time, 10 ten times faster, 0 as fast as possible.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import yaml
+
+from core.action_engine import ActionEngine
+from core.event_bus import EventBus
+from core.event_log import read_events
+
+
+# --- Stub backends (count calls, optional simulated latency) ---
+
+class _Stub:
+    def __init__(self, latency_ms=0):
+        self.latency = latency_ms / 1000.0
+        self.calls = {}
+
+    async def _call(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class StubEventServer:
+    def __init__(self):
+        self.clients = set()
+        self.recorder = None
+        self.broadcasts = 0
+
+    def add_message_handler(self, callback):
+        pass
+
+    async def broadcast(self, event_type, data):
+        self.broadcasts += 1
+
+
+class StubChannel:
+    def __init__(self, stub):
+        self.stub = stub
+
+    async def send(self, msg):
+        await self.stub._call("chat")
+
+
+class StubTwitch(_Stub):
+    is_ready = False # No reward sync
+
+    def __init__(self, latency_ms=0, helix_latency_ms=0):
+        super().__init__(latency_ms)
+        self.helix_latency = helix_latency_ms / 1000.0
+        self.connected_channels = [StubChannel(self)]
+
+    async def get_user_last_game(self, username):
+        self.calls["helix"] = self.calls.get("helix", 0) + 1
+        if self.helix_latency:
+            await asyncio.sleep(self.helix_latency)
+        return "Just Chatting"
+
+    async def refund_redemption(self, redemption_id, reward_id):
+        await self._call("refund")
+
+    async def sync_cooldowns(self, actions):
+        await self._call("sync_cooldowns")
+
+
+class StubYouTube(_Stub):
+    async def send_chat_message(self, message_text):
+        await self._call("chat")
+
+    def get_random_short(self):
+        self.calls["short"] = self.calls.get("short", 0) + 1
+        return "dQw4w9WgXcQ"
+
+
+class StubOBS(_Stub):
+    is_connected = True
+
+    async def set_scene(self, scene_name):
+        await self._call("set_scene")
+
+
+class StubAudio(_Stub):
+    """Same interface as AudioDevicePool, nothing is decoded or played."""
+
+    async def play_sound(self, path, device=None, volume=1.0):
+        await self._call("play_sound")
+
+    async def begin_track(self, path, device=None, volume=1.0, stream=False, fade_ms=0, duration_hint=None):
+        await self._call("track")
+        fut = asyncio.get_running_loop().create_future()
+        asyncio.get_running_loop().call_later(0.5, lambda: fut.done() or fut.set_result(0.5))
+        return fut
+
+    async def play_track(self, path, device=None, volume=1.0):
+        return await (await self.begin_track(path, device, volume))
+
+    async def stream_track(self, path, device=None, volume=1.0, fade_ms=0, duration_hint=None):
+        return await (await self.begin_track(path, device, volume, True, fade_ms, duration_hint))
+
+    async def preload_track(self, path, device=None): pass
+    async def queue_track(self, path, device=None): pass
+    async def set_track_volume(self, volume): return True
+    async def fade_track(self, ms): pass
+    async def stop_all(self): pass
+    async def preload(self, by_device): pass
+    async def stats(self): return {}
+    def shutdown(self): pass
+
+
+# --- Harness ---
+
+def _percentiles(values, ps=(50, 95, 99)):
+    if not values:
+        return {f"p{p}": 0.0 for p in ps} | {"max": 0.0}
+    values = sorted(values)
+    out = {f"p{p}": round(values[min(len(values) - 1, int(len(values) * p / 100))], 3) for p in ps}
+    out["max"] = round(values[-1], 3)
+    return out
+
+
+def _max_rss_mb():
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        return None # Windows
+
+
+class ReplayHarness:
+    def __init__(self, actions_file="actions.yaml", latency=None):
+        latency = latency or {}
+        self.actions_file = actions_file
+        self.workdir = tempfile.mkdtemp(prefix="osb_replay_")
+        shutil.copy(actions_file, os.path.join(self.workdir, "actions.yaml"))
+
+        self.server = StubEventServer()
+        self.twitch = StubTwitch(latency.get("chat", 0), latency.get("helix", 0))
+        self.youtube = StubYouTube(latency.get("chat", 0))
+        self.obs = StubOBS(latency.get("obs", 0))
+        self.audio = StubAudio(latency.get("audio", 0))
+        self.engine = None
+        self.bus = EventBus() # Same delivery path as in the bot (per-source ordered queue)
+        self._sub = None
+
+        self._latencies = [] # ms, event dispatch -> handle_event done
+        self._sent = {} # event seq -> perf_counter at publish
+        self.max_lag_ms = 0.0 # How far dispatch fell behind the schedule (loop saturation)
+
+    def start(self):
+        """Must be called inside the running loop (timers, writers)."""
+        self.engine = ActionEngine(os.path.join(self.workdir, "actions.yaml"), self.server, self.obs,
+                                   self.twitch, self.youtube, audio=self.audio)
+        self._sub = self.bus.subscribe(self._deliver, name="ActionEngine")
+
+    def close(self):
+        self.bus.close()
+        if self.engine:
+            self.engine.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    async def _deliver(self, event):
+        await self.engine.handle_event(event.type, event.data)
+        t0 = self._sent.pop(event.seq, None)
+        if t0 is not None:
+            self._latencies.append((time.perf_counter() - t0) * 1000)
+
+    def dispatch(self, event_type, data):
+        """Publishes on the bus, like EventServer.broadcast."""
+        t0 = time.perf_counter()
+        event = self.bus.publish(event_type, data)
+        self._sent[event.seq] = t0
+
+    async def run(self, events, speed=1.0, settle_timeout=30.0):
+        """events: iterable of (t, event_type, data). Returns the report dict."""
+        tracemalloc.start()
+        loop = asyncio.get_running_loop()
+        t_start = loop.time()
+        wall_start = time.perf_counter()
+        count = 0
+
+        for t, event_type, data in events:
+            if speed > 0:
+                delay = t / speed - (loop.time() - t_start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.max_lag_ms = max(self.max_lag_ms, -delay * 1000)
+            self.dispatch(event_type, data)
+            count += 1
+            if speed <= 0:
+                await asyncio.sleep(0) # Let the loop breathe like real network input would
+        dispatch_s = time.perf_counter() - wall_start
+
+        # Settle: all handle_event calls done and no action runs left
+        deadline = loop.time() + settle_timeout
+        while (self._sub.queued or self._sub._workers or self.engine.scheduler.in_flight or self.engine.scheduler.queue_depth()) \
+                and loop.time() < deadline:
+            await asyncio.sleep(0.01)
+        wall_s = time.perf_counter() - wall_start
+
+        mem_current, mem_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return self._report(count, dispatch_s, wall_s, mem_current, mem_peak)
+
+    def _report(self, count, dispatch_s, wall_s, mem_current, mem_peak):
+        sched = self.engine.scheduler.stats()
+        hist = self.engine.tracer.histograms()
+        backend_calls = {}
+        for stub in (self.twitch, self.youtube, self.obs, self.audio):
+            for k, v in stub.calls.items():
+                backend_calls[k] = backend_calls.get(k, 0) + v
+        return {
+            "events": count,
+            "dispatch_s": round(dispatch_s, 3),
+            "wall_s": round(wall_s, 3),
+            "throughput_eps": round(count / wall_s, 1) if wall_s else 0.0,
+            "handle_event_ms": _percentiles(self._latencies),
+            "max_dispatch_lag_ms": round(self.max_lag_ms, 2),
+            "bus_dropped": self._sub.dropped,
+            "actions": {
+                "started": sched["started"],
+                "dropped": sched["dropped"],
+                "unfinished": sched["in_flight"] + sched["queue_depth"],
+                "latency": hist.get("action", {}),
+            },
+            "sub_actions": {k: v for k, v in hist.items() if k not in ("action", "handle_event")},
+            "backend_calls": backend_calls,
+            "memory": {
+                "traced_current_mb": round(mem_current / 2**20, 2),
+                "traced_peak_mb": round(mem_peak / 2**20, 2),
+                "max_rss_mb": _max_rss_mb(),
+            },
+        }
+
+
+def synthetic_flood(actions_file, rate=500, duration=10.0, commands=None, users=2000, seed=1):
+    """Chat command events at a fixed rate (e.g. a raid spamming commands)."""
+    if not commands:
+        with open(actions_file, 'r') as f:
+            actions = (yaml.safe_load(f) or {}).get('actions', [])
+        commands = []
+        for a in actions:
+            for t in a.get('triggers', []):
+                if t.get('type') == 'twitch_command' and t.get('command'):
+                    # Parameterized triggers get a dummy argument per placeholder
+                    commands.append(" ".join(("1" if part.startswith("%int:") else "x") if "%" in part else part
+                                             for part in t['command'].split(' ')))
+        commands = commands or ["!ping"]
+
+    rng = random.Random(seed)
+    for i in range(int(rate * duration)):
+        message = rng.choice(commands)
+        yield i / rate, "CommandTriggered", {
+            "command": message.split(' ')[0].lower(),
+            "message": message,
+            "user": f"raider{rng.randrange(users)}",
+            "platform": "twitch",
+            "is_mod": False, "is_vip": False, "is_subscriber": rng.random() < 0.2, "is_broadcaster": False,
+        }
+
+
+async def run_harness(events, actions_file="actions.yaml", speed=1.0, latency=None, quiet=True):
+    harness = ReplayHarness(actions_file, latency)
+    out = open(os.devnull, "w") if quiet else None
+    try:
+        with contextlib.redirect_stdout(out) if quiet else contextlib.nullcontext():
+            harness.start()
+            return await harness.run(events, speed)
+    finally:
+        harness.close()
+        if out:
+            out.close()
+
+
+def print_report(report):
+    h = report["handle_event_ms"]
+    a = report["actions"]
+    m = report["memory"]
+    print(f"Events:        {report['events']} in {report['wall_s']}s ({report['throughput_eps']} events/s)")
+    print(f"handle_event:  p50 {h['p50']}ms  p95 {h['p95']}ms  p99 {h['p99']}ms  max {h['max']}ms")
+    print(f"Dispatch lag:  max {report['max_dispatch_lag_ms']}ms")
+    print(f"Actions:       {a['started']} started, {a['dropped']} dropped, {a['unfinished']} unfinished")
+    if a["latency"]:
+        print(f"Action time:   p50 {a['latency']['p50_ms']}ms  p95 {a['latency']['p95_ms']}ms  max {a['latency']['max_ms']}ms")
+    print(f"Backend calls: {report['backend_calls']}")
+    print(f"Memory:        traced peak {m['traced_peak_mb']} MB, max RSS {m['max_rss_mb']} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m core.replay", description="ActionEngine replay / load test")
+    parser.add_argument("--actions", default="actions.yaml", help="actions file to test against (copied)")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the engine's console output")
+    parser.add_argument("--chat-latency", type=float, default=0, help="simulated chat send latency (ms)")
+    parser.add_argument("--helix-latency", type=float, default=0, help="simulated Helix lookup latency (ms)")
+    parser.add_argument("--obs-latency", type=float, default=0, help="simulated OBS request latency (ms)")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    p_replay = sub.add_parser("replay", help="replay a recording")
+    p_replay.add_argument("recording")
+    p_replay.add_argument("--speed", type=float, default=1.0, help="1 = real time, 0 = as fast as possible")
+
+    p_flood = sub.add_parser("flood", help="synthetic chat command flood")
+    p_flood.add_argument("--rate", type=float, default=500, help="events per second")
+    p_flood.add_argument("--duration", type=float, default=10, help="seconds")
+    p_flood.add_argument("--command", action="append", help="command(s) to spam (default: all from actions file)")
+    p_flood.add_argument("--users", type=int, default=2000)
+
+    args = parser.parse_args(argv)
+    latency = {"chat": args.chat_latency, "helix": args.helix_latency, "obs": args.obs_latency}
+
+    if args.mode == "replay":
+        events, speed = read_events(args.recording), args.speed
+    else:
+        events, speed = synthetic_flood(args.actions, args.rate, args.duration, args.command, args.users), 1.0
+
+    report = asyncio.run(run_harness(events, args.actions, speed, latency, quiet=not args.verbose))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
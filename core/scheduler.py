@@ -0,0 +1,215 @@
+"""
+Bounded executor for action runs.
+
+Every trigger (chat command, timer, trigger_action, ...) used to start its own
+asyncio task. The ActionScheduler caps how many runs are in flight at once and
+applies a per-action concurrency mode (action key 'concurrency'):
+
+    parallel   every run starts (subject to the global cap)       [default]
+    queue      runs of the same action execute one after another
+    drop       a new run is dropped while the action is running/waiting
+    replace    a new run cancels the running one and takes its place
+
+Runs that don't fit under the global cap wait in a priority queue
+(action key 'priority', higher first). Both waiting queues are bounded;
+anything that doesn't fit is dropped and counted. A run can carry an
+on_drop(reason) callback, which is also called when a waiting run is evicted
+later on (e.g. to refund channel points).
+"""
+import asyncio
+import heapq
+import itertools
+from collections import deque
+
+MODES = ("parallel", "queue", "drop", "replace")
+
+
+class _Run:
+    __slots__ = ("name", "action", "ctx", "priority", "seq", "cancelled", "on_drop")
+
+    def __init__(self, action, ctx, priority, seq, on_drop=None):
+        self.name = action.get('name', '')
+        self.action = action
+        self.ctx = ctx
+        self.priority = priority
+        self.seq = seq
+        self.cancelled = False
+        self.on_drop = on_drop
+
+    def __lt__(self, other):
+        # heapq pops the smallest: higher priority first, then FIFO
+        return (-self.priority, self.seq) < (-other.priority, other.seq)
+
+
+class ActionScheduler:
+    def __init__(self, runner, max_in_flight=16, max_pending=100, max_queue=20):
+        self.runner = runner # async fn(action, ctx)
+        self.max_in_flight = max_in_flight
+        self.max_pending = max_pending # Global waiting room (cap reached)
+        self.max_queue = max_queue # Per-action backlog in 'queue' mode
+
+        self._seq = itertools.count()
+        self._running = {} # action name -> {task: _Run}
+        self._pending = [] # heap of _Run waiting for a free slot
+        self._pending_by_name = {} # action name -> count of live entries in _pending
+        self._backlog = {} # action name -> deque of _Run ('queue' mode)
+        self.in_flight = 0
+
+        self.dropped = 0
+        self.dropped_by_action = {}
+        self.started = 0
+
+    # --- Public API ---
+    def submit(self, action, ctx=None, priority=None, on_drop=None):
+        """
+        Schedules one run of the action. Returns False if the run was dropped.
+        Never blocks; the run starts as soon as mode and global cap allow it.
+        on_drop(reason) is called if the run is dropped, now or later while it waits.
+        """
+        mode = action.get('concurrency', 'parallel')
+        if mode not in MODES:
+            mode = 'parallel'
+        if priority is None:
+            priority = int(action.get('priority', 0) or 0)
+        run = _Run(action, ctx or {}, priority, next(self._seq), on_drop)
+        name = run.name
+
+        if mode == "drop" and self._busy(name):
+            return self._drop(run, "already running")
+
+        if mode == "replace":
+            self._cancel_action(name, "replaced")
+
+        if mode == "queue" and self._busy(name):
+            backlog = self._backlog.setdefault(name, deque())
+            if len(backlog) >= int(action.get('max_queue', self.max_queue)):
+                return self._drop(run, "queue full")
+            backlog.append(run)
+            return True
+
+        return self._admit(run)
+
+    def cancel(self, name, reason="cancelled", running=True):
+        """
+        Drops the waiting runs of one action (on_drop is called for each) and, unless
+        running=False, cancels its running ones (e.g. action disabled or removed).
+        """
+        self._cancel_action(name, reason, running)
+
+    def cancel_all(self, reason="shutdown"):
+        for name in list(self._running) + list(self._pending_by_name) + list(self._backlog):
+            self._cancel_action(name, reason)
+
+    def queue_depth(self, name=None):
+        if name is not None:
+            return self._pending_by_name.get(name, 0) + len(self._backlog.get(name, ()))
+        return sum(self._pending_by_name.values()) + sum(len(b) for b in self._backlog.values())
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": self.queue_depth(),
+            "started": self.started,
+            "dropped": self.dropped,
+            "dropped_by_action": dict(self.dropped_by_action),
+            "running": {name: len(tasks) for name, tasks in self._running.items() if tasks},
+            "waiting": {name: self.queue_depth(name) for name in
+                        set(self._pending_by_name) | set(self._backlog) if self.queue_depth(name)},
+        }
+
+    # --- Internals ---
+    def _busy(self, name):
+        return bool(self._running.get(name)) or self._pending_by_name.get(name, 0) > 0
+
+    def _drop(self, run, reason):
+        self.dropped += 1
+        self.dropped_by_action[run.name] = self.dropped_by_action.get(run.name, 0) + 1
+        print(f"[Scheduler] Dropped run of '{run.name}' ({reason}).")
+        if run.on_drop:
+            try:
+                run.on_drop(reason)
+            except Exception as e:
+                print(f"[Scheduler] Error in drop handler of '{run.name}': {e}")
+        return False
+
+    def _admit(self, run):
+        if self.in_flight < self.max_in_flight:
+            self._start(run)
+            return True
+
+        if sum(self._pending_by_name.values()) >= self.max_pending:
+            # Full: the lowest priority run (possibly this one) has to go
+            worst = max((r for r in self._pending if not r.cancelled), default=None)
+            if worst is None or not run < worst:
+                return self._drop(run, "scheduler full")
+            self._discard_pending(worst)
+            self._drop(worst, "evicted by higher priority")
+
+        heapq.heappush(self._pending, run)
+        self._pending_by_name[run.name] = self._pending_by_name.get(run.name, 0) + 1
+        return True
+
+    def _discard_pending(self, run):
+        run.cancelled = True # Lazily removed from the heap
+        self._uncount_pending(run)
+        if len(self._pending) > 2 * sum(self._pending_by_name.values()) + 16:
+            self._pending = [r for r in self._pending if not r.cancelled]
+            heapq.heapify(self._pending)
+
+    def _uncount_pending(self, run):
+        self._pending_by_name[run.name] -= 1
+        if not self._pending_by_name[run.name]:
+            del self._pending_by_name[run.name]
+
+    def _start(self, run):
+        self.in_flight += 1
+        self.started += 1
+        task = asyncio.create_task(self._execute(run))
+        self._running.setdefault(run.name, {})[task] = run
+
+    async def _execute(self, run):
+        try:
+            await self.runner(run.action, run.ctx)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"[Scheduler] Error in action '{run.name}': {e}")
+        finally:
+            self._finish(run)
+
+    def _finish(self, run):
+        self.in_flight -= 1
+        tasks = self._running.get(run.name)
+        if tasks is not None:
+            tasks.pop(asyncio.current_task(), None)
+            if not tasks:
+                del self._running[run.name]
+
+        # Fill free slots from the waiting room (by priority)
+        while self._pending and self.in_flight < self.max_in_flight:
+            nxt = heapq.heappop(self._pending)
+            if nxt.cancelled:
+                continue
+            self._uncount_pending(nxt)
+            self._start(nxt)
+
+        # Next run of a 'queue' mode action (goes through the global cap like any other)
+        backlog = self._backlog.get(run.name)
+        if backlog and not self._busy(run.name):
+            nxt = backlog.popleft()
+            if not backlog:
+                del self._backlog[run.name]
+            self._admit(nxt)
+
+    def _cancel_action(self, name, reason, running=True):
+        for run in self._backlog.pop(name, ()):
+            self._drop(run, reason)
+        if self._pending_by_name.get(name):
+            for run in list(self._pending):
+                if run.name == name and not run.cancelled:
+                    self._discard_pending(run)
+                    self._drop(run, reason)
+        if running:
+            for task in list(self._running.get(name, {})):
+                task.cancel()
@@ -0,0 +1,188 @@
+"""
+Persistent runtime state (SQLite, WAL mode).
+
+actions.yaml is configuration only. Everything that changes while the bot is
+running lives here instead:
+    cooldowns   timestamps / rate-limit windows of the CooldownStore
+    counters    simple named counters (e.g. runs per action)
+    toggles     'enabled' overrides from set_action_state, with optional revert time
+
+Writers only update in-memory buffers. A background thread commits them in
+one transaction every FLUSH_INTERVAL seconds, so a burst of toggles or
+cooldown hits costs a single write.
+"""
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cooldowns (
+    action TEXT NOT NULL, scope TEXT NOT NULL, key TEXT NOT NULL,
+    until REAL NOT NULL,
+    PRIMARY KEY (action, scope, key)
+);
+CREATE TABLE IF NOT EXISTS windows (
+    action TEXT NOT NULL, scope TEXT NOT NULL, key TEXT NOT NULL, per REAL NOT NULL,
+    count INTEGER NOT NULL, runs TEXT NOT NULL, expires REAL NOT NULL,
+    PRIMARY KEY (action, scope, key, per)
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY, value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS toggles (
+    action TEXT PRIMARY KEY,
+    enabled INTEGER NOT NULL,
+    config_enabled INTEGER NOT NULL,
+    revert_at REAL,
+    revert_to INTEGER
+);
+"""
+
+_DELETE = object() # Buffer marker: row has to be removed
+
+
+class StateStore:
+    FLUSH_INTERVAL = 1.0 # s
+
+    def __init__(self, path="state.db"):
+        self.path = path
+        self._lock = threading.Lock() # Buffers (held only briefly, callers on the event loop never wait for disk I/O)
+        self._db_lock = threading.Lock() # Connection
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL") # WAL + NORMAL: durable except on power loss
+        self._conn.executescript(SCHEMA)
+
+        self.counters = dict(self._conn.execute("SELECT name, value FROM counters"))
+
+        # Pending writes, coalesced by primary key
+        self._cooldowns = {}
+        self._windows = {}
+        self._counters = set()
+        self._toggles = {}
+
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._writer, name="StateStore", daemon=True)
+        self._thread.start()
+
+    # --- Cooldowns (called by CooldownStore) ---
+    def put_cooldown(self, key, until):
+        with self._lock:
+            self._cooldowns[key] = until
+
+    def put_window(self, key, count, runs):
+        with self._lock:
+            self._windows[key] = (count, list(runs))
+
+    def load_cooldowns(self, now=None):
+        """Returns ({(action, scope, key): until}, {(action, scope, key, per): (count, [runs])}) still active."""
+        now = time.time() if now is None else now
+        with self._db_lock:
+            until = {(a, s, k): u for a, s, k, u in
+                     self._conn.execute("SELECT action, scope, key, until FROM cooldowns WHERE until > ?", (now,))}
+            windows = {}
+            for a, s, k, per, count, runs in self._conn.execute(
+                    "SELECT action, scope, key, per, count, runs FROM windows WHERE expires > ?", (now,)):
+                runs = [t for t in json.loads(runs) if t > now - per]
+                if runs:
+                    windows[(a, s, k, per)] = (count, runs)
+        return until, windows
+
+    # --- Counters ---
+    def incr(self, name, delta=1):
+        with self._lock:
+            value = self.counters.get(name, 0) + delta
+            self.counters[name] = value
+            self._counters.add(name)
+        return value
+
+    def get_counter(self, name, default=0):
+        return self.counters.get(name, default)
+
+    # --- Toggles ---
+    def set_toggle(self, action, enabled, config_enabled, revert_at=None, revert_to=None):
+        with self._lock:
+            self._toggles[action] = (bool(enabled), bool(config_enabled), revert_at,
+                                     None if revert_to is None else bool(revert_to))
+
+    def clear_toggle(self, action):
+        with self._lock:
+            self._toggles[action] = _DELETE
+
+    def load_toggles(self):
+        """{action: {"enabled", "config_enabled", "revert_at", "revert_to"}}, including buffered changes."""
+        with self._db_lock:
+            rows = {a: (bool(e), bool(c), r_at, None if r_to is None else bool(r_to)) for a, e, c, r_at, r_to in
+                    self._conn.execute("SELECT action, enabled, config_enabled, revert_at, revert_to FROM toggles")}
+        with self._lock:
+            for action, row in self._toggles.items():
+                if row is _DELETE:
+                    rows.pop(action, None)
+                else:
+                    rows[action] = row
+        return {a: dict(zip(("enabled", "config_enabled", "revert_at", "revert_to"), row)) for a, row in rows.items()}
+
+    # --- Writing ---
+    def flush(self):
+        """Commits all buffered changes in one transaction (thread-safe, callable from anywhere)."""
+        with self._db_lock:
+            with self._lock:
+                cooldowns, self._cooldowns = self._cooldowns, {}
+                windows, self._windows = self._windows, {}
+                counters = {name: self.counters[name] for name in self._counters}
+                self._counters = set()
+                toggles, self._toggles = self._toggles, {}
+            if self._conn is None or not (cooldowns or windows or counters or toggles):
+                return
+
+            try:
+                cur = self._conn.cursor()
+                cur.execute("BEGIN")
+                cur.executemany("INSERT OR REPLACE INTO cooldowns VALUES (?, ?, ?, ?)",
+                                [(*k, u) for k, u in cooldowns.items()])
+                cur.executemany("INSERT OR REPLACE INTO windows VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                [(*k, c, json.dumps(r), (r[-1] if r else 0) + k[3]) for k, (c, r) in windows.items()])
+                cur.executemany("INSERT OR REPLACE INTO counters VALUES (?, ?)", list(counters.items()))
+                cur.executemany("DELETE FROM toggles WHERE action = ?",
+                                [(a,) for a, row in toggles.items() if row is _DELETE])
+                cur.executemany("INSERT OR REPLACE INTO toggles VALUES (?, ?, ?, ?, ?)",
+                                [(a, *row) for a, row in toggles.items() if row is not _DELETE])
+                if cooldowns or windows:
+                    # Expired entries don't need to survive a restart
+                    now = time.time()
+                    cur.execute("DELETE FROM cooldowns WHERE until <= ?", (now,))
+                    cur.execute("DELETE FROM windows WHERE expires <= ?", (now,))
+                cur.execute("COMMIT")
+            except sqlite3.Error as e:
+                print(f"[StateStore] Write failed, retrying on the next flush: {e}")
+                try:
+                    self._conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+                self._requeue(cooldowns, windows, counters, toggles)
+
+    def _requeue(self, cooldowns, windows, counters, toggles):
+        """Puts the changes of a failed flush back into the buffers (changes made meanwhile are newer and win)."""
+        with self._lock:
+            for pending, failed in ((self._cooldowns, cooldowns), (self._windows, windows), (self._toggles, toggles)):
+                for key, value in failed.items():
+                    pending.setdefault(key, value)
+            self._counters.update(counters) # Values are read from self.counters on the next flush
+
+    def close(self):
+        if self._closed: return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+            self._conn = None
+
+    def _writer(self):
+        while not self._closed:
+            self._wake.wait(self.FLUSH_INTERVAL)
+            if self._closed: break
+            self.flush()
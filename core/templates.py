@@ -0,0 +1,55 @@
+"""
+Compiled variable templates for the ActionEngine.
+
+A message like "Schaut bei %user% vorbei! Zuletzt: %game%" is parsed once into
+literal and placeholder segments. Rendering is then a single join instead of
+one str.replace per context key.
+"""
+import re
+from functools import lru_cache
+
+PLACEHOLDER_RE = re.compile(r"%(\w+)%")
+
+
+class Template:
+    def __init__(self, text):
+        self.text = text
+        self.segments = [] # literal str or (name,) tuple for placeholders
+        self.names = set()
+
+        pos = 0
+        for m in PLACEHOLDER_RE.finditer(text):
+            if m.start() > pos:
+                self.segments.append(text[pos:m.start()])
+            name = m.group(1)
+            self.segments.append((name,))
+            self.names.add(name)
+            pos = m.end()
+        if pos < len(text):
+            self.segments.append(text[pos:])
+
+    def render(self, ctx):
+        """
+        Fills in the placeholders from ctx.
+        Unknown placeholders stay as they are (e.g. "%foo%").
+        """
+        if not self.names:
+            return self.text
+
+        out = []
+        for seg in self.segments:
+            if seg.__class__ is str:
+                out.append(seg)
+                continue
+            name = seg[0]
+            if name in ctx:
+                out.append(str(ctx[name]))
+            else:
+                out.append(f"%{name}%")
+        return "".join(out)
+
+
+@lru_cache(maxsize=1024)
+def compile_template(text):
+    """Compiled Template per config string (sub-action configs reuse the same string objects)."""
+    return Template(text)
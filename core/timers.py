@@ -0,0 +1,284 @@
+"""
+One scheduler for all timed work of the ActionEngine.
+
+Instead of a sleeping asyncio task per timer action (plus one per temporary
+toggle revert), all deadlines live in one heap. Only the earliest deadline is
+armed on the event loop (loop.call_at); cancelling is O(1) (the entry is
+flagged and skipped when it reaches the top). Once cancelled entries make up
+more than half of the heap, it is rebuilt without them, so toggling far-future
+timers over and over doesn't grow it.
+
+    call_later(delay, fn, *args)   one-shot (e.g. set_action_state revert)
+    every(interval, fn, ...)       interval timer with jitter and catch-up policy
+    cron("*/15 * * * *", fn)       cron-style schedule (local time)
+    sleep(delay)                   awaitable, for delayed sub-actions
+    upcoming(n)                    what fires next
+
+Callbacks may be plain functions or coroutine functions (run as a task).
+"""
+import asyncio
+import datetime
+import heapq
+import itertools
+import random
+import time
+
+CATCH_UP = ("skip", "all", "reset")
+MAX_CATCH_UP = 10 # 'all': at most this many missed runs are fired after a stall
+
+
+class TimerHandle:
+    __slots__ = ("when", "seq", "callback", "args", "name", "kind", "cancelled", "_repeat", "_owner")
+
+    def __init__(self, when, seq, callback, args, name, kind, repeat=None):
+        self.when = when # loop.time() deadline
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        self.name = name
+        self.kind = kind
+        self.cancelled = False
+        self._repeat = repeat # fn(handle, now) -> next deadline or None
+        self._owner = None # TimerScheduler while the handle sits in its heap
+
+    def cancel(self):
+        if self.cancelled: return
+        self.cancelled = True
+        if self._owner:
+            self._owner._on_cancel()
+
+    def __lt__(self, other):
+        return (self.when, self.seq) < (other.when, other.seq)
+
+
+class CronSchedule:
+    """Minute hour day-of-month month day-of-week; supports *, lists, ranges and steps."""
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7)) # Weekday: 0 and 7 = Sunday
+
+    def __init__(self, expr):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: '{expr}'")
+        self.expr = expr
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(f, lo, hi) for f, (lo, hi) in zip(fields, self.RANGES))
+        # Like cron: if both day fields are restricted, either one matching is enough
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(field, lo, hi):
+        values = set()
+        for part in field.split(','):
+            rng, _, step = part.partition('/')
+            step = int(step) if step else 1
+            if rng == "*":
+                start, end = lo, hi
+            elif '-' in rng:
+                start, end = (int(x) for x in rng.split('-', 1))
+            else:
+                start = int(rng)
+                end = hi if step > 1 else start
+            if not (lo <= start <= end <= hi) or step < 1:
+                raise ValueError(f"Invalid cron field '{field}'")
+            values.update(range(start, end + 1, step))
+        if hi == 7:
+            values = {v % 7 for v in values}
+        return values
+
+    def _day_matches(self, dt):
+        dom = dt.day in self.days
+        dow = (dt.isoweekday() % 7) in self.weekdays # 0 = Sunday
+        if self._any_day: return dow
+        if self._any_weekday: return dom
+        return dom or dow
+
+    def next_after(self, dt):
+        """Next matching local datetime strictly after dt."""
+        dt = dt.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        limit = dt + datetime.timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + datetime.timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + datetime.timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += datetime.timedelta(minutes=1)
+            else:
+                return dt
+        raise ValueError(f"Cron expression never fires: '{self.expr}'")
+
+
+class TimerScheduler:
+    def __init__(self):
+        self._heap = []
+        self._cancelled = 0 # Cancelled handles still in the heap
+        self._seq = itertools.count()
+        self._armed = None # (when, asyncio.TimerHandle) of the loop callback
+        self._loop = None
+        self.fired = 0
+
+    COMPACT_MIN = 64 # Smaller heaps are never rebuilt, the lazy skipping is cheaper
+
+    def __len__(self):
+        return len(self._heap) - self._cancelled
+
+    # --- Scheduling ---
+    def call_at(self, when, callback, *args, name=None, kind="once"):
+        """when: loop.time() based deadline."""
+        return self._push(TimerHandle(when, next(self._seq), callback, args, name, kind))
+
+    def call_later(self, delay, callback, *args, name=None, kind="once"):
+        return self.call_at(self._now() + max(0.0, delay), callback, *args, name=name, kind=kind)
+
+    def every(self, interval, callback, *args, name=None, jitter=0.0, catch_up="skip", first_delay=None):
+        """
+        Repeating timer on a fixed grid (no drift).
+        jitter: +- seconds, randomized per run (the grid itself stays fixed).
+        catch_up (when the loop was blocked/suspended past one or more runs):
+            skip   fire once, continue on the grid                         [default]
+            all    fire every missed run (max. MAX_CATCH_UP)
+            reset  fire once, next run one interval from now
+        """
+        interval = float(interval)
+        if interval <= 0:
+            raise ValueError("Interval must be > 0")
+        if catch_up not in CATCH_UP:
+            catch_up = "skip"
+        jitter = min(float(jitter or 0), interval / 2)
+        state = {"slot": self._now() + (interval if first_delay is None else first_delay)}
+
+        def with_jitter(slot):
+            return slot + (random.uniform(-jitter, jitter) if jitter else 0.0)
+
+        def repeat(handle, now):
+            slot = state["slot"] + interval
+            if slot <= now: # Missed one or more runs
+                if catch_up == "reset":
+                    slot = now + interval
+                elif catch_up == "skip":
+                    slot += ((now - slot) // interval + 1) * interval
+                else:
+                    slot = max(slot, now - interval * (MAX_CATCH_UP - 1))
+            state["slot"] = slot
+            return with_jitter(slot)
+
+        handle = TimerHandle(with_jitter(state["slot"]), next(self._seq), callback, args, name, "interval", repeat)
+        return self._push(handle)
+
+    def cron(self, expr, callback, *args, name=None):
+        schedule = CronSchedule(expr) # Raises ValueError on bad expressions
+
+        def next_deadline():
+            now_wall = datetime.datetime.now()
+            nxt = schedule.next_after(now_wall)
+            return self._now() + (nxt - now_wall).total_seconds()
+
+        def repeat(handle, now):
+            return next_deadline()
+
+        handle = TimerHandle(next_deadline(), next(self._seq), callback, args, name, "cron", repeat)
+        return self._push(handle)
+
+    async def sleep(self, delay):
+        """Like asyncio.sleep, but scheduled here (shows up in upcoming())."""
+        fut = asyncio.get_running_loop().create_future()
+        handle = self.call_later(delay, _set_done, fut, name="delay", kind="delay")
+        try:
+            await fut
+        finally:
+            handle.cancel() # No-op if it fired; O(1) if the sub-action was cancelled
+
+    def cancel_all(self):
+        for h in self._heap:
+            h.cancelled = True
+            h._owner = None
+        self._heap = []
+        self._cancelled = 0
+        if self._armed:
+            self._armed[1].cancel()
+            self._armed = None
+
+    def upcoming(self, limit=10):
+        """[{name, kind, in, at}] of the next deadlines ('at' as unix time)."""
+        now, wall = self._now(), time.time()
+        entries = heapq.nsmallest(limit, (h for h in self._heap if not h.cancelled))
+        return [{"name": h.name, "kind": h.kind, "in": round(max(0.0, h.when - now), 1),
+                 "at": round(wall + (h.when - now), 1)} for h in entries]
+
+    # --- Internals ---
+    def _now(self):
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        return self._loop.time() if self._loop else time.monotonic()
+
+    def _push(self, handle):
+        handle._owner = self
+        heapq.heappush(self._heap, handle)
+        self._arm()
+        return handle
+
+    def _pop(self):
+        handle = heapq.heappop(self._heap)
+        handle._owner = None
+        if handle.cancelled:
+            self._cancelled -= 1
+        return handle
+
+    def _on_cancel(self):
+        self._cancelled += 1
+        if len(self._heap) >= self.COMPACT_MIN and self._cancelled * 2 > len(self._heap):
+            for h in self._heap:
+                if h.cancelled: h._owner = None
+            self._heap = [h for h in self._heap if not h.cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+    def _arm(self):
+        while self._heap and self._heap[0].cancelled:
+            self._pop()
+        if not self._heap:
+            return
+        when = self._heap[0].when
+        if self._armed and self._armed[0] <= when:
+            return # Already armed early enough
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return # Armed on the next call from within the loop
+        if self._armed:
+            self._armed[1].cancel()
+        self._armed = (when, loop.call_at(when, self._tick))
+
+    def _tick(self):
+        self._armed = None
+        now = self._now()
+        while self._heap and self._heap[0].when <= now:
+            handle = self._pop()
+            if handle.cancelled:
+                continue
+            self._fire(handle)
+            if handle._repeat and not handle.cancelled:
+                handle.when = handle._repeat(handle, now)
+                handle.seq = next(self._seq)
+                handle._owner = self
+                heapq.heappush(self._heap, handle)
+        self._arm()
+
+    def _fire(self, handle):
+        self.fired += 1
+        try:
+            result = handle.callback(*handle.args)
+            if asyncio.iscoroutine(result):
+                asyncio.ensure_future(result)
+        except Exception as e:
+            print(f"[Timer] Error in '{handle.name}': {e}")
+
+
+def _set_done(fut):
+    if not fut.done():
+        fut.set_result(None)
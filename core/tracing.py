@@ -0,0 +1,197 @@
+"""
+Lightweight tracing for action runs.
+
+Every execute_action run becomes a trace with one span per sub-action (plus
+nested spans, e.g. for %game% lookups). Span durations also go into per-type
+latency histograms, so "which step makes this redeem slow" is answerable
+without a profiler.
+
+The current trace travels in a ContextVar, so code deep inside a sub-action
+(variable resolvers, ...) can add spans without passing it around.
+Snapshots are taken under a lock: the HTTP endpoint reads from its own thread.
+"""
+import contextvars
+import itertools
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+# Upper bucket bounds in ms (last bucket is open-ended)
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_span_depth = contextvars.ContextVar("span_depth", default=0)
+
+
+class LatencyHistogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (ms), capped at the max seen."""
+        if not self.count:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(float(BUCKETS_MS[i]), self.max) if i < len(BUCKETS_MS) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count, 2) if self.count else 0.0,
+            "max_ms": round(self.max, 2),
+            "p50_ms": round(self.percentile(50), 2),
+            "p95_ms": round(self.percentile(95), 2),
+            "p99_ms": round(self.percentile(99), 2),
+            "buckets": {("<=%g" % b if i < len(BUCKETS_MS) else ">%g" % BUCKETS_MS[-1]): n
+                        for i, (b, n) in enumerate(zip(BUCKETS_MS + (None,), self.counts)) if n},
+        }
+
+
+class Trace:
+    __slots__ = ("id", "action", "event", "started", "_t0", "duration_ms", "spans", "error")
+
+    def __init__(self, trace_id, action, event):
+        self.id = trace_id
+        self.action = action
+        self.event = event
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms = None
+        self.spans = [] # [name, kind, start offset ms, duration ms, error, depth]
+        self.error = None
+
+    def to_dict(self):
+        return {
+            "id": self.id, "action": self.action, "event": self.event,
+            "started": round(self.started, 3),
+            "duration_ms": None if self.duration_ms is None else round(self.duration_ms, 2),
+            "error": self.error,
+            "spans": [{"name": name, "type": kind, "start_ms": round(start, 2),
+                       "duration_ms": None if dur is None else round(dur, 2),
+                       "error": err, "depth": depth}
+                      for name, kind, start, dur, err, depth in self.spans],
+        }
+
+
+class _Span:
+    """Context manager for one span; works across awaits (no thread-local timing)."""
+    __slots__ = ("tracer", "trace", "entry", "kind", "_t0", "_depth_token")
+
+    def __init__(self, tracer, kind, name):
+        self.tracer = tracer
+        self.kind = kind
+        self.trace = _current_trace.get()
+        self.entry = None
+        self._t0 = None
+        self._depth_token = None
+        if self.trace is not None:
+            depth = _span_depth.get()
+            self.entry = [name, kind, 0.0, None, None, depth]
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        if self.entry is not None:
+            self.entry[2] = (self._t0 - self.trace._t0) * 1000
+            self.trace.spans.append(self.entry)
+            self._depth_token = _span_depth.set(self.entry[5] + 1)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ms = (time.perf_counter() - self._t0) * 1000
+        self.tracer.observe(self.kind, ms)
+        if self.entry is not None:
+            self.entry[3] = ms
+            if exc_type is not None and exc_type is not GeneratorExit:
+                self.entry[4] = f"{exc_type.__name__}: {exc}"
+            _span_depth.reset(self._depth_token)
+        return False
+
+
+class Tracer:
+    def __init__(self, max_traces=200):
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._traces = deque(maxlen=max_traces)
+        self._histograms = {} # span type -> LatencyHistogram
+        self._ids = itertools.count(1)
+
+    # --- Recording ---
+    def trace(self, action_name, event=None):
+        """Context manager around one action run; sets the current trace for nested spans."""
+        return _TraceScope(self, action_name, event)
+
+    def span(self, kind, name=None):
+        """Span inside the current trace (histogram only if there is none)."""
+        return _Span(self, kind, name or kind)
+
+    def observe(self, kind, ms):
+        with self._lock:
+            hist = self._histograms.get(kind)
+            if hist is None:
+                hist = self._histograms[kind] = LatencyHistogram()
+            hist.observe(ms)
+
+    # --- Reading ---
+    def recent(self, limit=50, action=None):
+        with self._lock:
+            traces = list(self._traces)
+        if action:
+            traces = [t for t in traces if t.action == action]
+        return [t.to_dict() for t in traces[-limit:][::-1]] # Newest first
+
+    def histograms(self):
+        with self._lock:
+            return {kind: h.snapshot() for kind, h in sorted(self._histograms.items())}
+
+    def snapshot(self, limit=50):
+        return {"histograms": self.histograms(), "traces": self.recent(limit)}
+
+    def reset(self):
+        with self._lock:
+            self._traces.clear()
+            self._histograms.clear()
+
+
+class _TraceScope:
+    __slots__ = ("tracer", "trace_obj", "_token")
+
+    def __init__(self, tracer, action_name, event):
+        self.tracer = tracer
+        self.trace_obj = Trace(next(tracer._ids), action_name, event) if tracer.enabled else None
+        self._token = None
+
+    def __enter__(self):
+        if self.trace_obj is not None:
+            self._token = _current_trace.set(self.trace_obj)
+        return self.trace_obj
+
+    def __exit__(self, exc_type, exc, tb):
+        trace = self.trace_obj
+        if trace is None:
+            return False
+        _current_trace.reset(self._token)
+        trace.duration_ms = (time.perf_counter() - trace._t0) * 1000
+        if exc_type is not None:
+            trace.error = "cancelled" if exc_type.__name__ == "CancelledError" else f"{exc_type.__name__}: {exc}"
+        self.tracer.observe("action", trace.duration_ms)
+        with self.tracer._lock:
+            self.tracer._traces.append(trace)
+        return False
@@ -0,0 +1,174 @@
+"""
+Trigger index for the ActionEngine.
+
+Instead of walking every action and every trigger for each event, triggers are
+sorted once at load time by (mapped) type and command word. handle_event then
+only checks the few candidates that can actually match.
+
+Parameterized commands ("!shout %user%") are compiled once into a
+CommandPattern. Supported placeholders:
+    %name%        one word
+    %user:name%   one word, leading @ is stripped (%user% always does this)
+    %int:name%    an integer (stored as int in the context)
+    %*name%       rest of the line (only as the last placeholder)
+"""
+import re
+from functools import lru_cache
+
+COMMAND_TYPES = ("twitch_command", "youtube_command")
+
+
+def map_event_type(event_type, data):
+    """MAPPING: EventServer events -> Action trigger types"""
+    if event_type == "CommandTriggered":
+        if data.get('platform') == 'youtube':
+            return "youtube_command"
+        return "twitch_command"
+    elif event_type == "SystemEvent":
+        if data.get("type") == "raid": return "twitch_raid"
+        elif data.get("type") == "sub": return "twitch_sub"
+    elif event_type == "TwitchRedemption":
+        return "twitch_redemption"
+    return event_type
+
+
+class CommandPattern:
+    """Regex-backed matcher for one parameterized command."""
+
+    _CAPTURES = {
+        "word": r"(\S+)",
+        "user": r"(\S+)",
+        "int": r"([+-]?\d+)",
+    }
+
+    def __init__(self, command):
+        self.command = command
+        self.base = command.split(' ')[0].lower()
+        self.captures = [] # [(var_name, type)]
+
+        parts = [p for p in command.split(' ') if p]
+        regex = [r"^ *"]
+        for i, part in enumerate(parts):
+            if i > 0:
+                regex.append(r" +")
+
+            if len(part) > 2 and part.startswith('%') and part.endswith('%'):
+                spec = part[1:-1]
+                if spec.startswith('*'):
+                    if i != len(parts) - 1:
+                        raise ValueError(f"Rest-of-line placeholder must be last: {command}")
+                    self.captures.append((spec[1:].lower(), "rest"))
+                    regex.append(r"(.+)")
+                    continue
+
+                var_type, _, var_name = spec.lower().rpartition(':')
+                if not var_type:
+                    var_type = "user" if var_name == "user" else "word"
+                if var_type not in self._CAPTURES:
+                    raise ValueError(f"Unknown placeholder type '{var_type}' in: {command}")
+                self.captures.append((var_name, var_type))
+                regex.append(self._CAPTURES[var_type])
+            else:
+                regex.append(re.escape(part))
+
+        # Extra words after the pattern are allowed (like before), but only on word boundaries
+        regex.append(r"(?= |$)")
+        self.regex = re.compile("".join(regex), re.IGNORECASE)
+
+    def match(self, message):
+        """Returns the extracted context dict or None."""
+        m = self.regex.match(message)
+        if not m:
+            return None
+
+        extracted = {}
+        for (var_name, var_type), val in zip(self.captures, m.groups()):
+            if var_type == "int":
+                val = int(val)
+            elif var_type == "user" and val.startswith('@'):
+                val = val[1:]
+            elif var_type == "rest":
+                val = val.rstrip()
+            extracted[var_name] = val
+        return extracted
+
+
+@lru_cache(maxsize=None)
+def compile_command(command):
+    """Compiled CommandPattern per trigger string (cached, shared by index and check_trigger)."""
+    return CommandPattern(command)
+
+
+class TriggerIndex:
+    def __init__(self, actions=None):
+        self.by_type = {}         # trigger_type -> [(pos, action, [triggers])]
+        self.commands = {}        # command_type -> {"!cmd": [(pos, action, [triggers])]}
+        self.param_commands = {}  # command_type -> {"!cmd": [...]} for "!shout %user%"
+        if actions is not None:
+            self.build(actions)
+
+    def build(self, actions):
+        """Rebuilds the index. Disabled actions are not indexed at all."""
+        self.by_type = {}
+        self.commands = {}
+        self.param_commands = {}
+
+        for pos, action in enumerate(actions):
+            if not action.get('enabled', True):
+                continue
+
+            for trigger in action.get('triggers', []):
+                t_type = trigger.get('type')
+                if t_type in COMMAND_TYPES:
+                    cmd = trigger.get('command', '').lower()
+                    if "%" in cmd:
+                        try:
+                            compile_command(trigger.get('command', ''))
+                        except ValueError as e:
+                            print(f"[ActionEngine] Invalid command trigger in '{action.get('name')}': {e}")
+                            continue
+                        bucket = self.param_commands.setdefault(t_type, {}).setdefault(cmd.split(' ')[0], [])
+                    else:
+                        bucket = self.commands.setdefault(t_type, {}).setdefault(cmd, [])
+                else:
+                    bucket = self.by_type.setdefault(t_type, [])
+
+                # Group multiple triggers of the same action (keeps trigger order)
+                if bucket and bucket[-1][0] == pos:
+                    bucket[-1][2].append(trigger)
+                else:
+                    bucket.append((pos, action, [trigger]))
+
+    def candidates(self, mapped_type, data):
+        """
+        Returns [(action, [triggers])] in action order.
+        Only these triggers can possibly match the event.
+        """
+        if mapped_type not in COMMAND_TYPES:
+            return [(action, triggers) for _, action, triggers in self.by_type.get(mapped_type, ())]
+
+        cmd = data.get('command', '').lower()
+        exact = self.commands.get(mapped_type, {}).get(cmd)
+        param = self.param_commands.get(mapped_type, {}).get(cmd)
+
+        if not param:
+            return [(action, triggers) for _, action, triggers in exact or ()]
+        if not exact:
+            return [(action, triggers) for _, action, triggers in param]
+
+        # Rare: both buckets hit -> merge by action position
+        merged = {}
+        for pos, action, triggers in exact + param:
+            if pos in merged:
+                merged[pos][1].extend(triggers)
+            else:
+                merged[pos] = (action, list(triggers))
+
+        result = []
+        for pos in sorted(merged):
+            action, triggers = merged[pos]
+            # Keep the original trigger order within the action
+            order = action.get('triggers', [])
+            triggers.sort(key=lambda t: next(i for i, o in enumerate(order) if o is t))
+            result.append((action, triggers))
+        return result
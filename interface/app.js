@@ -2,6 +2,16 @@
 let ws;
 let badgeMap = {}; // Speichert alle Badges: id -> version -> url
 
+// Resume nach Reconnect: nach dem "Subscribed"-Ack schickt der Server alles nach lastSeq nach, dann laufen Live-Events weiter.
+// Beim ersten Verbinden (lastSeq = 0) kommt so auch der letzte Chat-Verlauf.
+// Events vor dem Ack (zwischen Connect und Subscribe schon unterwegs) werden ignoriert, sie kommen im Replay nochmal.
+let lastSeq = 0;
+let awaitingAck = false;
+let serverEpoch = null; // Wechselt bei jedem Bot-Neustart, dann gelten die alten Sequenznummern nicht mehr
+let reconnectDelay = 1000;
+let reconnectTimer = null;
+const DASHBOARD_TOPICS = ["ChatMessage", "BotStatus", "SystemEvent", "BadgeMapping", "Error"];
+
 const chatContainer = document.getElementById('chat-container');
 const statusDot = document.getElementById('status');
 const connectionPanel = document.getElementById('connection-panel');
@@ -14,8 +24,12 @@ document.getElementById('font-val').innerText = savedFontSize + 'px';
 
 // --- VERBINDUNGS-LOGIK ---
 function connect() {
-    // Falls noch eine alte Verbindung hängt, schließen
+    clearTimeout(reconnectTimer);
+
+    // Falls noch eine alte Verbindung hängt, schließen (ohne dass deren onclose einen zweiten Reconnect plant)
     if (ws) {
+        ws.onclose = null;
+        ws.onerror = null;
         ws.close();
     }
 
@@ -25,8 +39,19 @@ function connect() {
         console.log("Verbunden mit PommesBot");
         statusDot.classList.add('connected');
         connectionPanel.style.display = 'none'; // Button ausblenden
+        reconnectDelay = 1000;
         addSystemMessage("Verbindung hergestellt.");
 
+        // Nur Events abonnieren, die das Dashboard auch anzeigt, verpasste Events nachholen
+        awaitingAck = true;
+        ws.send(JSON.stringify({
+            action: "subscribe",
+            topics: DASHBOARD_TOPICS,
+            since: lastSeq,
+            epoch: serverEpoch,
+            batch: true // Bei Raids/Chat-Spitzen mehrere Events pro Frame (kommt als Array)
+        }));
+
         // Badges anfordern
         ws.send(JSON.stringify({ action: "get_badges" }));
     };
@@ -34,8 +59,9 @@ function connect() {
     ws.onclose = () => {
         statusDot.classList.remove('connected');
         connectionPanel.style.display = 'block';
-        addSystemMessage("Verbindung getrennt. Reconnect in 10s...");
-        setTimeout(connect, 10000);
+        addSystemMessage(`Verbindung getrennt. Reconnect in ${reconnectDelay / 1000}s...`);
+        reconnectTimer = setTimeout(connect, reconnectDelay);
+        reconnectDelay = Math.min(reconnectDelay * 2, 10000); // 1s, 2s, 4s, ... max. 10s
     };
 
     ws.onerror = (err) => {
@@ -49,27 +75,54 @@ function connect() {
         // Hide panel if connected
         if (ws.readyState === WebSocket.OPEN) connectionPanel.style.display = 'none';
 
-        if (data.event === "ChatMessage") {
-            addChatMessage(data.data);
-        } else if (data.event === "BotStatus") {
-            addSystemMessage(`Status: ${data.data.status}`);
-        } else if (data.event === "SystemEvent") {
-            addSystemEvent(data.data);
-        } else if (data.event === "BadgeMapping") {
-            badgeMap = data.data;
-            console.log("Badges received:", badgeMap);
-        } else if (data.event === "Error") {
-            addSystemMessage(`❌ FEHLER: ${data.data.message}`);
+        if (Array.isArray(data)) {
+            // Batch: alle Nachrichten erst in ein Fragment, dann ein einziges DOM-Update + Scroll
+            const fragment = document.createDocumentFragment();
+            data.forEach(item => handleEvent(item, fragment));
+            if (fragment.childNodes.length > 0) {
+                chatContainer.appendChild(fragment);
+                scrollToBottom();
+            }
+        } else {
+            handleEvent(data, chatContainer);
         }
     };
 }
 
+function handleEvent(data, target) {
+    if (data.seq !== undefined) {
+        if (awaitingAck) return; // Vor dem Handshake, kommt im Replay
+        if (data.seq <= lastSeq) return; // Schon gesehen (Überschneidung von Replay und Live)
+        lastSeq = data.seq;
+    }
+
+    if (data.event === "Subscribed") {
+        if (serverEpoch && data.data.epoch !== serverEpoch) {
+            lastSeq = 0; // Bot wurde neu gestartet
+        }
+        serverEpoch = data.data.epoch;
+        awaitingAck = false;
+        if (data.data.gap) addSystemMessage("Einige ältere Events konnten nicht nachgeladen werden.", target);
+    } else if (data.event === "ChatMessage") {
+        addChatMessage(data.data, target);
+    } else if (data.event === "BotStatus") {
+        addSystemMessage(`Status: ${data.data.status}`, target);
+    } else if (data.event === "SystemEvent") {
+        addSystemEvent(data.data, target);
+    } else if (data.event === "BadgeMapping") {
+        badgeMap = data.data;
+        console.log("Badges received:", badgeMap);
+    } else if (data.event === "Error") {
+        addSystemMessage(`❌ FEHLER: ${data.data.message}`, target);
+    }
+}
+
 // Start: Versuche sofort beim Laden zu verbinden
 connect();
 
 // --- FUNKTIONEN ---
 
-function addChatMessage(msgData) {
+function addChatMessage(msgData, target = chatContainer) {
     const div = document.createElement('div');
     div.classList.add('message');
 
@@ -114,21 +167,19 @@ function addChatMessage(msgData) {
         <span class="text">${processedMessage}</span>
     `;
 
-    chatContainer.appendChild(div);
-    scrollToBottom();
+    appendMessage(div, target);
 }
 
-function addSystemMessage(text) {
+function addSystemMessage(text, target = chatContainer) {
     const div = document.createElement('div');
     div.classList.add('message');
     div.style.fontStyle = "italic";
     div.style.color = "#888";
     div.innerText = `[System] ${text}`;
-    chatContainer.appendChild(div);
-    scrollToBottom();
+    appendMessage(div, target);
 }
 
-function addSystemEvent(eventData) {
+function addSystemEvent(eventData, target = chatContainer) {
     const div = document.createElement('div');
     div.classList.add('message');
     div.classList.add('system-event'); // Für CSS Styling
@@ -145,8 +196,13 @@ function addSystemEvent(eventData) {
         <div style="color: white;">${eventData.message}</div>
     `;
 
-    chatContainer.appendChild(div);
-    scrollToBottom();
+    appendMessage(div, target);
+}
+
+// target ist der Chat oder ein Fragment (Batch), das danach am Stück eingefügt wird
+function appendMessage(div, target) {
+    target.appendChild(div);
+    if (target === chatContainer) scrollToBottom();
 }
 
 function scrollToBottom() {
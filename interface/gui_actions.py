@@ -4,6 +4,8 @@ import yaml
 import os
 import pygame._sdl2.audio as sdl_audio
 import pygame
+from core.config_writer import write_yaml_atomic
+from core.expressions import compile_expression, ExpressionError
 
 def get_ws_url():
     port = 8080 # Default fallback
@@ -71,6 +73,12 @@ class ActionEditorFrame(ctk.CTkFrame):
         self.entry_cooldown = ctk.CTkEntry(self.header_frame, textvariable=self.var_cooldown, width=50)
         self.entry_cooldown.pack(side="right", padx=2)
         
+        # Concurrency Mode (what happens if the action fires while it is still running)
+        self.var_concurrency = ctk.StringVar(value="parallel")
+        self.opt_concurrency = ctk.CTkOptionMenu(self.header_frame, variable=self.var_concurrency, width=95,
+                                                 values=["parallel", "queue", "drop", "replace"])
+        self.opt_concurrency.pack(side="right", padx=2)
+        
         # Enabled Switch
         self.var_enabled = ctk.BooleanVar(value=True)
         self.switch_enabled = ctk.CTkSwitch(self.header_frame, text="Active", variable=self.var_enabled, width=60, command=self.on_hot_switch_toggle)
@@ -115,9 +123,17 @@ class ActionEditorFrame(ctk.CTkFrame):
         # Update current action loaded in UI back to self.actions list
         self.commit_current_changes()
         
+        # Actions are addressed by name (trigger_action, set_action_state, hot switch)
+        names = [a.get('name') for a in self.actions]
+        duplicates = sorted({n for n in names if names.count(n) > 1}, key=str)
+        if duplicates and not messagebox.askyesno(
+                "Duplicate Names",
+                f"These action names are used more than once:\n{', '.join(map(str, duplicates))}\n\n"
+                "Only the first one can be targeted by name. Save anyway?"):
+            return
+        
         data = {'actions': self.actions}
-        with open(self.config_file, 'w') as f:
-            yaml.dump(data, f)
+        write_yaml_atomic(self.config_file, data) # The bot may read the file at any time
         messagebox.showinfo("Saved", "Actions saved! (Reloading...)")
         self._send_reload_signal()
 
@@ -232,6 +248,7 @@ class ActionEditorFrame(ctk.CTkFrame):
         self.var_action_name.set(self.current_action.get('name', ''))
         self.var_action_group.set(self.current_action.get('group', 'General'))
         self.var_cooldown.set(str(self.current_action.get('cooldown', 0)))
+        self.var_concurrency.set(self.current_action.get('concurrency', 'parallel'))
         self.var_enabled.set(self.current_action.get('enabled', True))
         self.refresh_details()
 
@@ -244,12 +261,20 @@ class ActionEditorFrame(ctk.CTkFrame):
                 self.current_action['cooldown'] = int(self.var_cooldown.get() or 0)
             except:
                 self.current_action['cooldown'] = 0
+            # Only store non-default modes, keeps existing actions.yaml files unchanged
+            if self.var_concurrency.get() != 'parallel' or 'concurrency' in self.current_action:
+                self.current_action['concurrency'] = self.var_concurrency.get()
             # Triggers/Subs are modified directly in the list references usually, 
             # so strict commit might not be needed if references are kept.
             pass
 
     def add_action(self):
-        new_action = {'name': 'New Action', 'group': 'General', 'enabled': True, 'triggers': [], 'sub_actions': []}
+        names = {a.get('name') for a in self.actions}
+        name, i = 'New Action', 1
+        while name in names:
+            i += 1
+            name = f'New Action {i}'
+        new_action = {'name': name, 'group': 'General', 'enabled': True, 'triggers': [], 'sub_actions': []}
         self.actions.append(new_action)
         self.refresh_action_list()
         self.select_action(len(self.actions)-1)
@@ -283,7 +308,10 @@ class ActionEditorFrame(ctk.CTkFrame):
                 text += f": {t['command']} [{perm}]"
             elif 'scene_name' in t: text += f": {t['scene_name']}"
             elif 'min_viewers' in t: text += f" (>{t['min_viewers']})"
-            elif 'interval' in t: text += f" ({t['interval']}s)"
+            elif 'interval' in t:
+                text += f" ({t['interval']}s"
+                if t.get('min_lines'): text += f", min. {t['min_lines']} chat lines"
+                text += ")"
             elif 'reward_title' in t: text += f": {t['reward_title']}"
             
             lbl = ctk.CTkLabel(f, text=text)
@@ -319,6 +347,9 @@ class ActionEditorFrame(ctk.CTkFrame):
             elif 'ms' in s: summary += f": {s['ms']}ms"
             elif 'folder' in s: summary += f": {s['folder']}"
             elif 'file' in s: summary += f": {os.path.basename(s['file'])}"
+            elif 'condition' in s: summary += f": {s['condition'][:30]}"
+            elif s['type'] == 'switch': summary += f": {s.get('value', '')} ({len(s.get('cases') or [])} cases)"
+            elif s['type'] == 'random_pick': summary += f": {len(s.get('options') or [])} options"
             elif 'action_name' in s: 
                 if s['type'] == 'set_action_state':
                     summary += f": '{s['action_name']}' -> {s.get('state')} ({s.get('duration')}s)"
@@ -425,7 +456,7 @@ class SubActionDialog(ctk.CTkToplevel):
         self.type_var = ctk.StringVar(value=start_type)
         
         # Sort and unique
-        sub_types = sorted(list(set(["twitch_chat", "delay", "log", "play_sound", "stop_sounds", "playlist", "stop_playlist", "obs_set_scene", "youtube_random_short", "trigger_action", "set_volume", "set_action_state"])))
+        sub_types = sorted(list(set(["twitch_chat", "delay", "log", "play_sound", "stop_sounds", "playlist", "stop_playlist", "obs_set_scene", "youtube_random_short", "trigger_action", "set_volume", "set_action_state", "if", "switch", "random_pick"])))
         
         self.combo = ctk.CTkComboBox(self, variable=self.type_var, 
                                      values=sub_types,
@@ -553,6 +584,17 @@ class SubActionDialog(ctk.CTkToplevel):
             lbl_vol = ctk.CTkLabel(self.frame_config, text=f"{int(init_vol)}%")
             lbl_vol.pack(anchor="n")
 
+            # Streaming: low RAM, gapless (or fade-out/fade-in between tracks)
+            stream_var = ctk.BooleanVar(value=get_val('stream', 'False') == 'True')
+            ctk.CTkSwitch(self.frame_config, text="Streaming (gapless, low RAM)", variable=stream_var).pack(anchor="w", pady=(10,0))
+            self.widgets['stream'] = stream_var
+
+            ctk.CTkLabel(self.frame_config, text="Fade out/in between tracks (ms, streaming only):").pack(anchor="w")
+            entry = ctk.CTkEntry(self.frame_config)
+            entry.insert(0, get_val('fade', '0'))
+            entry.pack(fill="x", pady=5)
+            self.widgets['fade'] = entry
+
         elif choice == "obs_set_scene":
             ctk.CTkLabel(self.frame_config, text="Scene Name:").pack(anchor="w")
             entry = ctk.CTkEntry(self.frame_config)
@@ -596,6 +638,66 @@ class SubActionDialog(ctk.CTkToplevel):
             dur_entry.pack(fill="x", pady=5)
             self.widgets['duration'] = dur_entry
 
+        elif choice in ("if", "switch", "random_pick"):
+            action_names = [""] + sorted([a.get('name', 'Untitled') for a in self.master.actions])
+            editing = self.initial_data.get('type') == choice
+            
+            def add_branch_selector(label, list_key, action_key):
+                # Inline sub-action lists (written in actions.yaml) have no editor here, keep them as they are
+                if editing and isinstance(self.initial_data.get(list_key), list):
+                    ctk.CTkLabel(self.frame_config, text=f"{label} inline sub-actions (edit in actions.yaml)").pack(anchor="w", pady=5)
+                    return
+                ctk.CTkLabel(self.frame_config, text=label).pack(anchor="w")
+                var = ctk.StringVar(value=get_val(action_key))
+                ctk.CTkComboBox(self.frame_config, variable=var, values=action_names).pack(fill="x", pady=5)
+                self.widgets[action_key] = var
+            
+            def inline_lists(key):
+                return editing and any(isinstance(c.get('sub_actions'), list) for c in self.initial_data.get(key) or [])
+            
+            if choice == "if":
+                ctk.CTkLabel(self.frame_config, text="Condition (e.g. is_subscriber and int(input) > 5):").pack(anchor="w")
+                entry = ctk.CTkEntry(self.frame_config)
+                entry.insert(0, get_val('condition'))
+                entry.pack(fill="x", pady=5)
+                self.widgets['condition'] = entry
+                add_branch_selector("Then run action:", 'then', 'then_action')
+                add_branch_selector("Else run action (optional):", 'else', 'else_action')
+            
+            elif choice == "switch":
+                ctk.CTkLabel(self.frame_config, text="Value (e.g. lower(input)):").pack(anchor="w")
+                entry = ctk.CTkEntry(self.frame_config)
+                entry.insert(0, get_val('value'))
+                entry.pack(fill="x", pady=5)
+                self.widgets['value'] = entry
+                if inline_lists('cases'):
+                    ctk.CTkLabel(self.frame_config, text="Cases with inline sub-actions (edit in actions.yaml)").pack(anchor="w", pady=5)
+                else:
+                    ctk.CTkLabel(self.frame_config, text="Cases, one per line: value1, value2 = Action Name").pack(anchor="w")
+                    box = ctk.CTkTextbox(self.frame_config, height=80)
+                    lines = []
+                    for c in (self.initial_data.get('cases') or []) if editing else []:
+                        m = c.get('match')
+                        lines.append(f"{', '.join(str(x) for x in m) if isinstance(m, list) else m} = {c.get('action', '')}")
+                    box.insert("1.0", "\n".join(lines))
+                    box.pack(fill="x", pady=5)
+                    self.widgets['cases_text'] = box
+                add_branch_selector("Default action (optional):", 'default', 'default_action')
+            
+            else:
+                if inline_lists('options'):
+                    ctk.CTkLabel(self.frame_config, text="Options with inline sub-actions (edit in actions.yaml)").pack(anchor="w", pady=5)
+                else:
+                    ctk.CTkLabel(self.frame_config, text="Actions, one per line (optional weight: 3 = Action Name):").pack(anchor="w")
+                    box = ctk.CTkTextbox(self.frame_config, height=100)
+                    lines = []
+                    for o in (self.initial_data.get('options') or []) if editing else []:
+                        w = o.get('weight', 1)
+                        lines.append(o.get('action', '') if w == 1 else f"{w} = {o.get('action', '')}")
+                    box.insert("1.0", "\n".join(lines))
+                    box.pack(fill="x", pady=5)
+                    self.widgets['options_text'] = box
+
         elif choice == "set_volume":
             # Target
             ctk.CTkLabel(self.frame_config, text="Target:").pack(anchor="w")
@@ -644,6 +746,10 @@ class SubActionDialog(ctk.CTkToplevel):
         t = self.type_var.get()
         res = {'type': t}
         
+        # Keep options that have no widget (e.g. playlist 'weights') when editing
+        if self.initial_data and self.initial_data.get('type') == t:
+            res = dict(self.initial_data)
+        
         # Harvest data
         try:
             if 'message' in self.widgets:
@@ -668,6 +774,32 @@ class SubActionDialog(ctk.CTkToplevel):
                 res['state'] = self.widgets['state'].get()
             if 'duration' in self.widgets:
                  res['duration'] = int(self.widgets['duration'].get())
+            if 'stream' in self.widgets:
+                res['stream'] = bool(self.widgets['stream'].get())
+            if 'fade' in self.widgets:
+                 res['fade'] = int(self.widgets['fade'].get() or 0)
+            if 'condition' in self.widgets:
+                res['condition'] = self.widgets['condition'].get()
+            for key in ('then_action', 'else_action', 'default_action'):
+                if key in self.widgets:
+                    if self.widgets[key].get(): res[key] = self.widgets[key].get()
+                    else: res.pop(key, None)
+            if 'cases_text' in self.widgets:
+                cases = []
+                for line in self.widgets['cases_text'].get("1.0", "end").splitlines():
+                    if '=' not in line: continue
+                    matches, action = line.rsplit('=', 1)
+                    matches = [m.strip() for m in matches.split(',') if m.strip()]
+                    if matches and action.strip():
+                        cases.append({'match': matches if len(matches) > 1 else matches[0], 'action': action.strip()})
+                res['cases'] = cases
+            if 'options_text' in self.widgets:
+                options = []
+                for line in self.widgets['options_text'].get("1.0", "end").splitlines():
+                    weight, _, action = line.rpartition('=') if '=' in line else ("1", "", line)
+                    if action.strip():
+                        options.append({'action': action.strip(), 'weight': float(weight) if '.' in weight else int(weight)})
+                res['options'] = options
                 
             if 'value_slider' in self.widgets:
                 # Convert 0-100 slider to 0.0-1.0 for backend
@@ -686,6 +818,14 @@ class SubActionDialog(ctk.CTkToplevel):
             messagebox.showerror("Error", "Invalid numeric value!")
             return
 
+        # Conditions are compiled by the bot on load, catch typos here already
+        for key in ('condition', 'value') if t in ("if", "switch") else ():
+            try:
+                compile_expression(res.get(key) or 'none')
+            except ExpressionError as e:
+                messagebox.showerror("Error", str(e))
+                return
+
         self.result = res
         self.destroy()
 
@@ -873,7 +1013,11 @@ class TriggerDialog(ctk.CTkToplevel):
         if t_type == "twitch_redemption" and hasattr(self, 'reward_var'):
             val = self.reward_var.get()
         
-        data = {'type': t_type}
+        # Keep options without a widget (e.g. timer jitter/cron/min_lines) when the type is unchanged
+        if self.initial_data and self.initial_data.get('type') == t_type:
+            data = dict(self.initial_data)
+        else:
+            data = {'type': t_type}
         
         if t_type == "twitch_command":
             if val and not val.startswith("!"): val = "!" + val
@@ -102,7 +102,17 @@ async def main():
     cfg = load_config()
     
     # 1. Event Server initialisieren
-    ws_server = EventServer(cfg['server']['host'], cfg['server']['port'])
+    ws_server = EventServer(cfg['server']['host'], cfg['server']['port'],
+                            max_queue=int(cfg['server'].get('client_queue', 256)), # Per client, then slow_client_policy applies
+                            slow_client_policy=cfg['server'].get('slow_client_policy', 'drop_oldest'),
+                            history_size=int(cfg['server'].get('history_size', 100)), # Per event type, for reconnects
+                            batch_ms=int(cfg['server'].get('batch_ms', 25))) # Window for clients that opt into batched frames
+    
+    # Optional: record all events for replay / load tests (python -m core.replay)
+    record_path = (cfg.get('debug') or {}).get('record_events')
+    if record_path:
+        from core.event_log import EventRecorder
+        ws_server.recorder = EventRecorder(record_path)
 
     # 1.5 HTTP Server starten (für OBS/Dashboard)
     from core.http_server import SimpleWebServer
@@ -131,8 +141,17 @@ async def main():
     # Connect Engine to OBS
     obs_ctrl.action_engine = action_engine
     
-    # Bind ActionEngine to EventServer (Internal Listener)
+    # ActionEngine subscribes to the event bus (own queue, events of one source stay in order)
     ws_server.add_internal_listener(action_engine.handle_event)
+    
+    # Tracing: recent action runs & latency histograms (JSON)
+    web_server.add_route("/api/traces", action_engine.tracer.snapshot)
+    web_server.add_route("/api/histograms", action_engine.tracer.histograms)
+    # Taken on the event loop: clients and bus subscriptions change there while a request reads them
+    loop = asyncio.get_running_loop()
+    web_server.add_route("/api/clients", ws_server.client_stats, loop=loop) # WebSocket send queues
+    web_server.add_route("/api/bus", ws_server.bus.stats, loop=loop) # Event bus subscribers (queued / dropped / errors)
+    web_server.add_route("/api/audio", action_engine.audio.stats, loop=loop) # Per output device: SFX cache hits / misses / size
     # ---------------------------
 
     if cfg['twitch']['enabled']:
@@ -234,6 +253,13 @@ async def main():
         if 'web_server' in locals() and web_server:
             web_server.stop() 
         
+        if 'action_engine' in locals() and action_engine:
+            action_engine.close() # Flushes runtime state (cooldowns, toggles)
+        
+        ws_server.bus.close() # Stops subscriber workers
+        if ws_server.recorder:
+            ws_server.recorder.close()
+        
         # Stop Bots
         if cfg['twitch']['enabled'] and 'bot' in locals() and bot:
              try:
@@ -249,6 +275,10 @@ async def main():
                  pass
 
 if __name__ == "__main__":
+    # Audio devices run in child processes (core/audio.py), needed for the frozen build
+    import multiprocessing
+    multiprocessing.freeze_support()
+
     def report_status(twitch="Offline", youtube="Offline", obs="Offline"):
         import json
         import os
@@ -53,7 +53,11 @@ class OBSController:
                         
                         if scene_name:
                             print(f"[OBS Event] Scene changed to: {scene_name}")
-                            if self.controller.action_engine:
+                            if self.controller.event_server:
+                                # Published on the bus from the loop thread (ActionEngine, recorder, overlays subscribe there)
+                                self.controller.loop.call_soon_threadsafe(
+                                    self.controller.event_server.bus.publish, "obs_scene", {"scene_name": scene_name}, "obs")
+                            elif self.controller.action_engine:
                                 asyncio.run_coroutine_threadsafe(
                                     self.controller.action_engine.handle_event("obs_scene", {"scene_name": scene_name}),
                                     self.controller.loop
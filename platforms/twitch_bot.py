@@ -5,6 +5,7 @@ import json
 import asyncio
 import webbrowser
 from core.auth import perform_twitch_oauth_flow, validate_twitch_token, refresh_twitch_token
+from core.chat_activity import CHAT_ACTIVITY
 
 async def setup_twitch_token(config):
     # ... (unchanged) ...
@@ -469,6 +470,8 @@ class TwitchBot(commands.Bot):
         # 4. Ignoriere Commands vom Bot selbst (Echo)
         if message.echo:
             return
+        
+        CHAT_ACTIVITY.record("twitch") # Feeds chat-gated timers (O(1))
 
         # 5. Generic Command Trigger (for Action Engine)
         if message.content.startswith('!'):
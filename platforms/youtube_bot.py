@@ -9,6 +9,7 @@ import datetime
 import re
 import random
 import time
+from core.chat_activity import CHAT_ACTIVITY
 
 # Scopes für YouTube Chat
 SCOPES = ['https://www.googleapis.com/auth/youtube.readonly', 'https://www.googleapis.com/auth/youtube.force-ssl']
@@ -258,6 +259,8 @@ class YouTubeBot:
                 "badges": badges
             }
             
+            CHAT_ACTIVITY.record("youtube") # Feeds chat-gated timers (O(1))
+            
             # An Dashboard senden
             await self.event_server.broadcast("ChatMessage", chat_data)
             print(f"[YouTube] {author}: {msg}")
@@ -0,0 +1,85 @@
+import asyncio
+
+from core.chat_activity import ChatActivity, GatedTimer
+from core.timers import TimerScheduler
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_recent_counts_lines_in_the_window():
+    clock = Clock()
+    activity = ChatActivity(window=60, clock=clock)
+    for _ in range(3):
+        activity.record("twitch")
+    clock.now += 10
+    activity.record("youtube")
+    assert activity.recent(5) == 1
+    assert activity.recent(60) == 4
+    clock.now += 55
+    assert activity.recent(60) == 1 # The first second left the window
+
+
+def test_ring_slots_are_reused():
+    clock = Clock()
+    activity = ChatActivity(window=10, clock=clock)
+    activity.record()
+    clock.now += 10 # Same slot, next round
+    activity.record()
+    assert activity.recent(10) == 1
+    assert activity.total == 2
+
+
+def test_totals_per_platform():
+    activity = ChatActivity(window=10, clock=Clock())
+    activity.record("twitch")
+    activity.record("twitch")
+    activity.record("youtube")
+    assert activity.total_for() == 3
+    assert activity.total_for("twitch") == 2
+    assert activity.total_for("kick") == 0
+
+
+def run_gated(min_lines, lines_before, lines_after, platform=None, line_platform="twitch"):
+    async def main():
+        timers, activity, fired = TimerScheduler(), ChatActivity(window=60), []
+        gated = GatedTimer(timers, activity, 0.02, min_lines, fired.append, "run", platform=platform).start()
+        for _ in range(lines_before):
+            activity.record(line_platform)
+        await asyncio.sleep(0.04)
+        before = len(fired)
+        for _ in range(lines_after):
+            activity.record(line_platform)
+        await asyncio.sleep(0)
+        gated.cancel()
+        return before, len(fired)
+    return asyncio.run(main())
+
+
+def test_gated_timer_fires_when_interval_and_lines_are_met():
+    assert run_gated(min_lines=2, lines_before=2, lines_after=0) == (1, 1)
+
+
+def test_gated_timer_waits_for_chat_then_fires_on_the_line():
+    assert run_gated(min_lines=3, lines_before=1, lines_after=2) == (0, 1)
+
+
+def test_gated_timer_counts_only_its_platform():
+    assert run_gated(min_lines=1, lines_before=0, lines_after=5, platform="youtube") == (0, 0)
+    assert run_gated(min_lines=1, lines_before=0, lines_after=1, platform="youtube", line_platform="youtube") == (0, 1)
+
+
+def test_cancelled_gated_timer_stops_listening():
+    async def main():
+        timers, activity, fired = TimerScheduler(), ChatActivity(window=60), []
+        gated = GatedTimer(timers, activity, 0.01, 1, fired.append, "run").start()
+        await asyncio.sleep(0.02) # Interval passed, now waiting for chat
+        gated.cancel()
+        activity.record("twitch")
+        return fired, len(timers), activity._listeners
+    assert asyncio.run(main()) == ([], 0, set())
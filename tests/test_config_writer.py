@@ -0,0 +1,88 @@
+import asyncio
+import os
+import stat
+import sys
+
+import pytest
+import yaml
+
+from core.config_writer import DebouncedYamlWriter, write_yaml_atomic
+
+
+def read(path):
+    with open(path) as f:
+        return yaml.safe_load(f)
+
+
+def test_atomic_write_replaces_the_file_and_leaves_no_temp_files(tmp_path):
+    path = tmp_path / "actions.yaml"
+    path.write_text("actions: []\n")
+    write_yaml_atomic(str(path), {"actions": [{"name": "A"}]})
+    assert read(path) == {"actions": [{"name": "A"}]}
+    assert os.listdir(tmp_path) == ["actions.yaml"]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX permissions")
+def test_atomic_write_keeps_the_file_mode(tmp_path):
+    path = tmp_path / "actions.yaml"
+    path.write_text("actions: []\n")
+    os.chmod(path, 0o640)
+    write_yaml_atomic(str(path), {"actions": []})
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX permissions")
+def test_new_file_gets_umask_mode_not_0600(tmp_path):
+    path = tmp_path / "new.yaml"
+    old = os.umask(0o022)
+    try:
+        write_yaml_atomic(str(path), {})
+    finally:
+        os.umask(old)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+
+
+def test_failed_dump_keeps_the_old_file(tmp_path, monkeypatch):
+    path = tmp_path / "actions.yaml"
+    path.write_text("actions: []\n")
+
+    def broken_dump(data, stream):
+        stream.write("actions: [half")
+        raise yaml.YAMLError("disk full")
+    monkeypatch.setattr(yaml, "dump", broken_dump)
+    with pytest.raises(yaml.YAMLError):
+        write_yaml_atomic(str(path), {"actions": []})
+    assert read(path) == {"actions": []}
+    assert os.listdir(tmp_path) == ["actions.yaml"]
+
+
+def test_debounced_writer_coalesces_a_burst_into_one_write(tmp_path):
+    path = str(tmp_path / "actions.yaml")
+    data = {"n": 0}
+
+    async def main():
+        writer = DebouncedYamlWriter(path, lambda: data, delay=0.05)
+        for i in range(10):
+            data["n"] = i
+            writer.schedule()
+        assert writer.pending
+        await asyncio.sleep(0.2)
+        return writer
+
+    writer = asyncio.run(main())
+    assert writer.writes == 1
+    assert read(path) == {"n": 9}
+
+
+def test_flush_writes_pending_changes_immediately(tmp_path):
+    path = str(tmp_path / "actions.yaml")
+
+    async def main():
+        writer = DebouncedYamlWriter(path, lambda: {"saved": True}, delay=60)
+        writer.schedule()
+        writer.flush()
+        assert not writer.pending
+        return writer
+
+    assert asyncio.run(main()).writes == 1
+    assert read(path) == {"saved": True}
@@ -0,0 +1,65 @@
+from core.cooldowns import CooldownStore
+
+
+def store():
+    return CooldownStore(clock=lambda: 0.0)
+
+
+def test_global_cooldown_blocks_until_expired():
+    cd = store()
+    a = {"name": "A", "cooldown": 30}
+    assert cd.acquire(a, {}, 100.0) == (True, None)
+    allowed, reason = cd.acquire(a, {}, 110.0)
+    assert not allowed and reason.startswith("global cooldown")
+    assert cd.acquire(a, {}, 130.0)[0]
+
+
+def test_user_cooldown_is_per_user_and_case_insensitive():
+    cd = store()
+    a = {"name": "A", "user_cooldown": 60}
+    assert cd.acquire(a, {"user": "Alice"}, 0.0)[0]
+    assert not cd.acquire(a, {"user": "alice"}, 1.0)[0]
+    assert cd.acquire(a, {"user": "bob"}, 1.0)[0]
+
+
+def test_scopes_without_key_dont_apply():
+    cd = store()
+    a = {"name": "A", "user_cooldown": 60}
+    assert cd.acquire(a, {}, 0.0)[0] # Timer run, no user
+    assert cd.acquire(a, {}, 1.0)[0]
+
+
+def test_rate_limit_window_slides():
+    cd = store()
+    a = {"name": "A", "rate_limit": {"count": 2, "per": 10}}
+    assert cd.acquire(a, {}, 0.0)[0]
+    assert cd.acquire(a, {}, 1.0)[0]
+    assert not cd.acquire(a, {}, 5.0)[0]
+    assert cd.acquire(a, {}, 10.5)[0] # First run left the window
+
+
+def test_blocked_run_consumes_nothing():
+    cd = store()
+    a = {"name": "A", "cooldown": 5, "rate_limit": {"count": 2, "per": 60}}
+    assert cd.acquire(a, {}, 0.0)[0]
+    assert not cd.acquire(a, {}, 1.0)[0] # Blocked by the cooldown, window keeps 1 run
+    assert cd.acquire(a, {}, 6.0)[0]
+
+
+def test_release_undoes_the_recorded_run():
+    cd = store()
+    a = {"name": "A", "user_cooldown": 60, "rate_limit": {"count": 1, "per": 60, "scope": "user"}}
+    ctx = {"user": "alice"}
+    assert cd.acquire(a, ctx, 0.0)[0]
+    cd.release(a, ctx, 0.0)
+    assert cd.acquire(a, ctx, 1.0)[0]
+    assert not cd.acquire(a, ctx, 2.0)[0]
+
+
+def test_sweep_drops_expired_entries():
+    cd = store()
+    cd.acquire({"name": "A", "cooldown": 1}, {}, 0.0)
+    cd.acquire({"name": "B", "rate_limit": {"count": 1, "per": 1}}, {}, 0.0)
+    assert len(cd) == 2
+    cd.sweep(5.0)
+    assert len(cd) == 0
@@ -0,0 +1,162 @@
+import asyncio
+
+from core.event_bus import EventBus, event_source
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_sync_subscribers_are_called_inline_in_publish_order():
+    bus = EventBus()
+    seen = []
+    bus.subscribe(lambda e: seen.append(("a", e.type, e.seq)))
+    bus.subscribe(lambda e: seen.append(("b", e.type, e.seq)))
+    first = bus.publish("ChatMessage", {"message": "hi"})
+    second = bus.publish("BotStatus", {})
+    assert first.seq < second.seq
+    assert seen == [("a", "ChatMessage", 1), ("b", "ChatMessage", 1), ("a", "BotStatus", 2), ("b", "BotStatus", 2)]
+
+
+def test_topics_exact_and_patterns():
+    bus = EventBus()
+    seen = []
+    bus.subscribe(lambda e: seen.append(e.type), topics=["ChatMessage", "YouTube*"])
+    for event_type in ("ChatMessage", "YouTubePlay", "BotStatus", "YouTubeEnded"):
+        bus.publish(event_type)
+    assert seen == ["ChatMessage", "YouTubePlay", "YouTubeEnded"]
+
+
+def test_set_topics_resets_routing():
+    bus = EventBus()
+    seen = []
+    sub = bus.subscribe(lambda e: seen.append(e.type), topics="A")
+    bus.publish("B")
+    sub.set_topics(["B"])
+    bus.publish("B")
+    assert seen == ["B"]
+
+
+def test_source_from_platform():
+    assert event_source("ChatMessage", {"platform": "YouTube"}) == "youtube"
+    assert event_source("BotStatus", None) == "system"
+    bus = EventBus()
+    assert bus.publish("SceneChanged", {}, source="obs").source == "obs"
+
+
+def test_subscriber_errors_are_counted_not_raised():
+    bus = EventBus()
+    seen = []
+
+    def broken(event):
+        raise RuntimeError("boom")
+    bad = bus.subscribe(broken)
+    bus.subscribe(lambda e: seen.append(e.type))
+    bus.publish("ChatMessage")
+    assert seen == ["ChatMessage"]
+    assert bad.errors == 1
+
+
+def test_cancel_unsubscribes():
+    bus = EventBus()
+    seen = []
+    sub = bus.subscribe(lambda e: seen.append(e.type))
+    bus.publish("A")
+    sub.cancel()
+    bus.publish("B")
+    assert seen == ["A"]
+    assert bus.stats()["subscribers"] == []
+
+
+def test_async_subscriber_keeps_order_per_source_and_runs_sources_concurrently():
+    async def main():
+        bus = EventBus()
+        seen = []
+        youtube_gate = asyncio.Event()
+
+        async def handler(event):
+            if event.source == "youtube":
+                await youtube_gate.wait() # Slow YouTube must not hold up Twitch
+            seen.append((event.source, event.data["n"]))
+
+        sub = bus.subscribe(handler)
+        bus.publish("ChatMessage", {"platform": "youtube", "n": 1})
+        for n in range(3):
+            bus.publish("ChatMessage", {"platform": "twitch", "n": n})
+        bus.publish("ChatMessage", {"platform": "youtube", "n": 2})
+        await settle()
+        assert seen == [("twitch", 0), ("twitch", 1), ("twitch", 2)]
+        youtube_gate.set()
+        await settle()
+        assert seen[3:] == [("youtube", 1), ("youtube", 2)]
+        assert sub.handled == 5 and sub.queued == 0
+    run(main())
+
+
+def test_publish_never_waits_for_async_subscribers():
+    async def main():
+        bus = EventBus()
+        calls = []
+
+        async def handler(event):
+            calls.append(event.seq)
+        bus.subscribe(handler)
+        bus.publish("A")
+        assert calls == [] # Only queued so far
+        await settle()
+        assert calls == [1]
+    run(main())
+
+
+def test_full_queue_drops_oldest():
+    async def main():
+        bus = EventBus()
+        seen = []
+
+        async def handler(event):
+            seen.append(event.data["n"])
+        sub = bus.subscribe(handler, max_queue=2)
+        for n in range(5):
+            bus.publish("ChatMessage", {"n": n})
+        await settle()
+        assert sub.dropped == 3
+        assert seen == [3, 4]
+    run(main())
+
+
+def test_full_queue_drop_new():
+    async def main():
+        bus = EventBus()
+        seen = []
+
+        async def handler(event):
+            seen.append(event.data["n"])
+        sub = bus.subscribe(handler, max_queue=2, policy="drop_new")
+        for n in range(5):
+            bus.publish("ChatMessage", {"n": n})
+        await settle()
+        assert sub.dropped == 3
+        assert seen == [0, 1]
+    run(main())
+
+
+def test_close_cancels_workers():
+    async def main():
+        bus = EventBus()
+        gate = asyncio.Event()
+
+        async def handler(event):
+            await gate.wait()
+        sub = bus.subscribe(handler)
+        bus.publish("A")
+        await settle()
+        bus.close()
+        await settle()
+        assert not sub.active and sub.queued == 0
+        assert bus.stats()["subscribers"] == []
+    run(main())
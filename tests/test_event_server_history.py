@@ -0,0 +1,130 @@
+import asyncio
+import json
+
+from core.event_server import EventServer
+
+
+def published(server, *event_types):
+    """Publishes the events and returns the server (fan-out runs inline, no clients needed)."""
+    async def main():
+        for event_type in event_types:
+            await server.broadcast(event_type, {"t": event_type})
+    asyncio.run(main())
+    return server
+
+
+def seqs(entries):
+    return [seq for seq, _, _ in entries]
+
+
+def test_history_since_returns_newer_events_in_order():
+    server = published(EventServer("localhost", 0), "ChatMessage", "BotStatus", "ChatMessage")
+    entries, gap = server.history_since(1)
+    assert seqs(entries) == [2, 3]
+    assert [event_type for _, event_type, _ in entries] == ["BotStatus", "ChatMessage"]
+    assert not gap
+
+
+def test_history_since_filters_by_topic():
+    server = published(EventServer("localhost", 0), "ChatMessage", "BotStatus", "ChatMessage")
+    entries, _ = server.history_since(0, wants=lambda t: t == "ChatMessage")
+    assert seqs(entries) == [1, 3]
+
+
+def test_gap_when_buffer_dropped_events_after_since():
+    server = published(EventServer("localhost", 0, history_size=2), *["ChatMessage"] * 5)
+    entries, gap = server.history_since(1)
+    assert seqs(entries) == [4, 5]
+    assert gap
+    # Nothing was lost for a client that has seen everything up to 3
+    assert server.history_since(3)[1] is False
+
+
+def test_gap_only_counts_wanted_event_types():
+    server = published(EventServer("localhost", 0, history_size=1), "BotStatus", "BotStatus", "ChatMessage")
+    _, gap = server.history_since(0, wants=lambda t: t == "ChatMessage")
+    assert not gap
+
+
+def test_limit_keeps_the_newest_and_reports_a_gap():
+    server = published(EventServer("localhost", 0), *["ChatMessage"] * 5)
+    entries, gap = server.history_since(0, limit=2)
+    assert seqs(entries) == [4, 5]
+    assert gap
+
+
+def test_state_events_keep_only_the_newest_snapshot():
+    server = published(EventServer("localhost", 0), "BadgeMapping", "ChatMessage", "BadgeMapping", "BotStatus")
+    entries, gap = server.history_since(0)
+    assert [(seq, event_type) for seq, event_type, _ in entries] == [(2, "ChatMessage"), (3, "BadgeMapping"),
+                                                                    (4, "BotStatus")]
+    assert not gap
+
+
+class FakeSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send(self, frame):
+        self.frames.append(frame)
+
+
+def test_events_queued_before_the_handshake_come_after_the_ack():
+    async def main():
+        server = EventServer("localhost", 0)
+        await server.broadcast("ChatMessage", {"n": 1})
+        ws = FakeSocket()
+        server.add_client(ws)
+        await server.broadcast("ChatMessage", {"n": 2}) # Live, before the client's subscribe arrives
+        server.subscribe(ws, ["ChatMessage"], since=0, epoch=server.epoch)
+        for _ in range(5):
+            await asyncio.sleep(0)
+        server.clients[ws].stop()
+        return [json.loads(f) for f in ws.frames]
+    frames = asyncio.run(main())
+    assert [f["event"] for f in frames] == ["Subscribed", "ChatMessage", "ChatMessage"]
+    assert [f["seq"] for f in frames[1:]] == [1, 2]
+
+
+def test_internal_events_stay_off_the_websocket_side():
+    server = published(EventServer("localhost", 0), "obs_scene", "ChatMessage")
+    assert "obs_scene" not in server.history
+    assert seqs(server.history_since(0)[0]) == [2]
+
+
+class MessageSocket(FakeSocket):
+    """Sends the given messages to the server, then stays open until released."""
+
+    def __init__(self, *messages):
+        super().__init__()
+        self.messages = list(messages)
+        self.done = asyncio.Event()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.messages:
+            return self.messages.pop(0)
+        await self.done.wait()
+        raise StopAsyncIteration
+
+
+def test_reply_goes_only_to_the_requesting_client():
+    async def main():
+        server = EventServer("localhost", 0)
+
+        async def on_message(message):
+            await server.reply("ActionStats", {"for": message})
+        server.add_message_handler(on_message)
+        asking, other = MessageSocket("get_action_stats"), MessageSocket()
+        tasks = [asyncio.create_task(server.handler(ws)) for ws in (asking, other)]
+        for _ in range(5):
+            await asyncio.sleep(0)
+        asking.done.set()
+        other.done.set()
+        await asyncio.gather(*tasks)
+        return asking.frames, other.frames
+    asking, other = asyncio.run(main())
+    assert [json.loads(f) for f in asking] == [{"event": "ActionStats", "data": {"for": "get_action_stats"}}]
+    assert other == []
@@ -0,0 +1,124 @@
+import pytest
+
+from core.expressions import ExpressionError, compile_expression
+
+
+def evaluate(text, **ctx):
+    return compile_expression(text).evaluate(ctx)
+
+
+# --- Sandbox: everything outside the whitelist is rejected at compile time ---
+
+@pytest.mark.parametrize("text", [
+    "__import__('os')",                  # Not a whitelisted function
+    "open('/etc/passwd')",
+    "eval('1')",
+    "user.__class__",                    # Attributes
+    "().__class__.__bases__[0]",
+    "input[0]",                          # Subscripts
+    "lambda: 1",
+    "[x for x in input]",                # Comprehensions
+    "(x := 1)",                          # Walrus
+    "f'{user}'",                         # f-strings
+    "2 ** 100000",                       # Power (could hang the loop)
+    "1 << 64",
+    "b'bytes'",
+    "len(input, key=1)",                 # Keyword arguments
+    "int(*input)",                       # Starred
+    "{'a': 1}",
+    "user is None",                      # 'is' is not an allowed comparison
+    "user()",                            # Only whitelisted names can be called
+])
+def test_rejects_everything_outside_the_whitelist(text):
+    with pytest.raises(ExpressionError):
+        compile_expression(text)
+
+
+def test_function_names_are_not_values():
+    # Without a call, a function name is an ordinary (missing) context variable
+    assert evaluate("startswith") is None
+
+
+def test_syntax_errors_raise_expression_error():
+    with pytest.raises(ExpressionError):
+        compile_expression("user ==")
+
+
+def test_expression_error_is_a_value_error():
+    # Callers that only know about ValueError (config validation) still catch it
+    assert issubclass(ExpressionError, ValueError)
+
+
+def test_dunder_names_are_just_missing_context():
+    assert evaluate("__builtins__") is None
+    assert evaluate("__import__ == none") is True
+
+
+# --- Evaluation ---
+
+def test_unknown_names_are_none():
+    assert evaluate("missing") is None
+    assert evaluate("missing == none") is True
+
+
+def test_constants_are_case_insensitive():
+    assert evaluate("TRUE and not False") is True
+    assert evaluate("Null") is None
+
+
+def test_numeric_strings_compare_as_numbers():
+    assert evaluate("viewers >= 10", viewers="12") is True
+    assert evaluate("viewers > 3", viewers="5.5") is True
+    assert evaluate("3 < viewers", viewers="2") is False
+
+
+def test_non_numeric_string_against_number_is_a_runtime_error():
+    with pytest.raises(TypeError):
+        evaluate("input < 3", input="abc")
+
+
+def test_in_on_strings_is_case_insensitive():
+    assert evaluate("'KAPPA' in message", message="hello kappa") is True
+    assert evaluate("'x' not in message", message=None) is True
+    assert evaluate("lower(input) in ('ja', 'yes')", input="Yes") is True
+
+
+def test_boolean_operators_short_circuit():
+    # int(None) would raise, so the right side must not run
+    assert evaluate("false and int(missing)") is False
+    assert evaluate("true or int(missing)") is True
+
+
+def test_chained_comparison():
+    assert evaluate("1 < x < 10", x=5) is True
+    assert evaluate("1 < x < 10", x=10) is False
+
+
+def test_arithmetic_and_text_concat():
+    assert evaluate("count + 1", count="41") == 42
+    assert evaluate("count * 2", count="3") == 6
+    assert evaluate("'Hi ' + user", user="pommes") == "Hi pommes"
+    assert evaluate("'n=' + missing") == "n="
+
+
+def test_conditional_expression():
+    assert evaluate("'mod' if is_mod else 'viewer'", is_mod=True) == "mod"
+
+
+def test_whitelisted_functions():
+    assert evaluate("len(input)", input="abcd") == 4
+    assert evaluate("len(missing)") == 0
+    assert evaluate("upper(user)", user="a") == "A"
+    assert evaluate("int('7.9')") == 7
+    assert evaluate("max(1, int(x), 3)", x="5") == 5
+    assert evaluate("startswith(input, '!SO')", input="!so @x") is True
+    assert evaluate("contains(message, 'raid')", message="RAID incoming") is True
+    assert 0 <= evaluate("random()") < 1
+
+
+def test_compiled_expressions_are_cached():
+    assert compile_expression("x == 1") is compile_expression("x == 1")
+
+
+def test_names_are_collected():
+    assert compile_expression("game == 'Chess' and int(viewers) > 1").names == {"game", "viewers"}
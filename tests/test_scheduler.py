@@ -0,0 +1,213 @@
+import asyncio
+
+from core.scheduler import ActionScheduler
+
+
+class Recorder:
+    """Runner that records start/end per run and blocks until released."""
+
+    def __init__(self):
+        self.started = []
+        self.finished = []
+        self.gate = asyncio.Event()
+
+    async def __call__(self, action, ctx):
+        self.started.append((action['name'], ctx.get('n')))
+        await self.gate.wait()
+        self.finished.append((action['name'], ctx.get('n')))
+
+
+def action(name, **cfg):
+    return dict(cfg, name=name)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_parallel_runs_all_start():
+    async def main():
+        rec = Recorder()
+        sched = ActionScheduler(rec)
+        a = action("A")
+        assert all(sched.submit(a, {"n": i}) for i in range(3))
+        await settle()
+        assert len(rec.started) == 3
+        assert sched.in_flight == 3
+        rec.gate.set()
+        await settle()
+        assert sched.in_flight == 0
+        assert sched.stats()["started"] == 3
+    run(main())
+
+
+def test_drop_mode_drops_while_running_and_calls_on_drop():
+    async def main():
+        rec = Recorder()
+        sched = ActionScheduler(rec)
+        a = action("A", concurrency="drop")
+        reasons = []
+        assert sched.submit(a, {"n": 1}, on_drop=reasons.append) is True
+        assert sched.submit(a, {"n": 2}, on_drop=reasons.append) is False
+        assert reasons == ["already running"]
+        assert sched.dropped_by_action == {"A": 1}
+        rec.gate.set()
+        await settle()
+        assert sched.submit(a, {"n": 3}) is True # Free again
+        await settle()
+        assert rec.finished == [("A", 1), ("A", 3)]
+    run(main())
+
+
+def test_queue_mode_runs_one_after_another_in_order():
+    async def main():
+        rec = Recorder()
+        sched = ActionScheduler(rec)
+        a = action("A", concurrency="queue", max_queue=2)
+        for i in range(3):
+            assert sched.submit(a, {"n": i})
+        assert sched.submit(a, {"n": 3}) is False # Backlog full
+        await settle()
+        assert rec.started == [("A", 0)]
+        assert sched.queue_depth("A") == 2
+        rec.gate.set()
+        await settle()
+        assert rec.finished == [("A", 0), ("A", 1), ("A", 2)]
+    run(main())
+
+
+def test_replace_mode_cancels_the_running_run():
+    async def main():
+        rec = Recorder()
+        sched = ActionScheduler(rec)
+        a = action("A", concurrency="replace")
+        sched.submit(a, {"n": 1})
+        await settle()
+        sched.submit(a, {"n": 2})
+        await settle()
+        rec.gate.set()
+        await settle()
+        assert rec.started == [("A", 1), ("A", 2)]
+        assert rec.finished == [("A", 2)]
+        assert sched.in_flight == 0
+    run(main())
+
+
+def test_replace_mode_drops_waiting_runs_through_on_drop():
+    async def main():
+        rec = Recorder()
+        sched = ActionScheduler(rec, max_in_flight=1)
+        dropped = []
+        sched.submit(action("Busy"), {"n": 0})
+        a = action("A", concurrency="replace")
+        assert sched.submit(a, {"n": 1}, on_drop=dropped.append)
+        assert sched.submit(a, {"n": 2}, on_drop=dropped.append)
+        assert dropped == ["replaced"]
+        assert sched.dropped_by_action == {"A": 1}
+        rec.gate.set()
+        await settle()
+        assert rec.started == [("Busy", 0), ("A", 2)]
+    run(main())
+
+
+def test_cancel_waiting_only_keeps_the_running_run():
+    async def main():
+        rec = Recorder()
+        sched = ActionScheduler(rec)
+        a = action("A", concurrency="queue")
+        dropped = []
+        for i in range(3):
+            sched.submit(a, {"n": i}, on_drop=lambda r, i=i: dropped.append((i, r)))
+        await settle()
+        sched.cancel("A", "disabled", running=False)
+        assert dropped == [(1, "disabled"), (2, "disabled")]
+        rec.gate.set()
+        await settle()
+        assert rec.finished == [("A", 0)]
+        assert sched.queue_depth("A") == 0
+    run(main())
+
+
+def test_global_cap_starts_waiting_runs_by_priority():
+    async def main():
+        rec = Recorder()
+        sched = ActionScheduler(rec, max_in_flight=1)
+        sched.submit(action("Busy"), {"n": 0})
+        sched.submit(action("Low"), {"n": 1})
+        sched.submit(action("High", priority=5), {"n": 2})
+        sched.submit(action("Low"), {"n": 3})
+        await settle()
+        assert rec.started == [("Busy", 0)]
+        assert sched.queue_depth() == 3
+        rec.gate.set()
+        await settle()
+        assert rec.started == [("Busy", 0), ("High", 2), ("Low", 1), ("Low", 3)] # FIFO within a priority
+    run(main())
+
+
+def test_full_waiting_room_evicts_lowest_priority_and_reports_it():
+    async def main():
+        rec = Recorder()
+        sched = ActionScheduler(rec, max_in_flight=1, max_pending=1)
+        dropped = []
+        sched.submit(action("Busy"), {})
+        assert sched.submit(action("Low"), {"n": 1}, on_drop=lambda r: dropped.append(("Low", r)))
+        # Same priority doesn't evict: the new run is dropped
+        assert not sched.submit(action("Low2"), {}, on_drop=lambda r: dropped.append(("Low2", r)))
+        # Higher priority evicts the waiting one, after its submit() has long returned True
+        assert sched.submit(action("High", priority=1), {}, on_drop=lambda r: dropped.append(("High", r)))
+        assert dropped == [("Low2", "scheduler full"), ("Low", "evicted by higher priority")]
+        rec.gate.set()
+        await settle()
+        assert [name for name, _ in rec.finished] == ["Busy", "High"]
+    run(main())
+
+
+def test_on_drop_errors_dont_break_the_scheduler():
+    async def main():
+        rec = Recorder()
+        sched = ActionScheduler(rec)
+        a = action("A", concurrency="drop")
+
+        def broken(reason):
+            raise RuntimeError("boom")
+        sched.submit(a, {})
+        assert sched.submit(a, {}, on_drop=broken) is False
+        rec.gate.set()
+        await settle()
+        assert sched.in_flight == 0
+    run(main())
+
+
+def test_cancel_removes_running_and_waiting_runs():
+    async def main():
+        rec = Recorder()
+        sched = ActionScheduler(rec, max_in_flight=1)
+        a = action("A")
+        for i in range(3):
+            sched.submit(a, {"n": i})
+        await settle()
+        sched.cancel("A")
+        await settle()
+        assert sched.in_flight == 0
+        assert sched.queue_depth() == 0
+        assert rec.finished == []
+    run(main())
+
+
+def test_runner_errors_free_the_slot():
+    async def main():
+        async def failing(action, ctx):
+            raise ValueError("broken sub-action")
+        sched = ActionScheduler(failing, max_in_flight=1)
+        sched.submit(action("A"), {})
+        sched.submit(action("B"), {})
+        await settle()
+        assert sched.in_flight == 0
+        assert sched.stats()["started"] == 2
+    run(main())
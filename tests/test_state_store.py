@@ -0,0 +1,70 @@
+import sqlite3
+
+import pytest
+
+from core.state_store import StateStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "state.db")
+
+
+def test_state_survives_a_restart(path):
+    store = StateStore(path)
+    store.put_cooldown(("A", "global", ""), 2e9)
+    store.put_window(("A", "user", "bob", 60.0), 3, [1e9, 2e9])
+    store.incr("runs:A")
+    store.incr("runs:A", 2)
+    store.set_toggle("A", False, True, revert_at=2e9, revert_to=True)
+    store.close()
+
+    store = StateStore(path)
+    until, windows = store.load_cooldowns(now=1.5e9)
+    assert until == {("A", "global", ""): 2e9}
+    assert windows == {("A", "user", "bob", 60.0): (3, [2e9])} # Runs outside the window are dropped
+    assert store.get_counter("runs:A") == 3
+    assert store.load_toggles() == {"A": {"enabled": False, "config_enabled": True,
+                                          "revert_at": 2e9, "revert_to": True}}
+    store.close()
+
+
+def test_expired_cooldowns_are_not_loaded(path):
+    store = StateStore(path)
+    store.put_cooldown(("A", "global", ""), 100.0)
+    store.flush()
+    assert store.load_cooldowns(now=200.0) == ({}, {})
+    store.close()
+
+
+def test_load_toggles_includes_buffered_changes(path):
+    store = StateStore(path)
+    store.set_toggle("A", True, False)
+    store.flush()
+    store.clear_toggle("A")
+    store.set_toggle("B", False, True)
+    assert set(store.load_toggles()) == {"B"} # Not flushed yet
+    store.close()
+
+
+def test_failed_flush_keeps_changes_buffered(path):
+    store = StateStore(path)
+    store.put_cooldown(("A", "global", ""), 2e9)
+    store.incr("runs")
+    real = store._conn
+
+    class Locked:
+        def cursor(self):
+            raise sqlite3.OperationalError("database is locked")
+
+        def execute(self, *args):
+            return real.execute(*args)
+
+    store._conn = Locked()
+    store.flush()
+    store._conn = real
+    store.put_cooldown(("A", "global", ""), 3e9) # Newer value wins over the failed one
+    store.flush()
+    assert store.load_cooldowns(now=0)[0] == {("A", "global", ""): 3e9}
+    assert real.execute("SELECT value FROM counters WHERE name = 'runs'").fetchone() == (1,)
+    store.close()
@@ -0,0 +1,30 @@
+from core.templates import compile_template
+
+
+def test_placeholders_are_filled_from_context():
+    tpl = compile_template("Go follow @%target%, last seen playing %game%!")
+    assert tpl.render({"target": "bob", "game": "Chess"}) == "Go follow @bob, last seen playing Chess!"
+
+
+def test_unknown_placeholders_stay_as_they_are():
+    assert compile_template("Hi %user%, %foo%").render({"user": "bob"}) == "Hi bob, %foo%"
+
+
+def test_values_are_converted_to_text():
+    assert compile_template("%n% runs, mod: %is_mod%").render({"n": 3, "is_mod": False}) == "3 runs, mod: False"
+
+
+def test_text_without_placeholders_is_returned_unchanged():
+    tpl = compile_template("Welcome to the stream! 100% fun")
+    assert tpl.names == set()
+    assert tpl.render({}) == "Welcome to the stream! 100% fun"
+
+
+def test_names_and_adjacent_placeholders():
+    tpl = compile_template("%a%%b%-%a%")
+    assert tpl.names == {"a", "b"}
+    assert tpl.render({"a": "x", "b": "y"}) == "xy-x"
+
+
+def test_compiled_templates_are_cached():
+    assert compile_template("Hi %user%") is compile_template("Hi %user%")
@@ -0,0 +1,127 @@
+import asyncio
+import datetime
+
+import pytest
+
+from core.timers import CronSchedule, TimerScheduler
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+# --- CronSchedule ---
+
+def test_cron_every_15_minutes():
+    cron = CronSchedule("*/15 * * * *")
+    assert cron.next_after(datetime.datetime(2026, 1, 1, 10, 7, 30)) == datetime.datetime(2026, 1, 1, 10, 15)
+    assert cron.next_after(datetime.datetime(2026, 1, 1, 10, 45)) == datetime.datetime(2026, 1, 1, 11, 0)
+
+
+def test_cron_ranges_lists_and_weekdays():
+    cron = CronSchedule("30 18-20 * * 1,5") # Mondays and Fridays
+    # 2026-01-01 is a Thursday
+    assert cron.next_after(datetime.datetime(2026, 1, 1, 12, 0)) == datetime.datetime(2026, 1, 2, 18, 30)
+    assert cron.next_after(datetime.datetime(2026, 1, 2, 20, 30)) == datetime.datetime(2026, 1, 5, 18, 30)
+
+
+def test_cron_sunday_is_0_and_7():
+    assert CronSchedule("0 12 * * 7").weekdays == CronSchedule("0 12 * * 0").weekdays == {0}
+
+
+def test_cron_day_of_month_or_weekday():
+    cron = CronSchedule("0 0 13 * 5") # Like cron: the 13th OR any Friday
+    assert cron.next_after(datetime.datetime(2026, 1, 1)) == datetime.datetime(2026, 1, 2)
+    assert cron.next_after(datetime.datetime(2026, 1, 10)) == datetime.datetime(2026, 1, 13)
+
+
+@pytest.mark.parametrize("expr", ["* * * *", "60 * * * *", "*/0 * * * *", "5-1 * * * *"])
+def test_cron_rejects_invalid_expressions(expr):
+    with pytest.raises(ValueError):
+        CronSchedule(expr)
+
+
+def test_cron_that_never_fires():
+    with pytest.raises(ValueError):
+        CronSchedule("0 0 31 2 *").next_after(datetime.datetime(2026, 1, 1))
+
+
+# --- TimerScheduler ---
+
+def test_call_later_fires_in_deadline_order():
+    async def main():
+        timers, fired = TimerScheduler(), []
+        timers.call_later(0.03, fired.append, "late")
+        timers.call_later(0.01, fired.append, "early")
+        await asyncio.sleep(0.06)
+        return fired, len(timers)
+    assert run(main()) == (["early", "late"], 0)
+
+
+def test_cancelled_timer_does_not_fire():
+    async def main():
+        timers, fired = TimerScheduler(), []
+        handle = timers.call_later(0.01, fired.append, "x")
+        handle.cancel()
+        handle.cancel() # Twice is fine
+        assert len(timers) == 0
+        await asyncio.sleep(0.03)
+        return fired
+    assert run(main()) == []
+
+
+def test_every_repeats_until_cancelled():
+    async def main():
+        timers, fired = TimerScheduler(), []
+        handle = timers.every(0.01, fired.append, "tick")
+        await asyncio.sleep(0.055)
+        handle.cancel()
+        count = len(fired)
+        await asyncio.sleep(0.03)
+        return count, len(fired)
+    count, later = run(main())
+    assert 3 <= count <= 6
+    assert later == count
+
+
+def test_sleep():
+    async def main():
+        timers = TimerScheduler()
+        await timers.sleep(0.01)
+        return timers.fired, len(timers)
+    assert run(main()) == (1, 0)
+
+
+def test_cancelled_handles_dont_pile_up_in_the_heap():
+    async def main():
+        timers = TimerScheduler()
+        keep = timers.call_later(3600, lambda: None)
+        for _ in range(1000):
+            timers.cron("0 3 * * *", lambda: None).cancel()
+            timers.every(3600, lambda: None).cancel()
+        assert len(timers) == 1
+        assert len(timers._heap) < 2 * TimerScheduler.COMPACT_MIN
+        assert timers.upcoming(5)[0]["in"] > 3500
+        keep.cancel()
+        assert len(timers) == 0
+    run(main())
+
+
+def test_cancel_inside_own_callback_counts_correctly():
+    async def main():
+        timers = TimerScheduler()
+        handles = []
+        handles.append(timers.every(0.01, lambda: handles[0].cancel()))
+        await asyncio.sleep(0.03)
+        return len(timers), len(timers._heap)
+    assert run(main()) == (0, 0)
+
+
+def test_upcoming_lists_next_deadlines():
+    async def main():
+        timers = TimerScheduler()
+        timers.call_later(20, lambda: None, name="b")
+        timers.call_later(10, lambda: None, name="a")
+        timers.call_later(5, lambda: None, name="gone").cancel()
+        return [(e["name"], e["in"]) for e in timers.upcoming()]
+    assert run(main()) == [("a", 10.0), ("b", 20.0)]
@@ -0,0 +1,104 @@
+import pytest
+
+from core.triggers import TriggerIndex, compile_command, map_event_type
+
+
+def command(cmd, platform="twitch"):
+    return {"command": cmd, "message": cmd, "platform": platform}
+
+
+def names(candidates):
+    return [action["name"] for action, _ in candidates]
+
+
+def test_map_event_type():
+    assert map_event_type("CommandTriggered", {"platform": "youtube"}) == "youtube_command"
+    assert map_event_type("CommandTriggered", {"platform": "twitch"}) == "twitch_command"
+    assert map_event_type("SystemEvent", {"type": "raid"}) == "twitch_raid"
+    assert map_event_type("TwitchRedemption", {}) == "twitch_redemption"
+    assert map_event_type("obs_scene", {}) == "obs_scene"
+
+
+def test_commands_are_bucketed_by_platform_and_word():
+    actions = [
+        {"name": "Hello", "triggers": [{"type": "twitch_command", "command": "!hello"}]},
+        {"name": "YT Hello", "triggers": [{"type": "youtube_command", "command": "!hello"}]},
+        {"name": "Other", "triggers": [{"type": "twitch_command", "command": "!other"}]},
+    ]
+    index = TriggerIndex(actions)
+    assert names(index.candidates("twitch_command", command("!HELLO"))) == ["Hello"]
+    assert names(index.candidates("youtube_command", command("!hello", "youtube"))) == ["YT Hello"]
+    assert index.candidates("twitch_command", command("!nothing")) == []
+
+
+def test_disabled_actions_are_not_indexed():
+    index = TriggerIndex([
+        {"name": "Off", "enabled": False, "triggers": [{"type": "twitch_command", "command": "!x"}]},
+        {"name": "Raid", "triggers": [{"type": "twitch_raid"}]},
+    ])
+    assert index.candidates("twitch_command", command("!x")) == []
+    assert names(index.candidates("twitch_raid", {})) == ["Raid"]
+
+
+def test_exact_and_parameterized_buckets_merge_in_action_order():
+    so_param = {"type": "twitch_command", "command": "!so %user%"}
+    so_exact = {"type": "twitch_command", "command": "!so"}
+    actions = [
+        {"name": "Param", "triggers": [so_param]},
+        {"name": "Exact", "triggers": [so_exact]},
+        {"name": "Both", "triggers": [so_param, so_exact]},
+    ]
+    result = TriggerIndex(actions).candidates("twitch_command", command("!so"))
+    assert names(result) == ["Param", "Exact", "Both"]
+    assert result[2][1] == [so_param, so_exact] # Original trigger order within the action
+
+
+def test_invalid_parameterized_command_is_skipped():
+    index = TriggerIndex([
+        {"name": "Broken", "triggers": [{"type": "twitch_command", "command": "!x %*rest% %user%"}]},
+        {"name": "Ok", "triggers": [{"type": "twitch_command", "command": "!x %user%"}]},
+    ])
+    assert names(index.candidates("twitch_command", command("!x"))) == ["Ok"]
+
+
+# --- Parameterized commands (CommandPattern) ---
+
+def test_word_and_user_placeholders():
+    pattern = compile_command("!so %user% %game%")
+    assert pattern.match("!so @Streamer Chess") == {"user": "Streamer", "game": "Chess"}
+    assert pattern.match("!SO streamer chess") == {"user": "streamer", "game": "chess"}
+    assert pattern.match("!so streamer") is None
+
+
+def test_typed_user_placeholder_strips_at():
+    assert compile_command("!hug %user:target%").match("!hug @bob") == {"target": "bob"}
+
+
+def test_int_placeholder():
+    pattern = compile_command("!roll %int:sides%")
+    assert pattern.match("!roll 20") == {"sides": 20}
+    assert pattern.match("!roll -3") == {"sides": -3}
+    assert pattern.match("!roll twenty") is None
+
+
+def test_rest_of_line_placeholder():
+    pattern = compile_command("!shout %user% %*text%")
+    assert pattern.match("!shout @bob thanks for the raid!  ") == {"user": "bob", "text": "thanks for the raid!"}
+    assert pattern.match("!shout bob") is None
+
+
+def test_extra_words_are_allowed_but_only_on_word_boundaries():
+    pattern = compile_command("!so %user%")
+    assert pattern.match("!so bob and more") == {"user": "bob"}
+    assert pattern.match("!social bob") is None
+
+
+def test_invalid_patterns_raise_value_error():
+    with pytest.raises(ValueError):
+        compile_command("!x %*rest% %user%")
+    with pytest.raises(ValueError):
+        compile_command("!x %float:n%")
+
+
+def test_compiled_patterns_are_cached():
+    assert compile_command("!so %user%") is compile_command("!so %user%")
@@ -0,0 +1,341 @@
+"""
+Micro-benchmarks for the hot paths (the ones that decide whether we keep up with a busy chat).
+
+    python -m tools.bench                  run all, print ns/op
+    python -m tools.bench -k handle_event  only matching cases
+    python -m tools.bench --compare        compare against tools/bench_baseline.json, exit 1 on regressions
+                                           or on cases missing from the baseline
+    python -m tools.bench --save           store the results as new baseline
+
+Baselines are machine dependent: re-save on the machine you compare on
+before judging a change, with requirements.txt installed. Cases whose
+platform libraries are missing (twitchio, websockets, google api) are
+skipped, and --compare fails on skipped cases that are in the baseline.
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import inspect
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import yaml
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "bench_baseline.json")
+ACTION_COUNTS = (10, 100, 1000)
+
+
+# --- Fixtures ---
+
+def synthetic_actions(count):
+    """Mix of plain commands, parameterized commands, redemptions and YouTube commands, like a big real config."""
+    actions = []
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            trigger = {"type": "twitch_command", "command": f"!cmd{i}"}
+        elif kind == 1:
+            trigger = {"type": "twitch_command", "command": f"!shout{i} %user%", "permission": "Subscriber"}
+        elif kind == 2:
+            trigger = {"type": "twitch_redemption", "reward_title": f"Reward {i}"}
+        else:
+            trigger = {"type": "youtube_command", "command": f"!yt{i}"}
+        actions.append({"name": f"Action {i}", "triggers": [trigger],
+                        "sub_actions": [{"type": "log", "message": "%user% used %command%"}]})
+    # Always-present target for the hit benchmarks (last in the list = worst case for linear scans)
+    actions.append({"name": "Bench Target", "triggers": [{"type": "twitch_command", "command": "!target"}],
+                    "sub_actions": []})
+    return actions
+
+
+class _Engine:
+    """ActionEngine on a temp copy of a synthetic config, with stub backends."""
+
+    def __init__(self, count):
+        from core.action_engine import ActionEngine
+        from core.replay import StubAudio, StubEventServer, StubTwitch
+        self.workdir = tempfile.mkdtemp(prefix="osb_bench_")
+        path = os.path.join(self.workdir, "actions.yaml")
+        with open(path, "w") as f:
+            yaml.safe_dump({"actions": synthetic_actions(count)}, f)
+        self.engine = ActionEngine(path, StubEventServer(), twitch_bot=StubTwitch(), audio=StubAudio())
+
+    def close(self):
+        self.engine.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def _command(message, **extra):
+    data = {"command": message.split(' ')[0], "message": message, "user": "viewer42", "platform": "twitch",
+            "is_mod": False, "is_vip": False, "is_subscriber": True, "is_broadcaster": False}
+    data.update(extra)
+    return data
+
+
+class _FakeSocket:
+    async def send(self, payload):
+        pass
+
+
+async def _noop(*args, **kwargs):
+    pass
+
+
+# --- Cases: each returns (fn, cleanup); fn is sync or a coroutine function ---
+
+def case_check_trigger_plain():
+    fixture = _Engine(10)
+    trigger = {"type": "twitch_command", "command": "!target"}
+    data = _command("!target")
+    check = fixture.engine.check_trigger
+    return (lambda: check(trigger, "CommandTriggered", data, "twitch_command")), fixture.close
+
+
+def case_check_trigger_param():
+    fixture = _Engine(10)
+    trigger = {"type": "twitch_command", "command": "!shout %user% %*text%", "permission": "Subscriber"}
+    data = _command("!shout @someone thanks for the raid!")
+    check = fixture.engine.check_trigger
+    return (lambda: check(trigger, "CommandTriggered", data, "twitch_command")), fixture.close
+
+
+def case_handle_event(count, hit):
+    def factory():
+        fixture = _Engine(count)
+        engine = fixture.engine
+        data = _command("!target" if hit else "!nothing here")
+
+        async def run():
+            await engine.handle_event("CommandTriggered", data)
+            if hit:
+                await asyncio.sleep(0) # Let the submitted run finish, like the real loop would
+        return run, fixture.close
+    return factory
+
+
+def case_replace_vars(text):
+    def factory():
+        fixture = _Engine(10)
+        ctx = _command("!so streamer", input="hello", game="Just Chatting", target="streamer")
+        replace = fixture.engine.replace_vars
+        return (lambda: replace(text, ctx)), fixture.close
+    return factory
+
+
+def case_twitch_event_message():
+    from core.replay import StubEventServer
+    from platforms.twitch_bot import TwitchBot
+    bot = TwitchBot.__new__(TwitchBot) # No connection, only the message path
+    bot.event_server = StubEventServer()
+    bot.channel_name = "mychannel"
+    bot.handle_commands = _noop
+    message = SimpleNamespace(
+        author=SimpleNamespace(display_name="Viewer42", name="viewer42", color="#1E90FF", is_mod=False),
+        content="!hello everyone Kappa PogChamp",
+        echo=False,
+        tags={"badges": "subscriber/12,vip/1,glhf-pledge/1", "emotes": "25:16-20/88:22-29",
+              "color": "#1E90FF", "mod": "0"},
+    )
+    return (lambda: bot.event_message(message)), None
+
+
+def case_broadcast(clients):
+    def factory():
+        from core.event_server import EventServer
+        server = EventServer("localhost", 0)
+        for _ in range(clients):
+            server.add_client(_FakeSocket())
+        data = _command("!hello everyone Kappa", color="#1E90FF", emotes=[{"id": "25", "start": 16, "end": 20}],
+                        badges=[{"id": "subscriber", "version": "12"}], timestamp=str(datetime.datetime.now()))
+
+        async def run():
+            await server.broadcast("ChatMessage", data)
+            await asyncio.sleep(0) # Let the per-client writer tasks send it
+
+        def cleanup():
+            for conn in server.clients.values():
+                conn.stop()
+        return run, cleanup
+    return factory
+
+
+def case_is_short(duration):
+    def factory():
+        from platforms.youtube_bot import YouTubeBot
+        bot = YouTubeBot.__new__(YouTubeBot)
+        return (lambda: bot._is_short(duration)), None
+    return factory
+
+
+CASES = [
+    ("check_trigger/plain", case_check_trigger_plain),
+    ("check_trigger/param", case_check_trigger_param),
+    *[(f"handle_event/miss/{n}", case_handle_event(n, False)) for n in ACTION_COUNTS],
+    *[(f"handle_event/hit/{n}", case_handle_event(n, True)) for n in ACTION_COUNTS],
+    ("replace_vars/static", case_replace_vars("Welcome to the stream!")),
+    ("replace_vars/vars", case_replace_vars("Go follow @%target%, last seen playing %game%! (by %user%: %input%)")),
+    ("twitch/event_message", case_twitch_event_message),
+    *[(f"event_server/broadcast/{n}", case_broadcast(n)) for n in (1, 10, 50)],
+    ("youtube/is_short/short", case_is_short("PT58S")),
+    ("youtube/is_short/long", case_is_short("PT1H2M3S")),
+]
+
+
+# --- Runner ---
+
+async def _time(fn, number):
+    t0 = time.perf_counter()
+    if inspect.iscoroutinefunction(fn):
+        for _ in range(number):
+            await fn()
+    else:
+        for _ in range(number):
+            result = fn()
+            if asyncio.iscoroutine(result):
+                await result
+    return time.perf_counter() - t0
+
+
+async def measure(fn, repeat=5, min_time=0.05):
+    """Calibrates the loop count (like timeit.autorange), then returns ns/op of the best and the median run."""
+    number = 1
+    while True:
+        elapsed = await _time(fn, number)
+        if elapsed >= min_time or number >= 10**7:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    runs = [await _time(fn, number) / number * 1e9 for _ in range(repeat)]
+    return {"ns_per_op": round(min(runs), 1), "median_ns": round(statistics.median(runs), 1), "number": number}
+
+
+async def run_benchmarks(selected, repeat=5, min_time=0.05):
+    results, skipped = {}, {}
+    for name, factory in selected:
+        cleanup = None
+        try:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull): # Engine prints per trigger
+                fn, cleanup = factory()
+                results[name] = await measure(fn, repeat, min_time)
+        except ImportError as e:
+            skipped[name] = str(e)
+        finally:
+            if cleanup:
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    cleanup()
+        if name in results:
+            r = results[name]
+            print(f"  {name:<32} {r['ns_per_op'] / 1000:>10.2f} us/op   (median {r['median_ns'] / 1000:.2f}, n={r['number']})")
+        else:
+            print(f"  {name:<32} skipped ({skipped[name]})")
+    return results, skipped
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_baseline(path, results):
+    data = {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+        },
+        "results": {name: r["ns_per_op"] for name, r in sorted(results.items())},
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+    print(f"[Bench] Baseline saved to {path} ({len(results)} cases)")
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the delta per case. Returns (names that got slower than threshold (e.g. 0.25 = +25%),
+    names without a baseline entry). A case without baseline isn't gated, so that counts as a failure too.
+    """
+    base = baseline.get("results", {})
+    meta = baseline.get("meta", {})
+    print(f"\nCompared to baseline from {meta.get('created', '?')} (Python {meta.get('python', '?')}, {meta.get('platform', '?')}):")
+    regressions, missing = [], []
+    for name, r in results.items():
+        old = base.get(name)
+        if not old:
+            print(f"  {name:<32} NOT IN BASELINE")
+            missing.append(name)
+            continue
+        delta = r["ns_per_op"] / old - 1
+        mark = ""
+        if delta > threshold:
+            mark = "  <-- SLOWER"
+            regressions.append(name)
+        elif delta < -threshold:
+            mark = "  faster"
+        print(f"  {name:<32} {old / 1000:>10.2f} -> {r['ns_per_op'] / 1000:>10.2f} us/op  {delta:+7.1%}{mark}")
+    return regressions, missing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m tools.bench", description="Hot path micro-benchmarks")
+    parser.add_argument("-k", dest="filter", help="only cases containing this text")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save", action="store_true", help="store results as baseline")
+    parser.add_argument("--compare", action="store_true", help="compare with baseline, exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown for --compare (0.25 = 25%%)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="shorter runs (noisier)")
+    args = parser.parse_args(argv)
+
+    selected = [(n, f) for n, f in CASES if not args.filter or args.filter in n]
+    if not selected:
+        print(f"[Bench] No case matches '{args.filter}'")
+        return 1
+
+    print(f"[Bench] {len(selected)} cases, Python {platform.python_version()}")
+    min_time = 0.01 if args.quick else 0.05
+    results, skipped = asyncio.run(run_benchmarks(selected, 3 if args.quick else args.repeat, min_time))
+
+    status = 0
+    if args.compare:
+        baseline = load_baseline(args.baseline)
+        if baseline is None:
+            print(f"[Bench] No baseline at {args.baseline}, run with --save first")
+            status = 1
+        else:
+            regressions, missing = compare(results, baseline, args.threshold)
+            # Baseline cases that couldn't run here (missing libraries) aren't gated either
+            missing += [name for name in skipped if name in baseline.get("results", {})]
+            if regressions:
+                print(f"\n[Bench] {len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+                status = 1
+            if missing:
+                print(f"\n[Bench] {len(missing)} case(s) not compared (re-save the baseline / install requirements.txt): "
+                      f"{', '.join(missing)}")
+                status = 1
+            if not regressions and not missing:
+                print("\n[Bench] No regressions.")
+    if args.save:
+        if args.filter:
+            # Keep the other cases of the existing baseline
+            old = (load_baseline(args.baseline) or {}).get("results", {})
+            merged = {name: {"ns_per_op": ns} for name, ns in old.items()}
+            merged.update(results)
+            results = merged
+        save_baseline(args.baseline, results)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())